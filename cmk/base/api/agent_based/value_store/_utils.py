@@ -3,7 +3,8 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from ast import literal_eval
+import os
+import struct
 from contextlib import contextmanager
 from pathlib import Path
 from typing import (
@@ -39,6 +40,13 @@ _TKey = TypeVar("_TKey", bound=Hashable)
 _TValue = TypeVar("_TValue")
 _TDefault = TypeVar("_TDefault")
 
+_SERIALIZER: Final = store.MarshalSerializer()
+
+# Lengths of the serialized removed keys and updated values of a log record
+_RECORD_HEADER: Final = struct.Struct("<II")
+# The log is not compacted before it reaches this size
+_MIN_COMPACTION_SIZE: Final = 64 * 1024
+
 
 class _DynamicDiskSyncedMapping(Dict[_TKey, _TValue]):
     """Represents the values that have been changed in a session
@@ -76,6 +84,12 @@ class _StaticDiskSyncedMapping(Mapping[_TKey, _TValue]):
     on disk.
 
     The only way to modify the values is the disksync method.
+
+    The changes are appended to a log next to the stored values. Once the log
+    is larger than the stored values, both are compacted into the stored
+    values. Every record of the log is prefixed by the lengths of the
+    serialized removed keys and updated values, so that a record which has
+    not been written completely is detected and dropped.
     """
 
     def __init__(
@@ -83,11 +97,14 @@ class _StaticDiskSyncedMapping(Mapping[_TKey, _TValue]):
         *,
         path: Path,
         log_debug: Callable[[str], None],
-        serializer: Callable[[Mapping[_TKey, _TValue]], str],
-        deserializer: Callable[[str], Mapping[_TKey, _TValue]],
+        serializer: Callable[[Mapping[_TKey, _TValue]], bytes],
+        deserializer: Callable[[bytes], Mapping[_TKey, _TValue]],
     ) -> None:
         self._path: Final = path
-        self._last_sync: Optional[float] = None
+        self._log_path: Final = path.parent / f".{path.name}.log"
+        self._is_loaded = False
+        self._loaded: Optional[Tuple[int, int, int]] = None
+        self._log_offset = 0
         self._data: Mapping[_TKey, _TValue] = {}
         self._log_debug = log_debug
         self._serializer: Final = serializer
@@ -121,27 +138,100 @@ class _StaticDiskSyncedMapping(Mapping[_TKey, _TValue]):
 
         self._path.parent.mkdir(parents=True, exist_ok=True)
 
-        with store.locked(self._path):
+        # The log is locked, as the stored values are replaced when compacting
+        with store.locked(self._log_path):
             try:
-                if self._path.stat().st_mtime == self._last_sync:
-                    self._log_debug("already loaded")
-                else:
-                    self._log_debug("loading from disk")
-                    self._data = self._deserializer(
-                        store.load_text_from_file(self._path, default="{}", lock=False)
-                    )
-
-                if removed or updated:
-                    data = {k: v for k, v in self._data.items() if k not in removed}
-                    data.update(updated)
-                    self._log_debug("writing to disk")
-                    store.save_text_to_file(self._path, self._serializer(data))
-                    self._data = data
-
-                self._last_sync = self._path.stat().st_mtime
+                self._load()
+
+                updated_values = dict(updated)
+                removed_values = {k: v for k, v in self._data.items() if k in removed}
+                if not removed_values and not updated_values:
+                    return
+
+                data = {k: v for k, v in self._data.items() if k not in removed_values}
+                data.update(updated_values)
+
+                self._log_debug("writing changes to disk")
+                self._log_offset += self._append_to_log(
+                    self._serializer(removed_values), self._serializer(updated_values)
+                )
+
+                # The changes are in the log before compacting: Replaying the
+                # log on the compacted values does not change them, so a crash
+                # before the log is truncated does not lose anything.
+                if self._log_offset > max(_MIN_COMPACTION_SIZE, self._loaded_size()):
+                    self._log_debug("compacting")
+                    store.save_bytes_to_file(self._path, self._serializer(data))
+                    os.truncate(self._log_path, 0)
+                    self._loaded = _file_id(self._path)
+                    self._log_offset = 0
+
+                self._data = data
             except Exception as exc:
                 raise MKGeneralException from exc
 
+    def _load(self) -> None:
+        if (
+            not self._is_loaded
+            or (file_id := _file_id(self._path)) != self._loaded
+            or self._log_path.stat().st_size < self._log_offset
+        ):
+            self._log_debug("loading from disk")
+            self._data = self._deserializer(
+                store.load_bytes_from_file(self._path, default=b"{}", lock=False)
+            )
+            self._is_loaded = True
+            self._loaded = _file_id(self._path)
+            self._log_offset = 0
+
+        # The changes are deserialized like the stored values, so the log has
+        # to pass the same permission check
+        store.raise_for_permissions(self._log_path)
+        with self._log_path.open("rb+") as log:
+            log.seek(self._log_offset)
+            changes = log.read()
+            if not changes:
+                self._log_debug("no new changes")
+                return
+
+            self._log_debug("replaying changes")
+            data = dict(self._data)
+            offset = 0
+            while len(changes) - offset >= _RECORD_HEADER.size:
+                removed_size, updated_size = _RECORD_HEADER.unpack_from(changes, offset)
+                end = offset + _RECORD_HEADER.size + removed_size + updated_size
+                if end > len(changes):
+                    break
+                updated_at = end - updated_size
+                for key in self._deserializer(changes[offset + _RECORD_HEADER.size : updated_at]):
+                    data.pop(key, None)
+                data.update(self._deserializer(changes[updated_at:end]))
+                offset = end
+
+            if offset < len(changes):
+                self._log_debug("dropping incomplete change")
+                log.truncate(self._log_offset + offset)
+
+        self._data = data
+        self._log_offset += offset
+
+    def _append_to_log(self, removed: bytes, updated: bytes) -> int:
+        record = _RECORD_HEADER.pack(len(removed), len(updated)) + removed + updated
+        with self._log_path.open("ab") as log:
+            log.write(record)
+        return len(record)
+
+    def _loaded_size(self) -> int:
+        return 0 if self._loaded is None else self._loaded[2]
+
+
+def _file_id(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
 
 class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too-many-ancestors
     """Implements the overlay logic between dynamic and static value store"""
@@ -152,8 +242,8 @@ class _DiskSyncedMapping(MutableMapping[_TKey, _TValue]):  # pylint: disable=too
         *,
         path: Path,
         log_debug: Callable[[str], None],
-        serializer: Callable[[Mapping[_TKey, _TValue]], str],
-        deserializer: Callable[[str], Mapping[_TKey, _TValue]],
+        serializer: Callable[[Mapping[_TKey, _TValue]], bytes],
+        deserializer: Callable[[bytes], Mapping[_TKey, _TValue]],
     ) -> "_DiskSyncedMapping":
         return cls(
             dynamic=_DynamicDiskSyncedMapping(),
@@ -284,8 +374,8 @@ class ValueStoreManager:
         self._value_store: _DiskSyncedMapping[_ValueStoreKey, Any] = _DiskSyncedMapping.make(
             path=self.STORAGE_PATH / str(host_name),
             log_debug=lambda x: logger.debug("value store: %s", x),
-            serializer=repr,
-            deserializer=literal_eval,
+            serializer=_SERIALIZER.serialize,
+            deserializer=_SERIALIZER.deserialize,
         )
         self.active_service_interface: Optional[_ValueStore] = None
         self._host_name = host_name
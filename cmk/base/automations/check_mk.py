@@ -26,6 +26,7 @@ import cmk.utils.debug
 import cmk.utils.log as log
 import cmk.utils.man_pages as man_pages
 import cmk.utils.password_store
+import cmk.utils.piggyback as piggyback
 from cmk.utils.diagnostics import deserialize_cl_parameters, DiagnosticsCLParameters
 from cmk.utils.encoding import ensure_str_with_fallback
 from cmk.utils.exceptions import MKBailOut, MKGeneralException, MKSNMPError, OnError
@@ -567,6 +568,9 @@ class AutomationRenameHosts(Automation):
             if self._rename_host_file(str(tmp_dir / d), oldname, newname):
                 actions.append(d)
 
+        # The log of changes belongs to the stored values of the value store
+        self._rename_host_file(str(tmp_dir / "counters"), f".{oldname}.log", f".{newname}.log")
+
         if self._rename_host_dir(str(tmp_dir / "piggyback"), oldname, newname):
             actions.append("piggyback-load")
 
@@ -577,6 +581,10 @@ class AutomationRenameHosts(Automation):
                 if self._rename_host_file(piggybase + piggydir, oldname, newname):
                     actions.append("piggyback-pig")
 
+        if "piggyback-load" in actions or "piggyback-pig" in actions:
+            piggyback.update_piggyback_index_of_host(HostName(oldname))
+            piggyback.update_piggyback_index_of_host(HostName(newname))
+
         # Logwatch
         if self._rename_host_dir(logwatch_dir, oldname, newname):
             actions.append("logwatch")
@@ -588,6 +596,9 @@ class AutomationRenameHosts(Automation):
         # HW/SW-Inventory
         if self._rename_host_file(var_dir + "/inventory", oldname, newname):
             self._rename_host_file(var_dir + "/inventory", oldname + ".gz", newname + ".gz")
+            self._rename_host_file(
+                var_dir + "/inventory", f".{oldname}.packed", f".{newname}.packed"
+            )
             actions.append("inv")
 
         if self._rename_host_dir(var_dir + "/inventory_archive", oldname, newname):
@@ -1032,6 +1043,7 @@ class ABCDeleteHosts:
                 shutil.rmtree(what_dir)
             except FileNotFoundError:
                 continue
+        piggyback.update_piggyback_index_of_host(hostname)
 
     def _delete_if_exists(self, path: str) -> None:
         """Delete the given file or folder in case it exists"""
@@ -1056,10 +1068,13 @@ class AutomationDeleteHosts(ABCDeleteHosts, Automation):
             f"{precompiled_hostchecks_dir}/{hostname}.py",
             f"{autochecks_dir}/{hostname}.mk",
             f"{counters_dir}/{hostname}",
+            f"{counters_dir}/.{hostname}.log",
             f"{tcp_cache_dir}/{hostname}",
             f"{var_dir}/persisted/{hostname}",
+            f"{var_dir}/persisted/.{hostname}.decoded",
             f"{var_dir}/inventory/{hostname}",
             f"{var_dir}/inventory/{hostname}.gz",
+            f"{var_dir}/inventory/.{hostname}.packed",
             f"{var_dir}/agent_deployment/{hostname}",
         ]
 
@@ -1097,10 +1112,13 @@ class AutomationDeleteHostsKnownRemote(ABCDeleteHosts, Automation):
             f"{precompiled_hostchecks_dir}/{hostname}.py",
             f"{autochecks_dir}/{hostname}.mk",
             f"{counters_dir}/{hostname}",
+            f"{counters_dir}/.{hostname}.log",
             f"{tcp_cache_dir}/{hostname}",
             f"{var_dir}/persisted/{hostname}",
+            f"{var_dir}/persisted/.{hostname}.decoded",
             f"{var_dir}/inventory/{hostname}",
             f"{var_dir}/inventory/{hostname}.gz",
+            f"{var_dir}/inventory/.{hostname}.packed",
         ]
 
     def _delete_host_files(self, hostname: HostName) -> None:
@@ -11,6 +11,7 @@ import ipaddress
 import itertools
 import logging
 import marshal
+import mmap
 import numbers
 import os
 import pickle
@@ -484,7 +485,9 @@ def load(
         _verify_non_duplicate_hosts()
 
 
-def load_packed_config(config_path: ConfigPath) -> None:
+def load_packed_config(
+    config_path: ConfigPath, *, hostnames: Iterable[HostName] | None = None
+) -> None:
     """Load the configuration for the CMK helpers of CMC
 
     These files are written by PackedConfig().
@@ -494,15 +497,42 @@ def load_packed_config(config_path: ConfigPath) -> None:
 
     The validations which are performed during load() also don't need to be performed.
 
+    If hostnames are given, only the hosts (and their nodes and clusters) are
+    loaded. All other hosts are unknown to the loaded configuration.
+
     See Also:
         cmk.base.core_nagios._dump_precompiled_hostcheck()
 
     """
     _initialize_config()
-    globals().update(PackedConfigStore.from_serial(config_path).read())
+    packed_config_store = PackedConfigStore.from_serial(config_path)
+    globals().update(packed_config_store.read())
+    globals().update(_merge_host_configs(packed_config_store.read_host_configs(), hostnames))
     _perform_post_config_loading_actions()
 
 
+def _merge_host_configs(
+    host_configs: Mapping[str, PackedHostConfig], hostnames: Iterable[HostName] | None
+) -> dict[str, Any]:
+    if hostnames is None:
+        selected = list(host_configs)
+    else:
+        hosts = set(hostnames)
+        for hostname in list(hosts):
+            if hostname in host_configs:
+                hosts.update(host_configs[hostname].related_hosts)
+        selected = [hostname for hostname in host_configs if hostname in hosts]
+
+    merged: dict[str, Any] = {}
+    for hostname in selected:
+        for varname, value in host_configs[hostname].variables.items():
+            if isinstance(value, list):
+                merged.setdefault(varname, []).extend(value)
+            else:
+                merged.setdefault(varname, {}).update(value)
+    return merged
+
+
 def _initialize_config() -> None:
     load_default_config()
 
@@ -727,7 +757,17 @@ def _verify_non_duplicate_hosts() -> None:
 
 def save_packed_config(config_path: ConfigPath, config_cache: ConfigCache) -> None:
     """Create and store a precompiled configuration for Checkmk helper processes"""
-    PackedConfigStore.from_serial(config_path).write(PackedConfigGenerator(config_cache).generate())
+    generator = PackedConfigGenerator(config_cache)
+    PackedConfigStore.from_serial(config_path).write(
+        *generator.split_host_configs(generator.generate())
+    )
+
+
+class PackedHostConfig(NamedTuple):
+    """The entries of the host specific config variables of one host"""
+
+    related_hosts: Sequence[HostName]
+    variables: Mapping[str, Any]
 
 
 class PackedConfigGenerator:
@@ -758,6 +798,28 @@ class PackedConfigGenerator:
         "extra_nagios_conf",
     ]
 
+    # These variables contain entries per host. They are stored per host, so that
+    # helpers can load the entries of the hosts they handle only.
+    _host_config_variable_names = [
+        "all_hosts",
+        "clusters",
+        "host_attributes",
+        "host_labels",
+        "host_paths",
+        "host_tags",
+        "hosttags",
+        "ipaddresses",
+        "ipv6addresses",
+        "additional_ipv4addresses",
+        "additional_ipv6addresses",
+        "explicit_snmp_communities",
+        "explicit_service_custom_variables",
+        "management_protocol",
+        "management_snmp_credentials",
+        "management_ipmi_credentials",
+        "cmk_agent_connection",
+    ]
+
     def __init__(self, config_cache: ConfigCache) -> None:
         self._config_cache = config_cache
 
@@ -843,9 +905,95 @@ class PackedConfigGenerator:
 
         return helper_config
 
+    def split_host_configs(
+        self, helper_config: Mapping[str, Any]
+    ) -> tuple[Mapping[str, Any], Mapping[HostName, PackedHostConfig]]:
+        """Move the entries of the host specific variables to the hosts"""
+        global_config = dict(helper_config)
+        host_variables: dict[HostName, dict[str, Any]] = {}
+
+        for varname in self._host_config_variable_names:
+            value = global_config.get(varname)
+            if isinstance(value, list):
+                for entry in value:
+                    host_variables.setdefault(_host_of_entry(entry), {}).setdefault(
+                        varname, []
+                    ).append(entry)
+            elif isinstance(value, dict):
+                for key, entry in value.items():
+                    host_variables.setdefault(_host_of_entry(key), {}).setdefault(varname, {})[
+                        key
+                    ] = entry
+            else:
+                continue
+            del global_config[varname]
+
+        return global_config, {
+            hostname: PackedHostConfig(self._related_hosts(hostname), variables)
+            for hostname, variables in host_variables.items()
+        }
+
+    def _related_hosts(self, hostname: HostName) -> Sequence[HostName]:
+        """The nodes of a cluster, the clusters of a node and their other nodes"""
+        related = set(self._config_cache.nodes_of(hostname) or ())
+        for cluster in self._config_cache.clusters_of(hostname):
+            related.add(cluster)
+            related.update(self._config_cache.nodes_of(cluster) or ())
+        related.discard(hostname)
+        return sorted(related)
+
+
+def _host_of_entry(entry: object) -> HostName:
+    """Entries are keyed by host names, "host|tag|..." or (host name, service)"""
+    if isinstance(entry, tuple):
+        entry = entry[0]
+    return HostName(str(entry).split("|", 1)[0])
+
+
+class PackedHostConfigs(Mapping[str, PackedHostConfig]):
+    """The host specific configs, each one is unpickled on first access"""
+
+    def __init__(
+        self, buffer: bytes | mmap.mmap, index: Mapping[str, tuple[int, int]], data_at: int
+    ) -> None:
+        self._buffer: Final = buffer
+        self._index: Final = index
+        self._data_at: Final = data_at
+        self._loaded: dict[str, PackedHostConfig] = {}
+
+    def __getitem__(self, hostname: str) -> PackedHostConfig:
+        try:
+            return self._loaded[hostname]
+        except KeyError:
+            pass
+
+        offset, length = self._index[hostname]
+        start = self._data_at + offset
+        host_config = self._loaded[hostname] = pickle.loads(  # nosec B301 # BNS:c3c5e9
+            self._buffer[start : start + length]
+        )
+        return host_config
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
 
 class PackedConfigStore:
-    """Caring about persistence of the packed configuration"""
+    """Caring about persistence of the packed configuration
+
+    The config variables are pickled as a whole, the helpers need nearly all of
+    them during startup and they share objects with each other. The host
+    specific configs are pickled one by one, so that a helper only loads the
+    ones of its hosts. The file starts with an index of them::
+
+        magic | length of the index | index | pickled variables | pickled hosts
+    """
+
+    _MAGIC: Final = b"CMKPCF\x00\x03"
+    _HEADER: Final = struct.Struct("<8sQ")
 
     def __init__(self, path: Path) -> None:
         self.path: Final = path
@@ -858,16 +1006,61 @@ class PackedConfigStore:
     def make_packed_config_store_path(cls, config_path: ConfigPath) -> Path:
         return Path(config_path) / "precompiled_check_config.mk"
 
-    def write(self, helper_config: Mapping[str, Any]) -> None:
+    def write(
+        self,
+        helper_config: Mapping[str, Any],
+        host_configs: Mapping[HostName, PackedHostConfig] | None = None,
+    ) -> None:
+        variables = pickle.dumps(dict(helper_config), pickle.HIGHEST_PROTOCOL)
+        blobs = [variables]
+        hosts_index = {}
+        offset = len(variables)
+        for hostname, host_config in (host_configs or {}).items():
+            blob = pickle.dumps(host_config, pickle.HIGHEST_PROTOCOL)
+            blobs.append(blob)
+            hosts_index[hostname] = offset, len(blob)
+            offset += len(blob)
+
+        raw_index = pickle.dumps((len(variables), hosts_index), pickle.HIGHEST_PROTOCOL)
+
         self.path.parent.mkdir(parents=True, exist_ok=True)
         tmp_path = self.path.with_suffix(self.path.suffix + ".compiled")
         with tmp_path.open("wb") as compiled_file:
-            pickle.dump(helper_config, compiled_file)
+            compiled_file.write(self._HEADER.pack(self._MAGIC, len(raw_index)))
+            compiled_file.write(raw_index)
+            compiled_file.writelines(blobs)
         tmp_path.rename(self.path)
 
     def read(self) -> Mapping[str, Any]:
+        if (buffer := self._map()) is None:
+            # Written by a version not knowing about the host specific configs
+            with self.path.open("rb") as f:
+                return pickle.load(f)  # nosec B301 # BNS:c3c5e9
+
+        data_at, variables_length, _hosts_index = self._read_index(buffer)
+        return pickle.loads(buffer[data_at : data_at + variables_length])  # nosec B301 # BNS:c3c5e9
+
+    def read_host_configs(self) -> Mapping[str, PackedHostConfig]:
+        if (buffer := self._map()) is None:
+            return {}
+
+        data_at, _variables_length, hosts_index = self._read_index(buffer)
+        return PackedHostConfigs(buffer, hosts_index, data_at)
+
+    def _map(self) -> mmap.mmap | None:
         with self.path.open("rb") as f:
-            return pickle.load(f)  # nosec B301 # BNS:c3c5e9
+            if f.read(len(self._MAGIC)) != self._MAGIC:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read_index(self, buffer: mmap.mmap) -> tuple[int, int, Mapping[str, tuple[int, int]]]:
+        _magic, index_length = self._HEADER.unpack_from(buffer)
+        index_at = self._HEADER.size
+        data_at = index_at + index_length
+        variables_length, hosts_index = pickle.loads(  # nosec B301 # BNS:c3c5e9
+            buffer[index_at:data_at]
+        )
+        return data_at, variables_length, hosts_index
 
 
 @contextlib.contextmanager
@@ -3120,8 +3313,13 @@ class ConfigCache:
                 return SNMPBackendEnum.INLINE
             if host_backend == "classic":
                 return SNMPBackendEnum.CLASSIC
+            if host_backend == "pooled":
+                return SNMPBackendEnum.POOLED
             raise MKGeneralException("Bad Host SNMP Backend configuration: %s" % host_backend)
 
+        if snmp_backend_default == "pooled":
+            return SNMPBackendEnum.POOLED
+
         # TODO(sk): remove this when netsnmp is fixed
         # NOTE: Force usage of CLASSIC with SNMP-v1 to prevent memory leak in the netsnmp
         if self._is_host_snmp_v1(host_name):
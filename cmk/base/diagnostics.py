@@ -671,16 +671,17 @@ class CheckmkOverviewDiagnosticsElement(ABCDiagnosticsElementJSONDump):
         if checkmk_server_name is None:
             raise DiagnosticsElementError("No Checkmk server found")
 
+        path = ("software", "applications", "check_mk")
         try:
-            tree = load_tree(Path(cmk.utils.paths.inventory_output_dir) / checkmk_server_name)
+            tree = load_tree(
+                Path(cmk.utils.paths.inventory_output_dir) / checkmk_server_name, paths=[path]
+            )
         except FileNotFoundError:
             raise DiagnosticsElementError(
                 "No HW/SW inventory tree of '%s' found" % checkmk_server_name
             )
 
-        if (
-            node := tree.get_node(("software", "applications", "check_mk"))
-        ) is None or node.is_empty():
+        if (node := tree.get_node(path)) is None or node.is_empty():
             raise DiagnosticsElementError(
                 "No HW/SW inventory node 'Software > Applications > Checkmk'"
             )
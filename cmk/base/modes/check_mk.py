@@ -1097,13 +1097,15 @@ def mode_flush(hosts: list[HostName]) -> None:  # pylint: disable=too-many-branc
         out.output("%-20s: " % host)
         flushed = False
 
-        # counters
-        try:
-            os.remove(cmk.utils.paths.counters_dir + "/" + host)
-            out.output(tty.bold + tty.blue + " counters")
-            flushed = True
-        except OSError:
-            pass
+        # counters and the log of their changes
+        for counters_file in (host, f".{host}.log"):
+            try:
+                os.remove(cmk.utils.paths.counters_dir + "/" + counters_file)
+                if not flushed:
+                    out.output(tty.bold + tty.blue + " counters")
+                flushed = True
+            except OSError:
+                pass
 
         # cache files
         d = 0
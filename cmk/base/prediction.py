@@ -6,7 +6,6 @@
 
 import json
 import logging
-import math
 import time
 from collections.abc import Callable
 from typing import Final, NamedTuple
@@ -19,17 +18,18 @@ from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import VERBOSE
 from cmk.utils.prediction import (
     ConsolidationFunctionName,
-    DataStats,
     EstimatedLevels,
     PredictionData,
     PredictionInfo,
 )
 from cmk.utils.prediction import PredictionParameters as _PredictionParameters
 from cmk.utils.prediction import (
+    PredictionSlices,
     PredictionStore,
     RRDColumnFunction,
     Seconds,
     Timegroup,
+    TimeSeries,
     TimeSeriesValues,
     Timestamp,
     TimeWindow,
@@ -143,74 +143,85 @@ def _time_slices(
     return slices
 
 
-def _retrieve_grouped_data_from_rrd(
+def _fetch_slices(
     rrd_column: RRDColumnFunction,
     time_windows: _TimeSlices,
+    last_slices: PredictionSlices | None = None,
+) -> list[TimeSeries]:
+    "Fetch all time slices, except the ones completed before the last computation"
+    known_slices = {} if last_slices is None else last_slices.slices
+    slices = []
+    for start, end in time_windows:
+        if (known_slice := known_slices.get(start)) is None:
+            slices.append(rrd_column(start, end))
+            continue
+        (slice_start, slice_end, step), values = known_slice
+        slices.append(TimeSeries(values, (start + slice_start, start + slice_end, step)))
+    return slices
+
+
+def _upsample_slices(
+    time_windows: _TimeSlices,
+    slices: list[TimeSeries],
 ) -> tuple[TimeWindow, list[TimeSeriesValues]]:
-    "Collect all time slices and up-sample them to same resolution"
+    "Up-sample all time slices to the same resolution"
     from_time = time_windows[0][0]
 
-    slices = [(rrd_column(start, end), from_time - start) for start, end in time_windows]
-
     # The resolutions of the different time ranges differ. We upsample
     # to the best resolution. We assume that the youngest slice has the
     # finest resolution.
-    twindow = slices[0][0].twindow
+    twindow = slices[0].twindow
     if twindow[2] == 0:
         raise MKGeneralException("Got no historic metrics")
 
-    return twindow, [ts.bfill_upsample(twindow, shift) for ts, shift in slices]
-
-
-def _data_stats(slices: list[TimeSeriesValues]) -> DataStats:
-    "Statistically summarize all the upsampled RRD data"
-
-    descriptors: DataStats = []
-
-    for time_column in zip(*slices):
-        point_line = [x for x in time_column if x is not None]
-        if point_line:
-            average = sum(point_line) / float(len(point_line))
-            descriptors.append(
-                [
-                    average,
-                    min(point_line),
-                    max(point_line),
-                    _std_dev(point_line, average),
-                ]
-            )
-        else:
-            descriptors.append([None, None, None, None])
-
-    return descriptors
+    return twindow, [
+        ts.bfill_upsample(twindow, from_time - start)
+        for ts, (start, _end) in zip(slices, time_windows)
+    ]
 
 
 def _calculate_data_for_prediction(
     time_windows: _TimeSlices,
     rrd_datacolumn: RRDColumnFunction,
-) -> PredictionData:
-    twindow, slices = _retrieve_grouped_data_from_rrd(rrd_datacolumn, time_windows)
-
-    descriptors = _data_stats(slices)
-
-    return PredictionData(
-        columns=["average", "min", "max", "stdev"],
-        points=descriptors,
-        num_points=len(descriptors),
-        data_twindow=list(twindow[:2]),
-        step=twindow[2],
+    cf: ConsolidationFunctionName,
+    now: Timestamp,
+    last_slices: PredictionSlices | None = None,
+) -> tuple[PredictionData, PredictionSlices]:
+    """Compute the prediction and the slices to reuse for the next one
+
+    Only the fetch is incremental: the slices completed since the last
+    computation are fetched, the expired ones are dropped. Upsampling the
+    slices and computing the statistics stay O(horizon), i.e. proportional to
+    all the points of all the slices, on every call. Running sums could not
+    forget the minimum or maximum of an expired slice."""
+    slices = _fetch_slices(
+        rrd_datacolumn,
+        time_windows,
+        last_slices if last_slices is not None and last_slices.cf == cf else None,
     )
+    twindow, upsampled_slices = _upsample_slices(time_windows, slices)
+
+    from cmk.utils import prediction_arrays  # pylint: disable=import-outside-toplevel
 
+    descriptors = prediction_arrays.data_stats(upsampled_slices)
 
-def _std_dev(point_line: list[float], average: float) -> float:
-    samples = len(point_line)
-    # In the case of a single data-point an unbiased standard deviation is
-    # undefined. In this case we take the magnitude of the measured value
-    # itself as a measure of the dispersion.
-    if samples == 1:
-        return abs(average)
-    return math.sqrt(
-        abs(sum(p**2 for p in point_line) - average**2 * samples) / float(samples - 1)
+    return (
+        PredictionData(
+            columns=["average", "min", "max", "stdev"],
+            points=descriptors,
+            num_points=len(descriptors),
+            data_twindow=list(twindow[:2]),
+            step=twindow[2],
+        ),
+        PredictionSlices(
+            cf=cf,
+            # The RRD may not have consolidated the last step of a slice yet
+            slices={
+                start: ((ts.start - start, ts.end - start, ts.step), ts.values)
+                for (start, end), ts in zip(time_windows, slices)
+                if end + ts.step <= now
+            },
+        ),
     )
 
 
@@ -273,6 +284,7 @@ def get_levels(
 
     if data_for_pred is None:
         logger.log(VERBOSE, "Calculating prediction data for time group %s", timegroup)
+        last_slices = prediction_store.get_slices(timegroup)
         prediction_store.clean_prediction_files(timegroup, force=True)
 
         time_windows = _time_slices(now, int(params["horizon"] * 86400), period_info, timegroup)
@@ -281,7 +293,13 @@ def get_levels(
             livestatus.LocalConnection(), hostname, service_description, dsname, cf
         )
 
-        data_for_pred = _calculate_data_for_prediction(time_windows, rrd_datacolumn)
+        data_for_pred, slices = _calculate_data_for_prediction(
+            time_windows,
+            rrd_datacolumn,
+            cf,
+            now,
+            last_slices,
+        )
 
         info = PredictionInfo(
             name=timegroup,
@@ -293,6 +311,7 @@ def get_levels(
             params=params,
         )
         prediction_store.save_predictions(info, data_for_pred)
+        prediction_store.save_slices(timegroup, slices)
 
     # Find reference value in data_for_pred
     index = int(rel_time / data_for_pred.step)
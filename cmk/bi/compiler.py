@@ -6,11 +6,14 @@
 from __future__ import annotations
 
 import ast
+import multiprocessing
 import os
 import pickle
+import sys
 import time
+from collections.abc import Iterable, Iterator, Mapping
 from pathlib import Path
-from typing import Optional, TypedDict
+from typing import NamedTuple, Optional, TypedDict
 
 from redis import Redis
 
@@ -18,14 +21,16 @@ from cmk.utils import store
 from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.i18n import _
 from cmk.utils.log import logger
-from cmk.utils.paths import default_config_dir
+from cmk.utils.paths import default_config_dir, omd_root
 from cmk.utils.redis import get_redis_client
+from cmk.utils.type_defs import HostName
 
 from cmk.bi.aggregation import BIAggregation
 from cmk.bi.data_fetcher import BIStructureFetcher, get_cache_dir, SiteProgramStart
-from cmk.bi.lib import SitesCallback
+from cmk.bi.lib import BIHostData, SitesCallback
 from cmk.bi.packs import BIAggregationPacks
-from cmk.bi.searcher import BISearcher
+from cmk.bi.rule_interface import ABCBIRule, bi_rule_id_registry
+from cmk.bi.searcher import BISearchDependencies, BISearcher
 from cmk.bi.trees import BICompiledAggregation, BICompiledRule, FrozenBIInfo
 from cmk.bi.type_defs import frozen_aggregations_dir
 
@@ -36,16 +41,105 @@ class ConfigStatus(TypedDict):
     online_sites: set[SiteProgramStart]
 
 
+class CompilationDependencies(TypedDict):
+    hosts: Mapping[HostName, tuple]
+    aggregations: Mapping[str, BISearchDependencies]
+
+
+def _host_snapshot(host: BIHostData) -> tuple:
+    # Plain tuples are much faster to pickle than the named tuples
+    return (
+        *host[:4],
+        {description: tuple(service) for description, service in host.services.items()},
+        *host[5:],
+    )
+
+
+class _CompilationResult(NamedTuple):
+    aggr_id: str
+    schema: dict
+    dependencies: BISearchDependencies
+    compile_time: float
+    serialize_time: float
+    # Only set when compiled in this process.  The workers don't send it back,
+    # it is rebuilt from the schema instead.
+    compiled: BICompiledAggregation | None = None
+
+
+# The searcher and the aggregations to compile.  In the compilation workers
+# they are set once by the pool initializer, not sent along with every task.
+_compilation_context: tuple[BISearcher, Mapping[str, BIAggregation]] | None = None
+
+
+def _init_compilation_worker(
+    bi_rules: Iterable[ABCBIRule],
+    bi_searcher: BISearcher,
+    aggregations: Mapping[str, BIAggregation],
+) -> None:
+    # The actions look up the rules they call in the registry, which is filled
+    # when the packs are loaded.  A spawned worker starts with an empty one.
+    global _compilation_context
+    bi_rule_id_registry.clear()
+    for bi_rule in bi_rules:
+        bi_rule_id_registry.register(bi_rule)
+    _compilation_context = (bi_searcher, aggregations)
+
+
+def _compile_aggregation(aggr_id: str) -> _CompilationResult:
+    assert _compilation_context is not None
+    bi_searcher, aggregations = _compilation_context
+    start = time.perf_counter()
+    with bi_searcher.record_dependencies() as dependencies:
+        compiled_aggregation = aggregations[aggr_id].compile(bi_searcher)
+    compiled = time.perf_counter()
+    schema = compiled_aggregation.serialize()
+    return _CompilationResult(
+        aggr_id,
+        schema,
+        dependencies,
+        compiled - start,
+        time.perf_counter() - compiled,
+        compiled_aggregation,
+    )
+
+
+def _compile_aggregation_in_worker(aggr_id: str) -> _CompilationResult:
+    return _compile_aggregation(aggr_id)._replace(compiled=None)
+
+
+def _worker_context() -> multiprocessing.context.SpawnContext:
+    # The compiler runs in the apache processes of the GUI, which must not be
+    # forked: the workers would inherit their threads, locks and connections.
+    # The workers are spawned as fresh interpreters instead.  Within mod_wsgi
+    # sys.executable is not the python interpreter, so use the one of the site.
+    context = multiprocessing.get_context("spawn")
+    if (site_python := omd_root / "bin" / "python3").exists():
+        context.set_executable(str(site_python))
+    else:
+        context.set_executable(sys.executable)
+    return context
+
+
 class BICompiler:
-    def __init__(self, bi_configuration_file: str, sites_callback: SitesCallback) -> None:
+    def __init__(
+        self,
+        bi_configuration_file: str,
+        sites_callback: SitesCallback,
+        compilation_workers: int = 1,
+    ) -> None:
+        """compilation_workers is the number of processes compiling the aggregations.
+        With one worker, the default, they are compiled in this process."""
         self._sites_callback = sites_callback
         self._bi_configuration_file = bi_configuration_file
+        self._compilation_workers = compilation_workers
 
         self._logger = logger.getChild("bi.compiler")
         self._compiled_aggregations: dict[str, BICompiledAggregation] = {}
         self._path_compilation_lock = Path(get_cache_dir(), "compilation.LOCK")
         self._path_compilation_timestamp = Path(get_cache_dir(), "last_compilation")
         self._path_compiled_aggregations = Path(get_cache_dir(), "compiled_aggregations")
+        self._path_compilation_dependencies = Path(get_cache_dir(), "compilation_dependencies")
+        self._path_compilation_times = Path(get_cache_dir(), "compilation_times")
         self._path_compiled_aggregations.mkdir(parents=True, exist_ok=True)
 
         self._redis_client: Redis[str] | None = None
@@ -215,29 +309,69 @@ class BICompiler:
                 self._logger.debug("No compilation required. An other process already compiled it")
                 return
 
+            # If only the monitoring data has changed, the aggregations not depending on
+            # the changed hosts are kept as they are.
+            previous_dependencies = (
+                None
+                if current_configstatus["configfile_timestamp"] > self._get_compilation_timestamp()
+                else self._load_compilation_dependencies()
+            )
+
             self.prepare_for_compilation(current_configstatus["online_sites"])
 
             # Compile the raw tree
             all_aggregations_by_id: dict[str, BIAggregation] = {
                 x.id: x for x in self._bi_packs.get_all_aggregations()
             }
-            for aggregation in all_aggregations_by_id.values():
-                start = time.time()
-                self._compiled_aggregations[aggregation.id] = aggregation.compile(self.bi_searcher)
-                self._logger.debug(f"Compilation of {aggregation.id} took {time.time() - start:f}")
-            self._verify_aggregation_title_uniqueness(self._compiled_aggregations)
+            outdated_aggr_ids = self._outdated_aggregation_ids(
+                all_aggregations_by_id, previous_dependencies
+            )
+            self._logger.debug(
+                "Compiling %d of %d aggregations"
+                % (len(outdated_aggr_ids), len(all_aggregations_by_id))
+            )
 
-            for aggr_id, compiled_aggr in self._compiled_aggregations.items():
-                start = time.time()
-                result = compiled_aggr.serialize()
-                self._logger.debug(
-                    "Schema dump %s took config took %f (%d branches)"
-                    % (aggr_id, time.time() - start, len(compiled_aggr.branches))
+            results = {
+                result.aggr_id: result
+                for result in self._compile_aggregations(
+                    {aggr_id: all_aggregations_by_id[aggr_id] for aggr_id in outdated_aggr_ids}
                 )
-                self._save_data(self._path_compiled_aggregations.joinpath(aggr_id), result)
+            }
+
+            self._compiled_aggregations = {}
+            dependencies: dict[str, BISearchDependencies] = {}
+            for aggr_id in all_aggregations_by_id:
+                if (result := results.get(aggr_id)) is None:
+                    assert previous_dependencies is not None
+                    self._compiled_aggregations[aggr_id] = BIAggregation.create_trees_from_schema(
+                        self._load_data(self._path_compiled_aggregations.joinpath(aggr_id))
+                    )
+                    dependencies[aggr_id] = previous_dependencies["aggregations"][aggr_id]
+                    continue
+                self._compiled_aggregations[aggr_id] = (
+                    BIAggregation.create_trees_from_schema(result.schema)
+                    if result.compiled is None
+                    else result.compiled
+                )
+                dependencies[aggr_id] = result.dependencies
+            self._verify_aggregation_title_uniqueness(self._compiled_aggregations)
+
+            for aggr_id, result in results.items():
+                self._save_data(self._path_compiled_aggregations.joinpath(aggr_id), result.schema)
+            self._save_compilation_times(results.values())
 
             self._compiled_aggregations = self._manage_frozen_branches(self._compiled_aggregations)
             self._generate_part_of_aggregation_lookup(self._compiled_aggregations)
+            self._save_data(
+                self._path_compilation_dependencies,
+                CompilationDependencies(
+                    hosts={
+                        host_name: _host_snapshot(host)
+                        for host_name, host in self._bi_structure_fetcher.hosts.items()
+                    },
+                    aggregations=dependencies,
+                ),
+            )
 
         known_sites = {kv[0]: kv[1] for kv in current_configstatus.get("known_sites", set())}
         self._cleanup_vanished_aggregations()
@@ -246,6 +380,102 @@ class BICompiler:
             str(self._path_compilation_timestamp), str(current_configstatus["configfile_timestamp"])
         )
 
+    def _compile_aggregations(
+        self, aggregations: Mapping[str, BIAggregation]
+    ) -> Iterator[_CompilationResult]:
+        """Compile and serialize the aggregations, in parallel if there are several workers
+
+        The aggregations are independent of each other given the host data of
+        the searcher, so they are distributed over a pool of spawned processes.
+        Every worker receives the searcher and the aggregations once at its start.
+
+        Only the compilation itself runs in parallel.  The workers send back the
+        serialized aggregations, which are rebuilt one after the other in this
+        process by create_trees_from_schema.  This takes a good part of the
+        compilation time, so the speedup stays well below the number of workers.
+        """
+        global _compilation_context
+        processes = min(self._compilation_workers, len(aggregations))
+        if processes < 2:
+            _compilation_context = (self.bi_searcher, aggregations)
+            try:
+                yield from self._log_compilation_results(map(_compile_aggregation, aggregations))
+            finally:
+                _compilation_context = None
+            return
+
+        with _worker_context().Pool(
+            processes,
+            initializer=_init_compilation_worker,
+            initargs=(list(bi_rule_id_registry.values()), self.bi_searcher, aggregations),
+        ) as pool:
+            yield from self._log_compilation_results(
+                pool.imap_unordered(
+                    _compile_aggregation_in_worker,
+                    aggregations,
+                    chunksize=max(1, len(aggregations) // (processes * 8)),
+                )
+            )
+
+    def _log_compilation_results(
+        self, results: Iterator[_CompilationResult]
+    ) -> Iterator[_CompilationResult]:
+        for result in results:
+            self._logger.debug(
+                "Compilation of %s took %f, schema dump took %f"
+                % (result.aggr_id, result.compile_time, result.serialize_time)
+            )
+            yield result
+
+    def _save_compilation_times(self, results: Iterable[_CompilationResult]) -> None:
+        store.save_object_to_file(
+            self._path_compilation_times,
+            {
+                result.aggr_id: {
+                    "compile": result.compile_time,
+                    "serialize": result.serialize_time,
+                }
+                for result in results
+            },
+            pretty=True,
+        )
+
+    def _outdated_aggregation_ids(
+        self,
+        aggregations: Mapping[str, BIAggregation],
+        previous_dependencies: CompilationDependencies | None,
+    ) -> set[str]:
+        if previous_dependencies is None:
+            return set(aggregations)
+
+        previous_hosts = previous_dependencies["hosts"]
+        hosts = self._bi_structure_fetcher.hosts
+        changed_hosts = {
+            host_name: host
+            for host_name in previous_hosts.keys() | hosts.keys()
+            if (host := hosts.get(host_name)) is None
+            or previous_hosts.get(host_name) != _host_snapshot(host)
+        }
+        return {
+            aggr_id
+            for aggr_id in aggregations
+            if (aggr_dependencies := previous_dependencies["aggregations"].get(aggr_id)) is None
+            or not self._path_compiled_aggregations.joinpath(aggr_id).exists()
+            or aggr_dependencies.is_affected_by(changed_hosts)
+        }
+
+    def _load_compilation_dependencies(self) -> CompilationDependencies | None:
+        try:
+            if not (raw_dependencies := self._load_data(self._path_compilation_dependencies)):
+                return None
+            return CompilationDependencies(
+                hosts=raw_dependencies["hosts"],
+                aggregations=raw_dependencies["aggregations"],
+            )
+        except Exception as e:
+            self._logger.warning("Can not load the compilation dependencies %s" % str(e))
+            return None
+
     def _cleanup_vanished_aggregations(self) -> None:
         valid_aggregations = list(self._compiled_aggregations.keys())
         for path_object in self._path_compiled_aggregations.iterdir():
@@ -352,7 +582,7 @@ class BICompiler:
 
         return latest_timestamp
 
-    def _save_data(self, filepath: Path, data: dict) -> None:
+    def _save_data(self, filepath: Path, data: Mapping) -> None:
         store.save_bytes_to_file(filepath, pickle.dumps(data))
 
     def _load_data(self, filepath: Path) -> dict:
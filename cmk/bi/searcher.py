@@ -3,7 +3,9 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from collections.abc import Iterable, Mapping
+from collections.abc import Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from typing import Any
 
 from cmk.utils.regex import regex
@@ -34,7 +36,62 @@ from cmk.bi.lib import ABCBISearcher, BIHostData, BIHostSearchMatch, BIServiceSe
 #   +----------------------------------------------------------------------+
 
 
+@dataclass
+class BISearchDependencies:
+    """What the compilation of an aggregation depends on
+
+    These are the searches run during the compilation, with all macros
+    replaced, and the hosts found by them (including the parents and
+    children of the found hosts, which may be referred to).  A change of any
+    other host can only change the compiled aggregation if one of the
+    searches finds that host now.
+    """
+
+    host_searches: dict[str, dict] = field(default_factory=dict)
+    service_searches: dict[str, dict] = field(default_factory=dict)
+    host_name_patterns: set[str] = field(default_factory=set)
+    host_names: set[HostName] = field(default_factory=set)
+
+    def is_affected_by(self, changed_hosts: Mapping[HostName, BIHostData | None]) -> bool:
+        """Check if the compilation may change
+
+        `changed_hosts` are the new, changed and removed (None) hosts.
+        """
+        if not self.host_names.isdisjoint(changed_hosts):
+            return True
+
+        searcher = BISearcher()
+        searcher.set_hosts({name: host for name, host in changed_hosts.items() if host is not None})
+        if not searcher.hosts:
+            return False
+        hosts = list(searcher.hosts.values())
+        return (
+            any(searcher.search_hosts(conditions) for conditions in self.host_searches.values())
+            or any(
+                searcher.search_services(conditions)
+                for conditions in self.service_searches.values()
+            )
+            or any(
+                searcher.get_host_name_matches(hosts, pattern)[0]
+                for pattern in self.host_name_patterns
+            )
+        )
+
+
 class BISearcher(ABCBISearcher):
+    def __init__(self) -> None:
+        super().__init__()
+        self._dependencies: BISearchDependencies | None = None
+
+    @contextmanager
+    def record_dependencies(self) -> Iterator[BISearchDependencies]:
+        """Record the searches and their results while in this context"""
+        self._dependencies = dependencies = BISearchDependencies()
+        try:
+            yield dependencies
+        finally:
+            self._dependencies = None
+
     def set_hosts(self, hosts: dict[HostName, BIHostData]) -> None:
         self.cleanup()
         self.hosts = hosts
@@ -47,6 +104,16 @@ class BISearcher(ABCBISearcher):
         self._host_regex_miss_cache.clear()
 
     def search_hosts(self, conditions: dict) -> list[BIHostSearchMatch]:
+        matches = self._search_hosts(conditions)
+        if self._dependencies is not None:
+            self._dependencies.host_searches.setdefault(repr(conditions), conditions)
+            for match in matches:
+                self._dependencies.host_names.add(match.host.name)
+                self._dependencies.host_names.update(match.host.children)
+                self._dependencies.host_names.update(match.host.parents)
+        return matches
+
+    def _search_hosts(self, conditions: dict) -> list[BIHostSearchMatch]:
         hosts, matched_re_groups = self.filter_host_choice(
             list(self.hosts.values()), conditions["host_choice"]
         )
@@ -64,7 +131,7 @@ class BISearcher(ABCBISearcher):
             return hosts, self._host_match_groups(hosts)
 
         if condition["type"] == "host_name_regex":
-            return self.get_host_name_matches(hosts, condition["pattern"])
+            return self._get_host_name_matches(hosts, condition["pattern"])
 
         if condition["type"] == "host_alias_regex":
             return self.get_host_alias_matches(hosts, condition["pattern"])
@@ -78,6 +145,17 @@ class BISearcher(ABCBISearcher):
         self,
         hosts: list[BIHostData],
         pattern: str,
+    ) -> tuple[list[BIHostData], dict]:
+        matched_hosts, matched_re_groups = self._get_host_name_matches(hosts, pattern)
+        if self._dependencies is not None:
+            self._dependencies.host_name_patterns.add(pattern)
+            self._dependencies.host_names.update(host.name for host in matched_hosts)
+        return matched_hosts, matched_re_groups
+
+    def _get_host_name_matches(
+        self,
+        hosts: list[BIHostData],
+        pattern: str,
     ) -> tuple[list[BIHostData], dict]:
         if pattern == "(.*)":
             return hosts, self._host_match_groups(hosts)
@@ -156,11 +234,16 @@ class BISearcher(ABCBISearcher):
         return matched_services
 
     def search_services(self, conditions: dict) -> list[BIServiceSearchMatch]:
-        host_matches: list[BIHostSearchMatch] = self.search_hosts(conditions)
+        host_matches: list[BIHostSearchMatch] = self._search_hosts(conditions)
         service_matches = self.get_service_description_matches(
             host_matches, conditions["service_regex"]
         )
         service_matches = self.filter_service_labels(service_matches, conditions["service_labels"])
+        if self._dependencies is not None:
+            self._dependencies.service_searches.setdefault(repr(conditions), conditions)
+            self._dependencies.host_names.update(
+                match.host_match.host.name for match in service_matches
+            )
         return service_matches
 
     def filter_host_folder(
@@ -6,9 +6,10 @@
 from __future__ import annotations
 
 import abc
+import hashlib
 import logging
 import time
-from collections.abc import Iterator, Mapping, MutableMapping, Sequence
+from collections.abc import Container, Iterable, Iterator, Mapping, MutableMapping, Sequence
 from typing import final, Final, NamedTuple
 
 import cmk.utils.agent_simulator as agent_simulator
@@ -25,9 +26,36 @@ from .host_sections import HostSections
 from .type_defs import AgentRawDataSection, NO_SELECTION, SectionNameCollection
 
 
+class SectionContent(Iterable[AgentRawData]):
+    """The lines of a section
+
+    The content is kept as the blocks of raw data it was found in and only
+    split into lines when it is iterated over, that is, if the section is
+    actually needed.  Blank lines are skipped.
+    """
+
+    def __init__(self, *, strip: bool) -> None:
+        self.strip: Final = strip
+        self._blocks: list[bytes | memoryview] = []
+
+    def append(self, block: bytes | memoryview) -> None:
+        self._blocks.append(block)
+
+    def update_digest(self, digest: hashlib._Hash) -> None:
+        for block in self._blocks:
+            digest.update(block)
+
+    def __iter__(self) -> Iterator[AgentRawData]:
+        for block in self._blocks:
+            for line in bytes(block).split(b"\n"):
+                if not line.strip():
+                    continue
+                yield AgentRawData(line.strip() if self.strip else line.rstrip(b"\r"))
+
+
 class SectionWithHeader(NamedTuple):
     header: SectionMarker
-    section: list[AgentRawData]
+    section: SectionContent
 
 
 MutableSection = list[SectionWithHeader]
@@ -93,6 +121,9 @@ class ParserState(abc.ABC):
     def do_action(self, line: bytes) -> ParserState:
         raise NotImplementedError()
 
+    def do_block_action(self, block: memoryview) -> None:
+        """Handle the lines between two markers at once, ignore them by default"""
+
     @abc.abstractmethod
     def on_section_header(self, line: bytes) -> ParserState:
         raise NotImplementedError()
@@ -131,7 +162,9 @@ class ParserState(abc.ABC):
             HostSectionParser.__name__,
         )
         if not self.sections or self.sections[-1].header != section_header:
-            self.sections.append(SectionWithHeader(section_header, []))
+            self.sections.append(
+                SectionWithHeader(section_header, SectionContent(strip=not section_header.nostrip))
+            )
         return HostSectionParser(
             self.hostname,
             self.sections,
@@ -179,7 +212,9 @@ class ParserState(abc.ABC):
             not self.piggyback_sections[current_host]
             or self.piggyback_sections[current_host][-1].header != section_header
         ):
-            self.piggyback_sections[current_host].append(SectionWithHeader(section_header, []))
+            self.piggyback_sections[current_host].append(
+                SectionWithHeader(section_header, SectionContent(strip=False))
+            )
         return PiggybackSectionParser(
             self.hostname,
             self.sections,
@@ -339,10 +374,13 @@ class PiggybackSectionParser(ParserState):
         self.current_section: Final = current_section
 
     def do_action(self, line: bytes) -> ParserState:
-        assert self.piggyback_sections[self.current_host][-1].header == self.current_section
-        self.piggyback_sections[self.current_host][-1].section.append(AgentRawData(line))
+        self.do_block_action(memoryview(line))
         return self
 
+    def do_block_action(self, block: memoryview) -> None:
+        assert self.piggyback_sections[self.current_host][-1].header == self.current_section
+        self.piggyback_sections[self.current_host][-1].section.append(block)
+
     def on_piggyback_header(self, line: bytes) -> ParserState:
         piggyback_header = PiggybackMarker.from_headerline(
             line,
@@ -438,12 +476,12 @@ class HostSectionParser(ParserState):
         self.current_section: Final = current_section
 
     def do_action(self, line: bytes) -> ParserState:
-        if not self.current_section.nostrip:
-            line = line.strip()
+        self.do_block_action(memoryview(line))
+        return self
 
+    def do_block_action(self, block: memoryview) -> None:
         assert self.sections[-1].header == self.current_section
-        self.sections[-1].section.append(AgentRawData(line))
-        return self
+        self.sections[-1].section.append(block)
 
     def on_piggyback_header(self, line: bytes) -> ParserState:
         piggyback_header = PiggybackMarker.from_headerline(
@@ -505,19 +543,12 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
         now = int(time.time())
 
         raw_sections, piggyback_sections = self._parse_host_section(raw_data)
-        section_info = {
-            header.name: header
-            for header, _ in raw_sections
-            if selection is NO_SELECTION or header.name in selection
-        }
-
-        def decode_sections(
-            sections: ImmutableSection,
-        ) -> MutableMapping[SectionName, list[AgentRawDataSection]]:
-            out: MutableMapping[SectionName, list[AgentRawDataSection]] = {}
-            for header, content in sections:
-                out.setdefault(header.name, []).extend(header.parse_line(line) for line in content)
-            return out
+        selected_sections = [
+            section
+            for section in raw_sections
+            if selection is NO_SELECTION or section.header.name in selection
+        ]
+        section_info = {header.name: header for header, _ in selected_sections}
 
         def flatten_piggyback_section(
             sections: ImmutableSection,
@@ -544,13 +575,12 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
                             header.separator,
                         )
                     ).encode(header.encoding)
-                yield from (bytes(line) for line in content)
+                yield from content
 
-        sections = {
-            name: content
-            for name, content in decode_sections(raw_sections).items()
-            if selection is NO_SELECTION or name in selection
-        }
+        sections = self._decode_sections(
+            selected_sections,
+            available={header.name for header, _ in raw_sections},
+        )
         piggybacked_raw_data = {
             header.hostname: list(
                 flatten_piggyback_section(
@@ -587,11 +617,68 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
             piggybacked_raw_data=piggybacked_raw_data,
         )
 
+    def _decode_sections(
+        self,
+        sections: ImmutableSection,
+        *,
+        available: Container[SectionName],
+    ) -> Mapping[SectionName, Sequence[AgentRawDataSection]]:
+        """Decode the sections, reuse the result for unchanged cached sections
+
+        The content of sections with the `cached` option usually does not
+        change for a number of runs.  Such sections are identified by the
+        digest of their raw data and their decoded content is kept in the
+        section store.
+        """
+        sections_by_name: dict[SectionName, list[SectionWithHeader]] = {}
+        for section in sections:
+            sections_by_name.setdefault(section.header.name, []).append(section)
+
+        digests = {
+            section_name: _digest(parts)
+            for section_name, parts in sections_by_name.items()
+            if all(header.cached is not None for header, _content in parts)
+        }
+        stored = self.section_store.load_decoded() if digests else {}
+
+        decoded: dict[SectionName, Sequence[AgentRawDataSection]] = {}
+        for section_name, parts in sections_by_name.items():
+            if (entry := stored.get(section_name)) is not None and entry[0] == digests.get(
+                section_name
+            ):
+                self._logger.debug("Using decoded section %r, raw data is unchanged", section_name)
+                decoded[section_name] = entry[1]
+                continue
+            decoded[section_name] = [
+                header.parse_line(line) for header, content in parts for line in content
+            ]
+
+        # Keep the entries of the sections that have not been selected this time.
+        new_stored = {
+            section_name: entry
+            for section_name, entry in stored.items()
+            if section_name in available and section_name not in sections_by_name
+        }
+        new_stored.update(
+            (section_name, (digest, decoded[section_name]))
+            for section_name, digest in digests.items()
+        )
+        if new_stored.keys() != stored.keys() or any(
+            stored[section_name][0] != digest for section_name, digest in digests.items()
+        ):
+            self.section_store.store_decoded(new_stored)
+
+        return decoded
+
     def _parse_host_section(
         self,
         raw_data: AgentRawData,
     ) -> tuple[ImmutableSection, Mapping[PiggybackMarker, ImmutableSection]]:
-        """Split agent output in chunks, splits lines by whitespaces."""
+        """Split agent output in chunks
+
+        Only the marker lines are passed to the state machine one by one, the
+        lines in between are handed over as whole blocks.
+        """
         parser: ParserState = NOOPParser(
             self.hostname,
             [],
@@ -600,7 +687,42 @@ class AgentParser(Parser[AgentRawData, AgentRawDataSection]):
             encoding_fallback=self.encoding_fallback,
             logger=self._logger,
         )
-        for line in raw_data.split(b"\n"):
-            parser = parser(line.rstrip(b"\r"))
+        for block, marker in _split_at_markers(raw_data):
+            parser.do_block_action(block)
+            if marker is not None:
+                parser = parser(marker)
 
         return parser.sections, parser.piggyback_sections
+
+
+def _digest(sections: ImmutableSection) -> str:
+    digest = hashlib.sha256()
+    for header, content in sections:
+        digest.update(str(header).encode("utf-8"))
+        content.update_digest(digest)
+    return digest.hexdigest()
+
+
+def _split_at_markers(raw_data: bytes) -> Iterator[tuple[memoryview, bytes | None]]:
+    """Yield the blocks of data and the marker lines following them
+
+    The marker lines are found by searching for "<<<" instead of looking at
+    every line.  The last block is followed by `None`.  The blocks are views
+    into `raw_data`, so no data is copied.
+    """
+    view = memoryview(raw_data)
+    block_start = search_start = 0
+    while (found := raw_data.find(b"<<<", search_start)) != -1:
+        line_start = raw_data.rfind(b"\n", 0, found) + 1
+        if (line_end := raw_data.find(b"\n", found)) == -1:
+            line_end = len(raw_data)
+        search_start = line_end + 1
+
+        line = raw_data[line_start:line_end].rstrip(b"\r")
+        if raw_data[line_start:found].strip() or not line.strip().endswith(b">>>"):
+            continue
+
+        yield view[block_start:line_start], line
+        block_start = search_start
+
+    yield view[block_start:], None
@@ -304,11 +304,12 @@ class SNMPCredential(SNMPCredentialBase, total=False):
 # This is what we get from the outside.
 class ConfigFromWATO(TypedDict):
     actions: Sequence[Action]
-    archive_mode: Literal["file", "mongodb"]
+    archive_mode: Literal["file", "mongodb", "sqlite"]
     archive_orphans: bool
     debug_rules: bool
     event_limit: EventLimits
     eventsocket_queue_len: int
+    history_fsync: bool
     history_lifetime: int
     history_rotation: Literal["daily", "weekly"]
     hostname_translation: TranslationOptions  # TODO: Mutable???
@@ -50,6 +50,7 @@ def default_config() -> ConfigFromWATO:
         "statistics_interval": 5,
         "history_lifetime": 365,  # days
         "history_rotation": "daily",
+        "history_fsync": False,
         "replication": None,
         "remote_status": None,
         "socket_queue_len": 10,
@@ -5,7 +5,9 @@
 
 import contextlib
 import os
+import queue
 import shlex
+import sqlite3
 import subprocess
 import threading
 import time
@@ -64,39 +66,63 @@ class History:
         self._history_columns = history_columns
         self._lock = threading.Lock()
         self._mongodb = MongoDB()
+        self._sqlite = SQLiteDB()
+        self._file_writer = FileWriter()
         self._active_history_period = ActiveHistoryPeriod()
         self.reload_configuration(config)
 
     def reload_configuration(self, config: Config) -> None:
+        _drain_file_writer(self)
         self._config = config
         if self._config["archive_mode"] == "mongodb":
+            _close_sqlite(self)
             _reload_configuration_mongodb(self)
+        elif self._config["archive_mode"] == "sqlite":
+            _reload_configuration_sqlite(self)
         else:
+            _close_sqlite(self)
             _reload_configuration_files(self)
 
     def flush(self) -> None:
         if self._config["archive_mode"] == "mongodb":
             _flush_mongodb(self)
+        elif self._config["archive_mode"] == "sqlite":
+            _flush_sqlite(self)
         else:
             _flush_files(self)
 
     def add(self, event: Event, what: HistoryWhat, who: str = "", addinfo: str = "") -> None:
         if self._config["archive_mode"] == "mongodb":
             _add_mongodb(self, event, what, who, addinfo)
+        elif self._config["archive_mode"] == "sqlite":
+            _add_sqlite(self, event, what, who, addinfo)
         else:
             _add_files(self, event, what, who, addinfo)
 
     def get(self, query: QueryGET) -> Iterable[Any]:
         if self._config["archive_mode"] == "mongodb":
             return _get_mongodb(self, query)
+        if self._config["archive_mode"] == "sqlite":
+            return _get_sqlite(self, self._logger, query)
         return _get_files(self, self._logger, query)
 
     def housekeeping(self) -> None:
         if self._config["archive_mode"] == "mongodb":
             _housekeeping_mongodb(self)
+        elif self._config["archive_mode"] == "sqlite":
+            _housekeeping_sqlite(self)
         else:
             _housekeeping_files(self)
 
+    def close(self) -> None:
+        _stop_file_writer(self)
+        if self._config["archive_mode"] == "sqlite":
+            _close_sqlite(self)
+
+    def queue_length(self) -> int:
+        """Number of entries not yet written by the file writer"""
+        return self._file_writer.queue.qsize()
+
 
 # .
 #   .--MongoDB-------------------------------------------------------------.
@@ -323,6 +349,7 @@ def _reload_configuration_files(history: History) -> None:
 
 
 def _flush_files(history: History) -> None:
+    _drain_file_writer(history)
     _expire_logfiles(history._settings, history._config, history._logger, history._lock, True)
 
 
@@ -341,24 +368,26 @@ def _add_files(history: History, event: Event, what: HistoryWhat, who: str, addi
     4-oo: StatusTableEvents.columns
     """
     _log_event(history._config, history._logger, event, what, who, addinfo)
-    with history._lock:
-        columns = [
-            quote_tab(str(time.time())),
-            quote_tab(scrub_string(what)),
-            quote_tab(scrub_string(who)),
-            quote_tab(scrub_string(addinfo)),
-        ]
-        columns += [
-            quote_tab(event.get(colname[6:], defval))  # drop "event_"
-            for colname, defval in history._event_columns
-        ]
+    _start_file_writer(history)
+    history._file_writer.queue.put(
+        _history_entry(history._event_columns, event, what, who, addinfo)
+    )
 
-        with get_logfile(
-            history._config,
-            history._settings.paths.history_dir.value,
-            history._active_history_period,
-        ).open(mode="ab") as f:
-            f.write(b"\t".join(columns) + b"\n")
+
+def _history_entry(
+    event_columns: Columns, event: Event, what: HistoryWhat, who: str, addinfo: str
+) -> bytes:
+    columns = [
+        quote_tab(str(time.time())),
+        quote_tab(scrub_string(what)),
+        quote_tab(scrub_string(who)),
+        quote_tab(scrub_string(addinfo)),
+    ]
+    columns += [
+        quote_tab(event.get(colname[6:], defval))  # drop "event_"
+        for colname, defval in event_columns
+    ]
+    return b"\t".join(columns)
 
 
 def quote_tab(col: Any) -> bytes:
@@ -377,37 +406,149 @@ def quote_tab(col: Any) -> bytes:
     return col.replace(b"\t", b" ")
 
 
+# The entries are written by a background thread, so that adding an entry does
+# not wait for the disk. The queue is bounded: If the writer falls behind,
+# adding entries blocks until there is space again. Everything reading or
+# expiring the files first waits for the entries queued so far, but not longer
+# than _FILE_WRITER_DRAIN_TIMEOUT seconds.
+_FILE_WRITER_QUEUE_LENGTH = 10000
+_FILE_WRITER_BATCH_SIZE = 1000
+_FILE_WRITER_DRAIN_TIMEOUT = 30.0
+
+
+class FileWriter:
+    def __init__(self) -> None:
+        super().__init__()
+        # An Event is a marker set when all entries queued before it are written.
+        self.queue: queue.Queue[bytes | threading.Event | None] = queue.Queue(
+            maxsize=_FILE_WRITER_QUEUE_LENGTH
+        )
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+
+def _start_file_writer(history: History) -> None:
+    writer = history._file_writer
+    if writer.thread is not None:
+        return
+    with writer.lock:
+        if writer.thread is None:
+            writer.thread = threading.Thread(
+                target=_run_file_writer, args=(history,), name="history-writer", daemon=True
+            )
+            writer.thread.start()
+
+
+def _stop_file_writer(history: History) -> None:
+    writer = history._file_writer
+    with writer.lock:
+        if writer.thread is None:
+            return
+        writer.queue.put(None)
+        writer.thread.join()
+        writer.thread = None
+
+
+def _drain_file_writer(history: History) -> None:
+    """Wait until the entries queued so far have been written
+
+    Entries queued in the meantime are not waited for, so a steady stream of
+    new events can't block us forever."""
+    if history._file_writer.thread is None:
+        return
+    written = threading.Event()
+    deadline = time.monotonic() + _FILE_WRITER_DRAIN_TIMEOUT
+    try:
+        history._file_writer.queue.put(written, timeout=_FILE_WRITER_DRAIN_TIMEOUT)
+    except queue.Full:
+        pass
+    else:
+        if written.wait(max(0.0, deadline - time.monotonic())):
+            return
+    history._logger.warning(
+        "Timeout while waiting for %d queued history entries to be written",
+        history._file_writer.queue.qsize(),
+    )
+
+
+def _run_file_writer(history: History) -> None:
+    entries = history._file_writer.queue
+    while True:
+        batch = [entries.get()]
+        with contextlib.suppress(queue.Empty):
+            while batch[-1] is not None and len(batch) < _FILE_WRITER_BATCH_SIZE:
+                batch.append(entries.get_nowait())
+        try:
+            _write_files(history, [entry for entry in batch if isinstance(entry, bytes)])
+        except Exception:
+            history._logger.exception("Cannot write the event history")
+        for entry in batch:
+            if isinstance(entry, threading.Event):
+                entry.set()
+        if batch[-1] is None:
+            return
+
+
+def _write_files(history: History, entries: Sequence[bytes]) -> None:
+    # The entries may have waited in the queue across the start of a new
+    # history period, so the log file is chosen by the time of each entry.
+    entries_by_period: dict[int, list[bytes]] = {}
+    for entry in entries:
+        entries_by_period.setdefault(
+            _history_period(history._config, float(entry.split(b"\t", 1)[0])), []
+        ).append(entry)
+    with history._lock:
+        for period, period_entries in entries_by_period.items():
+            with get_logfile(
+                history._config,
+                history._settings.paths.history_dir.value,
+                history._active_history_period,
+                period,
+            ).open(mode="ab") as f:
+                f.write(b"".join(entry + b"\n" for entry in period_entries))
+                if history._config["history_fsync"]:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+
 class ActiveHistoryPeriod:
     def __init__(self) -> None:
         super().__init__()
         self.value: int | None = None
 
 
-def get_logfile(config: Config, log_dir: Path, active_history_period: ActiveHistoryPeriod) -> Path:
-    """Get file object to current log file, handle also history and lifetime limit."""
+def get_logfile(
+    config: Config,
+    log_dir: Path,
+    active_history_period: ActiveHistoryPeriod,
+    timestamp: float | None = None,
+) -> Path:
+    """Get file object to the log file for the given time (default: now), handle also
+    history and lifetime limit."""
     log_dir.mkdir(parents=True, exist_ok=True)
     # Log into file starting at current history period,
     # but: if a newer logfile exists, use that one. This
     # can happen if you switch the period from daily to
     # weekly.
-    timestamp = _current_history_period(config)
+    period = _history_period(config, timestamp)
 
     # Log period has changed or we have not computed a filename yet ->
     # compute currently active period
-    if active_history_period.value is None or timestamp > active_history_period.value:
+    if active_history_period.value is None or period > active_history_period.value:
         # Look if newer files exist
-        timestamps = sorted(int(str(path.name)[:-4]) for path in log_dir.glob("*.log"))
-        if len(timestamps) > 0:
-            timestamp = max(timestamps[-1], timestamp)
+        periods = sorted(int(str(path.name)[:-4]) for path in log_dir.glob("*.log"))
+        if len(periods) > 0:
+            period = max(periods[-1], period)
 
-        active_history_period.value = timestamp
+        active_history_period.value = period
 
-    return log_dir / f"{timestamp}.log"
+    return log_dir / f"{period}.log"
 
 
-def _current_history_period(config: Config) -> int:
-    """Return timestamp of the beginning of the current history period."""
-    lt = time.localtime()
+def _history_period(config: Config, timestamp: float | None) -> int:
+    """Return timestamp of the beginning of the history period containing the given
+    time (default: now)."""
+    lt = time.localtime(timestamp)
     ts = time.mktime(
         time.struct_time(
             (
@@ -504,6 +645,7 @@ def _grep_pattern(argument: Any) -> str:
 
 
 def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[Any]:
+    _drain_file_writer(history)
     if not history._settings.paths.history_dir.value.exists():
         return []
 
@@ -716,3 +858,232 @@ def scrub_string(s: str) -> str:
 
 
 _scrub_string_unicode_table = {0: None, 1: None, 2: None, ord("\n"): None, ord("\t"): ord(" ")}
+
+
+# .
+#   .--SQLite--------------------------------------------------------------.
+#   |                     ____   ___  _     _ _                            |
+#   |                    / ___| / _ \| |   (_) |_ ___                      |
+#   |                    \___ \| | | | |   | | __/ _ \                     |
+#   |                     ___) | |_| | |___| | ||  __/                     |
+#   |                    |____/ \__\_\_____|_|\__\___|                     |
+#   |                                                                      |
+#   +----------------------------------------------------------------------+
+#   | The Event Log Archive can be stored in a local SQLite database,      |
+#   | this section contains the SQLite related code.                       |
+#   '----------------------------------------------------------------------'
+
+# The entries are stored in the same format as the lines of the history
+# files. The columns the queries usually filter on are stored separately and
+# indexed. Host names and rule IDs are stored in lower case, so that the
+# case insensitive operators can be pushed down, too. The pushed down
+# filters only preselect the entries, the query filters them as usual.
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    line INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    event_id INTEGER,
+    host TEXT,
+    rule_id TEXT,
+    entry BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_time ON history (time);
+CREATE INDEX IF NOT EXISTS history_event_id ON history (event_id);
+CREATE INDEX IF NOT EXISTS history_host ON history (host);
+CREATE INDEX IF NOT EXISTS history_rule_id ON history (rule_id);
+CREATE TABLE IF NOT EXISTS migrated_files (name TEXT PRIMARY KEY);
+"""
+
+_SQLITE_INSERT = "INSERT INTO history (time, event_id, host, rule_id, entry) VALUES (?, ?, ?, ?, ?)"
+
+# Entries are committed in batches, see _add_sqlite
+_SQLITE_COMMIT_ENTRIES = 1000
+_SQLITE_COMMIT_INTERVAL = 1.0
+
+# Positions of the indexed columns within an entry, see convert_history_line
+_ENTRY_EVENT_ID = 4
+_ENTRY_HOST = 11
+_ENTRY_RULE_ID = 17
+
+# history column -> (database column, lower case)
+_SQLITE_COLUMNS = {
+    "history_line": ("line", False),
+    "history_time": ("time", False),
+    "event_id": ("event_id", False),
+    "event_host": ("host", True),
+    "event_rule_id": ("rule_id", True),
+}
+
+
+class SQLiteDB:
+    def __init__(self) -> None:
+        super().__init__()
+        self.connection: sqlite3.Connection | None = None
+        self.uncommitted = 0
+        self.last_commit = 0.0
+
+
+def _sqlite_connection(history: History) -> sqlite3.Connection:
+    """Return the connection used for writing, protected by history._lock"""
+    if history._sqlite.connection is None:
+        path = history._settings.paths.history_db.value
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SQLITE_SCHEMA)
+        history._sqlite.connection = connection
+    return history._sqlite.connection
+
+
+def _commit_sqlite(sqlite: SQLiteDB) -> None:
+    if sqlite.connection is not None and sqlite.uncommitted:
+        sqlite.connection.commit()
+    sqlite.uncommitted = 0
+    sqlite.last_commit = time.time()
+
+
+def _close_sqlite(history: History) -> None:
+    with history._lock:
+        _commit_sqlite(history._sqlite)
+        if history._sqlite.connection is not None:
+            history._sqlite.connection.close()
+            history._sqlite.connection = None
+
+
+def _reload_configuration_sqlite(history: History) -> None:
+    with history._lock:
+        _commit_sqlite(history._sqlite)
+        _migrate_files_to_sqlite(history, _sqlite_connection(history))
+
+
+def _migrate_files_to_sqlite(history: History, connection: sqlite3.Connection) -> None:
+    """Import the history files which have not been imported yet
+
+    The files are kept, so that the history is still there when switching
+    back to the file based archive.
+    """
+    migrated = {name for (name,) in connection.execute("SELECT name FROM migrated_files")}
+    for path in sorted(history._settings.paths.history_dir.value.glob("*.log")):
+        if path.name in migrated:
+            continue
+        with path.open("rb") as f:
+            connection.executemany(_SQLITE_INSERT, _sqlite_rows(history._logger, path, f))
+        connection.execute("INSERT INTO migrated_files (name) VALUES (?)", (path.name,))
+        connection.commit()
+        history._logger.info("Imported history file %s into the history database", path)
+
+
+def _sqlite_rows(
+    logger: Logger, path: Path, entries: Iterable[bytes]
+) -> Iterable[tuple[float, int | None, str, str, bytes]]:
+    for entry in entries:
+        try:
+            yield _sqlite_row(entry.rstrip(b"\n"))
+        except Exception:
+            logger.exception(f"Invalid line '{entry!r}' in history file {path}")
+
+
+def _sqlite_row(entry: bytes) -> tuple[float, int | None, str, str, bytes]:
+    values = entry.decode("utf-8").split("\t")
+    try:
+        event_id: int | None = int(values[_ENTRY_EVENT_ID])
+    except ValueError:
+        event_id = None
+    return (
+        float(values[0]),
+        event_id,
+        values[_ENTRY_HOST].lower(),
+        values[_ENTRY_RULE_ID].lower(),
+        entry,
+    )
+
+
+def _flush_sqlite(history: History) -> None:
+    with history._lock:
+        connection = _sqlite_connection(history)
+        connection.execute("DELETE FROM history")
+        connection.commit()
+        _commit_sqlite(history._sqlite)
+
+
+def _housekeeping_sqlite(history: History) -> None:
+    with history._lock:
+        connection = _sqlite_connection(history)
+        connection.execute(
+            "DELETE FROM history WHERE time < ?",
+            (time.time() - history._config["history_lifetime"] * 86400,),
+        )
+        connection.commit()
+        _commit_sqlite(history._sqlite)
+
+
+def _add_sqlite(history: History, event: Event, what: HistoryWhat, who: str, addinfo: str) -> None:
+    """Insert the entry, but commit only every few entries or after a short time
+
+    Committing is by far the most expensive part of an insert. The entries
+    not committed yet are committed before each query and on shutdown.
+    """
+    _log_event(history._config, history._logger, event, what, who, addinfo)
+    with history._lock:
+        _sqlite_connection(history).execute(
+            _SQLITE_INSERT,
+            _sqlite_row(_history_entry(history._event_columns, event, what, who, addinfo)),
+        )
+        history._sqlite.uncommitted += 1
+        if (
+            history._sqlite.uncommitted >= _SQLITE_COMMIT_ENTRIES
+            or time.time() - history._sqlite.last_commit >= _SQLITE_COMMIT_INTERVAL
+        ):
+            _commit_sqlite(history._sqlite)
+
+
+def _sqlite_conditions(
+    filters: Iterable[tuple[str, OperatorName, Callable[[Any], bool], Any]]
+) -> tuple[list[str], list[Any]]:
+    conditions: list[str] = []
+    parameters: list[Any] = []
+    for column_name, operator_name, _predicate, argument in filters:
+        if column_name not in _SQLITE_COLUMNS:
+            continue
+        db_column, lower_case = _SQLITE_COLUMNS[column_name]
+        if not lower_case:
+            if operator_name in ("=", "<", ">", "<=", ">="):
+                conditions.append(f"{db_column} {operator_name} ?")
+                parameters.append(argument)
+        elif operator_name in ("=", "=~"):
+            conditions.append(f"{db_column} = ?")
+            parameters.append(str(argument).lower())
+        elif operator_name == "in":
+            conditions.append(f"{db_column} IN ({', '.join('?' * len(argument))})")
+            parameters.extend(str(a).lower() for a in argument)
+    return conditions, parameters
+
+
+def _get_sqlite(history: History, logger: Logger, query: QueryGET) -> Iterable[Any]:
+    conditions, parameters = _sqlite_conditions(query.filters)
+    statement = "SELECT line, entry FROM history"
+    if conditions:
+        statement += " WHERE " + " AND ".join(conditions)
+    statement += " ORDER BY line DESC"
+    logger.debug("History query: %s %r", statement, parameters)
+
+    with history._lock:
+        _sqlite_connection(history)
+        _commit_sqlite(history._sqlite)
+
+    # A separate connection, so that the query does not block adding entries
+    entries: list[Any] = []
+    with contextlib.closing(sqlite3.connect(history._settings.paths.history_db.value)) as db:
+        for line, entry in db.execute(statement, parameters):
+            if query.limit is not None and len(entries) > query.limit:
+                break
+            try:
+                values: list[Any] = [line, *entry.decode("utf-8").split("\t")]
+                convert_history_line(history._history_columns, values)
+                if query.filter_row(values):
+                    entries.append(values)
+            except Exception:
+                logger.exception(f"Invalid entry {line} in the history database")
+    return entries
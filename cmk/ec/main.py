@@ -72,7 +72,7 @@ from .history import (
 from .host_config import HostConfig
 from .perfcounters import Perfcounters
 from .query import filter_operator_in, MKClientError, Query, QueryCOMMAND, QueryGET, QueryREPLICATE
-from .rule_matcher import match, MatchFailure, MatchResult, MatchSuccess, RuleMatcher
+from .rule_matcher import match, MatchFailure, MatchResult, MatchSuccess, RuleMatcher, RulePrefilter
 from .rule_packs import load_config as load_config_using
 from .settings import FileDescriptor, PortNumber, Settings
 from .settings import settings as create_settings
@@ -495,6 +495,7 @@ class EventServer(ECServerThread):
             ("status_config_load_time", 0),
             ("status_num_open_events", 0),
             ("status_virtual_memory_size", 0),
+            ("status_history_queue_length", 0),
         ]
 
     @classmethod
@@ -529,6 +530,7 @@ class EventServer(ECServerThread):
             self._config["last_reload"],
             self._event_status.num_existing_events,
             self._virtual_memory_size(),
+            self._history.queue_length(),
         ]
 
     def _virtual_memory_size(self) -> int:
@@ -1265,6 +1267,8 @@ class EventServer(ECServerThread):
         self._rule_by_id = {}
         # Speedup-Hash for rule execution
         self._rule_hash: dict[int, dict[int, Any]] = {}
+        # Further narrows down the rules of a hash bucket, built on first use
+        self._rule_prefilters: dict[tuple[int, int], RulePrefilter] = {}
         count_disabled = 0
         count_rules = 0
         count_unspecific = 0
@@ -1404,6 +1408,13 @@ class EventServer(ECServerThread):
             if need:
                 prio_hash.setdefault(prio, []).append(rule)
 
+    def _rule_prefilter(self, facility: int, priority: int, rules: Sequence[Rule]) -> RulePrefilter:
+        try:
+            return self._rule_prefilters[(facility, priority)]
+        except KeyError:
+            prefilter = self._rule_prefilters[(facility, priority)] = RulePrefilter(rules)
+            return prefilter
+
     def output_hash_stats(self) -> None:
         self._logger.info("Top 20 of facility/priority:")
         entries = []
@@ -1441,6 +1452,11 @@ class EventServer(ECServerThread):
         if self._config["rule_optimizer"]:
             self._hash_stats[event["facility"]][event["priority"]] += 1
             rule_candidates = self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
+            # Keep trying all rules of the bucket when debugging the rule matching
+            if not self._config["debug_rules"]:
+                rule_candidates = self._rule_prefilter(
+                    event["facility"], event["priority"], rule_candidates
+                ).candidates(event)
         else:
             rule_candidates = self._rules
 
@@ -2767,6 +2783,11 @@ def run_eventd(  # pylint: disable=too-many-branches
 #   '----------------------------------------------------------------------'
 
 
+def _match_groups_key(match_groups: Any) -> Any:
+    # Match groups are tuples, but lists may come in via the status file
+    return tuple(match_groups) if isinstance(match_groups, list) else match_groups
+
+
 class EventStatus:
     """
     Keeps the current Event-Status.
@@ -2800,6 +2821,7 @@ class EventStatus:
         # needed for expecting rules
         self._interval_starts: dict[str, int] = {}
         self._initialize_event_limit_status()
+        self._initialize_event_indexes()
 
         # TODO: might introduce some performance counters, like:
         # - number of received messages
@@ -2873,6 +2895,7 @@ class EventStatus:
         self._events = status["events"]
         self._rule_stats = status["rule_stats"]
         self._interval_starts = status["interval_starts"]
+        self._initialize_event_indexes()
 
     def save_status(self) -> None:
         now = time.time()
@@ -2923,6 +2946,7 @@ class EventStatus:
 
         # core_host is needed to initialize the status
         self._initialize_event_limit_status()
+        self._initialize_event_indexes()
 
     def _initialize_event_limit_status(self) -> None:
         """
@@ -2956,6 +2980,43 @@ class EventStatus:
         self.num_existing_events_by_host[host_key] -= 1
         self.num_existing_events_by_rule[event["rule_id"]] -= 1
 
+    def _initialize_event_indexes(self) -> None:
+        """
+        Build the indexes used to find the events of a rule when cancelling
+        and counting. The buckets map the event IDs to the events, so they are
+        ordered like self._events: the oldest event comes first.
+        """
+        self._events_by_rule: dict[Any, dict[int, Event]] = {}
+        self._events_by_rule_and_host: dict[tuple[Any, str], dict[int, Event]] = {}
+        self._events_by_rule_and_match_groups: dict[tuple[Any, Any], dict[int, Event]] = {}
+        for event in self._events:
+            self._index_event_add(event)
+
+    def _index_keys(self, event: Event) -> Iterable[tuple[dict[Any, dict[int, Event]], Any]]:
+        yield self._events_by_rule, event["rule_id"]
+        yield self._events_by_rule_and_host, (event["rule_id"], event["host"])
+        yield self._events_by_rule_and_match_groups, (
+            event["rule_id"],
+            _match_groups_key(event.get("match_groups", ())),
+        )
+
+    def _index_event_add(self, event: Event) -> None:
+        for index, key in self._index_keys(event):
+            bucket = index.setdefault(key, {})
+            is_newest = not bucket or event["id"] > next(reversed(bucket))
+            bucket[event["id"]] = event
+            if not is_newest:
+                # Only happens when an older event moves to another bucket
+                index[key] = dict(sorted(bucket.items()))
+
+    def _index_event_remove(self, event: Event) -> None:
+        for index, key in self._index_keys(event):
+            if (bucket := index.get(key)) is None:
+                continue
+            bucket.pop(event["id"], None)
+            if not bucket:
+                del index[key]
+
     def new_event(self, event: Event) -> None:
         self._perfcounters.count("events")
         event["id"] = self._next_event_id
@@ -2963,6 +3024,7 @@ class EventStatus:
         self._events.append(event)
         self.num_existing_events += 1
         self._count_event_add(event)
+        self._index_event_add(event)
         self._history.add(event, "NEW")
 
     def archive_event(self, event: Event) -> None:
@@ -2977,6 +3039,7 @@ class EventStatus:
             self._events.remove(event)
             self._history.add(event, delete_reason, user)
             self._count_event_remove(event)
+            self._index_event_remove(event)
         except ValueError:
             self._logger.exception("Cannot remove event %d: not present", event["id"])
 
@@ -2995,10 +3058,9 @@ class EventStatus:
 
     # protected by self.lock
     def _remove_oldest_event_of_rule(self, rule_id: str) -> None:
-        for event in self._events:
-            if event["rule_id"] == rule_id:
-                self.remove_event(event, "AUTODELETE")
-                return
+        for event in self._events_by_rule.get(rule_id, {}).values():
+            self.remove_event(event, "AUTODELETE")
+            return
 
     # protected by self.lock
     def _remove_oldest_event_of_host(self, hostname: str) -> None:
@@ -3031,10 +3093,9 @@ class EventStatus:
         """
         with self.lock:
             to_delete = []
-            for event in self._events:
-                if event["rule_id"] == rule["id"] and self.cancelling_match(
-                    match_groups, new_event, event, rule
-                ):
+            host = self._cancelling_host(match_groups, new_event, rule)
+            for event in self._events_by_rule_and_host.get((rule["id"], host), {}).values():
+                if self.cancelling_match(match_groups, new_event, event, rule):
                     # Fill a few fields of the cancelled event with data from
                     # the cancelling event so that action scripts have useful
                     # values and the logfile entry if more relevant.
@@ -3081,11 +3142,7 @@ class EventStatus:
             for e in to_delete:
                 self.remove_event(e, "CANCELLED")
 
-    def cancelling_match(  # pylint: disable=too-many-branches
-        self, match_groups: MatchGroups, new_event: Event, event: Event, rule: Rule
-    ) -> bool:
-        debug = self._config["debug_rules"]
-
+    def _cancelling_host(self, match_groups: MatchGroups, new_event: Event, rule: Rule) -> str:
         # The match_groups of the canceling match only contain the *_ok match groups
         # Since the rewrite definitions are based on the positive match, we need to
         # create some missing keys. O.o
@@ -3100,7 +3157,14 @@ class EventStatus:
         host = new_event["host"]
         if "set_host" in rule:
             host = replace_groups(rule["set_host"], host, match_groups)
+        return host
+
+    def cancelling_match(  # pylint: disable=too-many-branches
+        self, match_groups: MatchGroups, new_event: Event, event: Event, rule: Rule
+    ) -> bool:
+        debug = self._config["debug_rules"]
 
+        host = self._cancelling_host(match_groups, new_event, rule)
         if event["host"] != host:
             if debug:
                 self._logger.info(
@@ -3208,12 +3272,15 @@ class EventStatus:
                 preserve["comment"] = found["comment"]
             if "contact" in found:
                 preserve["contact"] = found["contact"]
+        # The new occurrence may change the host, application or match groups
+        self._index_event_remove(found)
         found.update(event)
         found.update(preserve)
+        self._index_event_add(found)
 
     def count_expected_event(self, event_server: EventServer, event: Event) -> None:
-        for ev in self._events:
-            if ev["rule_id"] == event["rule_id"] and ev["phase"] == "counting":
+        for ev in self._events_by_rule.get(event["rule_id"], {}).values():
+            if ev["phase"] == "counting":
                 self.count_event_up(ev, event)
                 return
 
@@ -3232,33 +3299,44 @@ class EventStatus:
         since the event has been created because the count was too
         low in the specified period of time.
         """
-        for ev in self._events:
-            if ev["rule_id"] == event["rule_id"]:
-                if ev["phase"] == "ack" and not count["count_ack"]:
-                    continue  # skip acknowledged events
+        # Only look at the smallest set of candidates, all conditions are still
+        # checked below.
+        if count["separate_host"]:
+            candidates = self._events_by_rule_and_host.get((event["rule_id"], event["host"]), {})
+        elif count["separate_match_groups"]:
+            candidates = self._events_by_rule_and_match_groups.get(
+                (event["rule_id"], _match_groups_key(event["match_groups"])), {}
+            )
+        else:
+            candidates = self._events_by_rule.get(event["rule_id"], {})
 
-                if count["separate_host"] and ev["host"] != event["host"]:
-                    continue  # treat events with separated hosts separately
+        for ev in candidates.values():
+            if ev["phase"] == "ack" and not count["count_ack"]:
+                continue  # skip acknowledged events
 
-                if count["separate_application"] and ev["application"] != event["application"]:
-                    continue  # same for application
+            if count["separate_host"] and ev["host"] != event["host"]:
+                continue  # treat events with separated hosts separately
 
-                if count["separate_match_groups"] and ev["match_groups"] != event["match_groups"]:
-                    continue
+            if count["separate_application"] and ev["application"] != event["application"]:
+                continue  # same for application
 
-                if (
-                    count.get("count_duration") is not None
-                    and ev["first"] + count["count_duration"] < event["time"]
-                ):
-                    # Counting has been discontinued on this event after a certain time
-                    continue
+            if count["separate_match_groups"] and ev["match_groups"] != event["match_groups"]:
+                continue
 
-                if ev["host_in_downtime"] != event["host_in_downtime"]:
-                    continue  # treat events with different downtime states separately
+            if (
+                count.get("count_duration") is not None
+                and ev["first"] + count["count_duration"] < event["time"]
+            ):
+                # Counting has been discontinued on this event after a certain time
+                continue
 
-                found = ev
-                self.count_event_up(found, event)
-                break
+            if ev["host_in_downtime"] != event["host_in_downtime"]:
+                continue  # treat events with different downtime states separately
+
+            found = ev
+            # Modifies the candidates, so leave the loop right away
+            self.count_event_up(found, event)
+            break
         else:
             event["count"] = 1
             event["phase"] = "counting"
@@ -3753,6 +3831,7 @@ def main() -> None:  # pylint: disable=too-many-branches
 
         logger.log(VERBOSE, "Saving final event state")
         event_status.save_status()
+        history.close()
 
         logger.log(VERBOSE, "Cleaning up sockets")
         settings.paths.unix_socket.value.unlink()
@@ -6,10 +6,11 @@
 from __future__ import annotations
 
 import ipaddress
-from collections.abc import Callable
+import re
+from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass
 from logging import Logger
-from typing import NamedTuple
+from typing import Final, NamedTuple
 
 from livestatus import SiteId
 
@@ -355,3 +356,188 @@ class RuleMatcher:
             return MatchFailure(reason="did not match, message text does not match")
 
         return MatchSuccess(cancelling=False, match_groups=MatchGroups())
+
+
+_REGEX_META = frozenset(".^$*+?{}[]()|\\")
+
+
+def _skip_class(source: str, index: int) -> int:
+    """Return the index behind the character class starting before `index`"""
+    if source[index : index + 1] == "^":
+        index += 1
+    if source[index : index + 1] == "]":
+        index += 1  # a leading "]" belongs to the class
+    while index < len(source) and source[index] != "]":
+        index += 2 if source[index] == "\\" else 1
+    return index + 1
+
+
+def _skip_group(source: str, index: int) -> int:
+    """Return the index behind the group starting before `index`"""
+    depth = 1
+    while index < len(source) and depth:
+        char = source[index]
+        index += 1
+        if char == "\\":
+            index += 1
+        elif char == "[":
+            index = _skip_class(source, index)
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+    return index
+
+
+def _required_literal(pattern: TextPattern) -> tuple[str, bool] | None:
+    """Return a lower case text every match of the pattern contains
+
+    The second item tells if the literal was derived from a regex. Those are
+    ASCII only and must only be looked up in ASCII texts, because with
+    re.IGNORECASE some non ASCII characters match ASCII letters.
+
+    The regex analysis is conservative: Only the literal characters outside
+    of groups and character classes are considered, and there is no literal
+    for patterns with top level alternatives, in verbose mode or with escapes
+    other than escaped punctuation.
+    """
+    if pattern is None:
+        return None
+    if isinstance(pattern, str):
+        return (pattern, False) if pattern else None
+    if pattern.flags & re.VERBOSE:
+        return None
+
+    source = pattern.pattern
+    runs: list[str] = []
+    run: list[str] = []
+    index = 0
+    while index < len(source):
+        char = source[index]
+        index += 1
+        if char == "|":
+            return None
+        if char == "\\":
+            if index >= len(source) or source[index].isalnum() or not source[index].isascii():
+                return None  # classes, anchors, backreferences and numeric escapes
+            run.append(source[index])
+            index += 1
+            continue
+        elif char in "*?{":
+            if run:
+                run.pop()  # the preceding character may be optional
+            if char == "{":
+                index = source.find("}", index) + 1 or len(source)
+        elif char == "[":
+            index = _skip_class(source, index)
+        elif char == "(":
+            index = _skip_group(source, index)
+        elif char not in _REGEX_META and char.isascii():
+            run.append(char)
+            continue
+        # Quantifiers, wildcards, anchors, classes, groups and escapes end the run
+        runs.append("".join(run))
+        run = []
+    runs.append("".join(run))
+
+    longest = max(runs, key=len)
+    return (longest.lower(), True) if longest else None
+
+
+def _required_literals(rule: Rule, keys: Iterable[str]) -> list[tuple[str, bool]] | None:
+    """Return texts of which at least one is contained in any match
+
+    The matches of the keys are alternatives (positive or cancelling
+    match), so each of them needs to have a literal.
+    """
+    literals = []
+    for key in keys:
+        if key not in rule:
+            continue
+        if (literal := _required_literal(rule[key])) is None:  # type: ignore[literal-required]
+            return None
+        literals.append(literal)
+    return literals or None
+
+
+class RulePrefilter:
+    """Preselect the rules that can possibly match an event
+
+    Only rules for which a necessary condition holds are returned, so the
+    full match of the candidates in the original order gives the same result
+    as matching all rules. The conditions are an exact host name or a text
+    that the message or the syslog application need to contain. Rules that
+    provide none of these (or are inverted) are always candidates.
+    """
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        self._rules: Final = list(rules)
+        self._by_host: dict[str, list[int]] = {}
+        self._by_text: dict[str, list[int]] = {}
+        self._by_text_ascii: dict[str, list[int]] = {}
+        self._by_application: dict[str, list[int]] = {}
+        self._by_application_ascii: dict[str, list[int]] = {}
+        self._unfiltered: list[int] = []
+
+        for position, rule in enumerate(self._rules):
+            if rule.get("invert_matching"):
+                self._unfiltered.append(position)
+            elif isinstance(host := rule.get("match_host"), str) and host:
+                self._by_host.setdefault(host, []).append(position)
+            # Without a message pattern every text matches, even if "match_ok" is set
+            elif rule.get("match") and (
+                literals := _required_literals(rule, ("match", "match_ok"))
+            ):
+                self._add(self._by_text, self._by_text_ascii, literals, position)
+            elif literals := _required_literals(rule, ("match_application", "cancel_application")):
+                self._add(self._by_application, self._by_application_ascii, literals, position)
+            else:
+                self._unfiltered.append(position)
+
+        self._all_unfiltered: Final = [self._rules[p] for p in self._unfiltered]
+
+    @staticmethod
+    def _add(
+        exact: dict[str, list[int]],
+        ascii_only: dict[str, list[int]],
+        literals: Iterable[tuple[str, bool]],
+        position: int,
+    ) -> None:
+        for literal, from_regex in literals:
+            positions = (ascii_only if from_regex else exact).setdefault(literal, [])
+            if not positions or positions[-1] != position:
+                positions.append(position)
+
+    def candidates(self, event: Event) -> Sequence[Rule]:
+        positions: set[int] = set()
+        positions.update(self._by_host.get(event["host"].lower(), ()))
+        self._collect(positions, self._by_text, self._by_text_ascii, event["text"])
+        self._collect(
+            positions,
+            self._by_application,
+            self._by_application_ascii,
+            event.get("application", ""),
+        )
+        if not positions:
+            return self._all_unfiltered
+        positions.update(self._unfiltered)
+        return [self._rules[p] for p in sorted(positions)]
+
+    @staticmethod
+    def _collect(
+        positions: set[int],
+        exact: dict[str, list[int]],
+        ascii_only: dict[str, list[int]],
+        text: str,
+    ) -> None:
+        text_lower = text.lower()
+        for literal, literal_positions in exact.items():
+            if literal in text_lower:
+                positions.update(literal_positions)
+        if not text.isascii():
+            for literal_positions in ascii_only.values():
+                positions.update(literal_positions)
+            return
+        for literal, literal_positions in ascii_only.items():
+            if literal in text_lower:
+                positions.update(literal_positions)
@@ -34,6 +34,7 @@ class Paths(NamedTuple):
     pid_file: AnnotatedPath
     log_file: AnnotatedPath
     history_dir: AnnotatedPath
+    history_db: AnnotatedPath
     messages_dir: AnnotatedPath
     master_config_file: AnnotatedPath
     slave_status_file: AnnotatedPath
@@ -64,6 +65,7 @@ def _default_paths(omd_root: Path, default_config_dir: Path) -> Paths:
         pid_file=AnnotatedPath("PID file", run_dir / "pid"),
         log_file=AnnotatedPath("log file", omd_root / "var/log/mkeventd.log"),
         history_dir=AnnotatedPath("history directory", state_dir / "history"),
+        history_db=AnnotatedPath("history database", state_dir / "history.sqlite"),
         messages_dir=AnnotatedPath("messages directory", state_dir / "messages"),
         master_config_file=AnnotatedPath("master configuration", state_dir / "master_config"),
         slave_status_file=AnnotatedPath("slave status", state_dir / "slave_status"),
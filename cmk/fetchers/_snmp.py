@@ -251,29 +251,48 @@ class SNMPFetcher(Fetcher[SNMPRawData]):
             walk_cache.clear()
             walk_cache_msg = "SNMP walk cache cleared"
 
+        sections_to_fetch = [
+            section_name
+            for section_name in self._sort_section_names(section_names)
+            if self._needs_fetching(section_name, persisted_sections, now)
+        ]
+        # Walk the columns of all sections at once, so that overlapping
+        # subtrees are only walked once.
+        snmp_table.prefetch_snmp_walks(
+            trees={name: self.plugin_store[name].trees for name in sections_to_fetch},
+            walk_cache=walk_cache,
+            backend=self._backend,
+        )
+
         fetched_data: MutableMapping[SectionName, Sequence[SNMPRawDataSection]] = {}
-        for section_name in self._sort_section_names(section_names):
-            try:
-                _from, until, _section = persisted_sections[section_name]
-                if now > until:
-                    raise LookupError(section_name)
-            except LookupError:
-                self._logger.debug("%s: Fetching data (%s)", section_name, walk_cache_msg)
-
-                fetched_data[section_name] = [
-                    snmp_table.get_snmp_table(
-                        section_name=section_name,
-                        tree=tree,
-                        walk_cache=walk_cache,
-                        backend=self._backend,
-                    )
-                    for tree in self.plugin_store[section_name].trees
-                ]
+        for section_name in sections_to_fetch:
+            self._logger.debug("%s: Fetching data (%s)", section_name, walk_cache_msg)
+            fetched_data[section_name] = [
+                snmp_table.get_snmp_table(
+                    section_name=section_name,
+                    tree=tree,
+                    walk_cache=walk_cache,
+                    backend=self._backend,
+                )
+                for tree in self.plugin_store[section_name].trees
+            ]
 
         walk_cache.save()
 
         return fetched_data
 
+    @staticmethod
+    def _needs_fetching(
+        section_name: SectionName,
+        persisted_sections: PersistedSections[SNMPRawDataSection],
+        now: int,
+    ) -> bool:
+        try:
+            _from, until, _section = persisted_sections[section_name]
+        except LookupError:
+            return True
+        return now > until
+
     @classmethod
     def _sort_section_names(
         cls,
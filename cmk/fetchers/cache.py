@@ -83,6 +83,14 @@ class SectionStore(Generic[TRawDataSection]):
         super().__init__()
         self.path: Final = Path(path)
         self._logger: Final = logger
+        self._store: Final = _store.ObjectStore(self.path, serializer=_store.MarshalSerializer())
+        self._decoded_store: Final = _store.ObjectStore(
+            self.decoded_path, serializer=_store.MarshalSerializer()
+        )
+
+    @property
+    def decoded_path(self) -> Path:
+        return self.path.with_name(f".{self.path.name}.decoded")
 
     def __repr__(self) -> str:
         return f"{type(self).__name__}({self.path!r}, logger={self._logger!r})"
@@ -94,19 +102,31 @@ class SectionStore(Generic[TRawDataSection]):
             return
 
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        _store.save_object_to_file(
-            self.path,
-            {str(k): v for k, v in sections.items()},
-            pretty=False,
-        )
+        with self._store.locked():
+            self._store.write_obj({str(k): v for k, v in sections.items()})
         self._logger.debug("Stored persisted sections: %s", ", ".join(str(s) for s in sections))
 
     def load(self) -> PersistedSections[TRawDataSection]:
-        raw_sections_data = _store.load_object_from_file(self.path, default={})
+        raw_sections_data = self._store.read_obj(default={})
         return PersistedSections[TRawDataSection](
             {SectionName(k): v for k, v in raw_sections_data.items()}
         )
 
+    def store_decoded(
+        self, decoded: Mapping[SectionName, tuple[str, Sequence[TRawDataSection]]]
+    ) -> None:
+        """Store decoded sections together with the digest of their raw data"""
+        if not decoded:
+            self.decoded_path.unlink(missing_ok=True)
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._decoded_store.locked():
+            self._decoded_store.write_obj({str(k): v for k, v in decoded.items()})
+
+    def load_decoded(self) -> Mapping[SectionName, tuple[str, Sequence[TRawDataSection]]]:
+        return {SectionName(k): v for k, v in self._decoded_store.read_obj(default={}).items()}
+
     def update(
         self,
         sections: Mapping[SectionName, Sequence[TRawDataSection]],
@@ -139,6 +159,7 @@ class SectionStore(Generic[TRawDataSection]):
         # the possible write here and simply ignore the outdated sections or lock when
         # reading and unlock after writing
         persisted_sections = self.load()
+        stored_sections = dict(persisted_sections)
         persisted_sections.update(
             PersistedSections[TRawDataSection].from_sections(
                 sections=sections,
@@ -151,7 +172,8 @@ class SectionStore(Generic[TRawDataSection]):
                 if valid_until < now:
                     del persisted_sections[section_name]
 
-        self.store(persisted_sections)
+        if dict(persisted_sections) != stored_sections:
+            self.store(persisted_sections)
         return persisted_sections
 
     def _add_persisted_sections(
@@ -17,7 +17,7 @@ from cmk.snmplib.type_defs import (
     SNMPHostConfig,
 )
 
-from .snmp_backend import ClassicSNMPBackend, StoredWalkSNMPBackend
+from .snmp_backend import ClassicSNMPBackend, PooledSNMPBackend, StoredWalkSNMPBackend
 
 try:
     from .cee.snmp_backend import inline  # type: ignore[import]
@@ -52,7 +52,11 @@ def make_backend(
     if inline and snmp_config.snmp_backend is SNMPBackendEnum.INLINE:
         return inline.InlineSNMPBackend(snmp_config, logger)
 
-    if snmp_config.snmp_backend is SNMPBackendEnum.CLASSIC:
+    if snmp_config.snmp_backend is SNMPBackendEnum.POOLED and not snmp_config.is_snmpv3_host:
+        return PooledSNMPBackend(snmp_config, logger)
+
+    if snmp_config.snmp_backend in (SNMPBackendEnum.CLASSIC, SNMPBackendEnum.POOLED):
+        # The pooled backend does not implement SNMPv3.
         return ClassicSNMPBackend(snmp_config, logger)
 
     raise NotImplementedError(f"Unknown SNMP backend: {snmp_config.snmp_backend}")
@@ -5,6 +5,7 @@
 """Home of our open source SNMP backends."""
 
 from .classic import ClassicSNMPBackend
+from .pooled import PooledSNMPBackend
 from .stored_walk import StoredWalkSNMPBackend
 
-__all__ = ["ClassicSNMPBackend", "StoredWalkSNMPBackend"]
+__all__ = ["ClassicSNMPBackend", "PooledSNMPBackend", "StoredWalkSNMPBackend"]
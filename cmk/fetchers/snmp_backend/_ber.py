@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Minimal BER codec for SNMPv1/v2c messages
+
+Only the subset needed to send get, getnext and getbulk requests and to
+decode the responses is implemented.  The values are decoded to the same
+raw representation the command line tools produce with the options the
+classic backend passes (numeric OIDs, numeric time ticks, no enums).
+"""
+
+import enum
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from cmk.snmplib.type_defs import SNMPRawValue
+
+from ._utils import strip_snmp_value
+
+__all__ = [
+    "decode_response",
+    "encode_request",
+    "PDUType",
+    "SNMPResponse",
+    "VarBind",
+    "ValueType",
+]
+
+
+class PDUType(enum.IntEnum):
+    GET = 0xA0
+    GETNEXT = 0xA1
+    RESPONSE = 0xA2
+    GETBULK = 0xA5
+
+
+class ValueType(enum.IntEnum):
+    INTEGER = 0x02
+    OCTET_STRING = 0x04
+    NULL = 0x05
+    OBJECT_IDENTIFIER = 0x06
+    IP_ADDRESS = 0x40
+    COUNTER32 = 0x41
+    GAUGE32 = 0x42
+    TIME_TICKS = 0x43
+    OPAQUE = 0x44
+    COUNTER64 = 0x46
+    NO_SUCH_OBJECT = 0x80
+    NO_SUCH_INSTANCE = 0x81
+    END_OF_MIB_VIEW = 0x82
+
+
+_SEQUENCE = 0x30
+_EXCEPTIONS = frozenset(
+    {ValueType.NO_SUCH_OBJECT, ValueType.NO_SUCH_INSTANCE, ValueType.END_OF_MIB_VIEW}
+)
+_UNSIGNED = frozenset(
+    {ValueType.COUNTER32, ValueType.GAUGE32, ValueType.TIME_TICKS, ValueType.COUNTER64}
+)
+# isprint() or isspace() in the C locale
+_PRINTABLE = frozenset(range(0x09, 0x0E)) | frozenset(range(0x20, 0x7F))
+
+
+class VarBind(NamedTuple):
+    oid: tuple[int, ...]
+    type: int
+    value: SNMPRawValue
+
+    @property
+    def is_exception(self) -> bool:
+        return self.type in _EXCEPTIONS
+
+
+class SNMPResponse(NamedTuple):
+    request_id: int
+    error_status: int
+    error_index: int
+    varbinds: Sequence[VarBind]
+
+
+def _encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes((length,))
+    raw = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((0x80 | len(raw),)) + raw
+
+
+def _tlv(tag: int, payload: bytes) -> bytes:
+    return bytes((tag,)) + _encode_length(len(payload)) + payload
+
+
+def _encode_integer(value: int) -> bytes:
+    return _tlv(ValueType.INTEGER, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def _encode_oid(oid: Sequence[int]) -> bytes:
+    if len(oid) < 2:
+        oid = (*oid, 0, 0)[:2]
+    # The first two arcs share one subidentifier, which may take several bytes
+    payload = bytearray()
+    for component in (40 * oid[0] + oid[1], *oid[2:]):
+        chunk = [component & 0x7F]
+        component >>= 7
+        while component:
+            chunk.append(0x80 | (component & 0x7F))
+            component >>= 7
+        payload.extend(reversed(chunk))
+    return _tlv(ValueType.OBJECT_IDENTIFIER, bytes(payload))
+
+
+def encode_request(
+    *,
+    version: int,
+    community: bytes,
+    pdu_type: PDUType,
+    request_id: int,
+    oids: Sequence[Sequence[int]],
+    max_repetitions: int = 0,
+) -> bytes:
+    """Encode a request, the values of the variable bindings are NULL
+
+    For getbulk requests there are no non-repeaters, and all OIDs are
+    repeated up to `max_repetitions` times.
+    """
+    varbinds = b"".join(_tlv(_SEQUENCE, _encode_oid(oid) + b"\x05\x00") for oid in oids)
+    pdu = b"".join(
+        (
+            _encode_integer(request_id),
+            _encode_integer(0),
+            _encode_integer(max_repetitions if pdu_type is PDUType.GETBULK else 0),
+            _tlv(_SEQUENCE, varbinds),
+        )
+    )
+    return _tlv(
+        _SEQUENCE,
+        _encode_integer(version) + _tlv(ValueType.OCTET_STRING, community) + _tlv(pdu_type, pdu),
+    )
+
+
+def _read_tlv(data: memoryview, offset: int) -> tuple[int, memoryview, int]:
+    """Return tag, payload and offset of the next element"""
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset : offset + size], "big")
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("truncated BER element")
+    return tag, data[offset : offset + length], offset + length
+
+
+def _decode_integer(payload: memoryview) -> int:
+    return int.from_bytes(payload, "big", signed=True)
+
+
+def _decode_oid(payload: memoryview) -> tuple[int, ...]:
+    subidentifiers = []
+    value = 0
+    for byte in payload:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            subidentifiers.append(value)
+            value = 0
+    if not subidentifiers:
+        return ()
+    first, *rest = subidentifiers
+    return (*(divmod(first, 40) if first < 80 else (2, first - 80)), *rest)
+
+
+def _decode_octet_string(payload: memoryview) -> SNMPRawValue:
+    """Decode an octet string to the value the classic backend reports
+
+    The command line tools print octet strings with printable characters only
+    as quoted text, escaping backslashes and double quotes, and all others as
+    a quoted hex dump.  The classic backend reads both back with
+    strip_snmp_value, which restores the bytes of a hex dump but strips the
+    text, unescapes the backslashes only and takes text looking like a hex
+    dump for one.  The text is passed through the same function here.
+    """
+    if not _PRINTABLE.issuperset(payload):
+        return bytes(payload)
+    text = bytes(payload).decode("ascii").replace("\\", "\\\\").replace('"', '\\"')
+    return strip_snmp_value(f'"{text}"')
+
+
+def _decode_value(tag: int, payload: memoryview) -> SNMPRawValue:
+    if tag == ValueType.INTEGER:
+        return str(_decode_integer(payload)).encode()
+    if tag in _UNSIGNED:
+        return str(int.from_bytes(payload, "big")).encode()
+    if tag == ValueType.OBJECT_IDENTIFIER:
+        return ("." + ".".join(map(str, _decode_oid(payload)))).encode()
+    if tag == ValueType.IP_ADDRESS:
+        return ".".join(map(str, payload)).encode()
+    if tag == ValueType.OCTET_STRING:
+        return _decode_octet_string(payload)
+    # Opaque values, NULL and the exceptions
+    return bytes(payload)
+
+
+def decode_response(raw: bytes) -> SNMPResponse:
+    """Decode a response PDU
+
+    Raises ValueError if the message is not a well formed response.
+    """
+    try:
+        tag, message, _offset = _read_tlv(memoryview(raw), 0)
+        if tag != _SEQUENCE:
+            raise ValueError("not an SNMP message")
+        _tag, _version, offset = _read_tlv(message, 0)
+        _tag, _community, offset = _read_tlv(message, offset)
+        tag, pdu, _offset = _read_tlv(message, offset)
+        if tag != PDUType.RESPONSE:
+            raise ValueError("not a response PDU: %#x" % tag)
+
+        _tag, request_id, offset = _read_tlv(pdu, 0)
+        _tag, error_status, offset = _read_tlv(pdu, offset)
+        _tag, error_index, offset = _read_tlv(pdu, offset)
+        _tag, varbind_list, _offset = _read_tlv(pdu, offset)
+
+        varbinds = []
+        offset = 0
+        while offset < len(varbind_list):
+            _tag, varbind, offset = _read_tlv(varbind_list, offset)
+            _tag, oid, value_offset = _read_tlv(varbind, 0)
+            value_tag, value, _offset = _read_tlv(varbind, value_offset)
+            varbinds.append(VarBind(_decode_oid(oid), value_tag, _decode_value(value_tag, value)))
+    except IndexError as exc:
+        raise ValueError("truncated SNMP message") from exc
+
+    return SNMPResponse(
+        _decode_integer(request_id),
+        _decode_integer(error_status),
+        _decode_integer(error_index),
+        varbinds,
+    )
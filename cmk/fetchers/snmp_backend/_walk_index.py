@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compiled index of a stored SNMP walk
+
+The index is compiled once per change of the walk file and persisted in the
+tmpfs. It is then memory mapped and shared between all backends (and hosts)
+using the same walk file, so that a walk or get is a pure lookup.
+
+Layout of the compiled file (all integers little endian, unless noted)::
+
+    magic | signature (dev, ino, size, mtime_ns) | number of entries N
+    key offsets (N + 1) | value offsets (N + 1) | keys | values
+
+The keys are the OIDs encoded as big endian unsigned 32 bit integers per
+component.  Comparing them as bytes is equivalent to comparing the OIDs
+numerically and the OIDs within a subtree share the byte prefix of the
+subtree, so a walk is a bisection followed by a linear scan.
+"""
+
+import hashlib
+import mmap
+import struct
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import Final
+
+import cmk.utils.paths
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.store import BytesSerializer, ObjectStore
+
+from cmk.snmplib.type_defs import OID
+
+__all__ = ["WalkIndex", "load_walk_index"]
+
+_MAGIC: Final = b"CMKSWI\x00\x01"
+_HEADER: Final = struct.Struct("<8sQQQqQ")
+_OFFSET: Final = struct.Struct("<Q")
+
+_Signature = tuple[int, int, int, int]
+
+# Indexes already loaded by this process, so that all hosts sharing a walk
+# file share the mapping. The compiled file is keyed by the resolved path.
+_loaded_indexes: dict[Path, "WalkIndex"] = {}
+
+
+def encode_oid(oid: OID) -> bytes:
+    try:
+        components = [int(c) for c in oid.strip(".").split(".")]
+        return struct.pack(f">{len(components)}I", *components)
+    except (ValueError, struct.error):
+        raise MKGeneralException("Invalid OID %s" % oid)
+
+
+def _decode_oid(key: bytes) -> OID:
+    return "." + ".".join(str(c) for c in struct.unpack(f">{len(key) // 4}I", key))
+
+
+class _Column(Sequence[bytes]):
+    """Random access to the variable length entries of one block of the index"""
+
+    def __init__(self, buffer: bytes | mmap.mmap, offsets_at: int, data_at: int, size: int) -> None:
+        self._buffer: Final = buffer
+        self._offsets_at: Final = offsets_at
+        self._data_at: Final = data_at
+        self._size: Final = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):  # type: ignore[no-untyped-def]
+        # Only integer indices are needed for the bisection, no slicing.
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        begin, end = struct.unpack_from("<QQ", self._buffer, self._offsets_at + 8 * index)
+        return self._buffer[self._data_at + begin : self._data_at + end]
+
+
+class WalkIndex:
+    def __init__(self, buffer: bytes | mmap.mmap) -> None:
+        magic, *signature, size = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC:
+            raise ValueError("not a compiled walk index")
+        self._buffer: Final = buffer
+        self.signature: Final[_Signature] = tuple(signature)  # type: ignore[assignment]
+        key_offsets_at = _HEADER.size
+        value_offsets_at = key_offsets_at + (size + 1) * _OFFSET.size
+        keys_at = value_offsets_at + (size + 1) * _OFFSET.size
+        (keys_length,) = _OFFSET.unpack_from(buffer, key_offsets_at + size * _OFFSET.size)
+        self._keys: Final = _Column(buffer, key_offsets_at, keys_at, size)
+        self._values: Final = _Column(buffer, value_offsets_at, keys_at + keys_length, size)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def compile(lines: Iterable[str], signature: _Signature) -> bytes:
+        entries = []
+        for line in lines:
+            parts = line.split(None, 1)
+            try:
+                key = encode_oid(parts[0])
+            except MKGeneralException:
+                continue
+            entries.append((key, parts[1].encode("utf-8") if len(parts) > 1 else b""))
+        # Walks are sorted anyway, so this is cheap. The sort is stable, so the
+        # order of duplicate OIDs is kept.
+        entries.sort(key=lambda entry: entry[0])
+
+        key_offsets = [0]
+        value_offsets = [0]
+        for key, value in entries:
+            key_offsets.append(key_offsets[-1] + len(key))
+            value_offsets.append(value_offsets[-1] + len(value))
+
+        return b"".join(
+            (
+                _HEADER.pack(_MAGIC, *signature, len(entries)),
+                struct.pack(f"<{len(key_offsets)}Q", *key_offsets),
+                struct.pack(f"<{len(value_offsets)}Q", *value_offsets),
+                *(key for key, _value in entries),
+                *(value for _key, value in entries),
+            )
+        )
+
+    def lookup(self, oid_prefix: OID, *, include_prefix: bool = True) -> Iterator[tuple[OID, str]]:
+        """Yield the OIDs and raw values of the subtree below `oid_prefix`"""
+        prefix = encode_oid(oid_prefix)
+        for index in range(bisect_left(self._keys, prefix), len(self._keys)):
+            key = self._keys[index]
+            if not key.startswith(prefix):
+                return
+            if include_prefix or key != prefix:
+                yield _decode_oid(key), self._values[index].decode("utf-8")
+
+
+def _signature(path: Path) -> _Signature:
+    stat = path.stat()
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _compiled_path(path: Path) -> Path:
+    return (
+        cmk.utils.paths.tmp_dir
+        / "snmpwalk_index"
+        / hashlib.sha256(str(path).encode("utf-8")).hexdigest()
+    )
+
+
+def _map_compiled(path: Path) -> WalkIndex | None:
+    try:
+        with path.open("rb") as f:
+            return WalkIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def load_walk_index(path: Path, read_lines: Callable[[Path], Iterable[str]]) -> WalkIndex:
+    """Return the index of the walk file, compile it if the walk has changed
+
+    Raises OSError if the walk file can not be accessed.
+    """
+    signature = _signature(path)
+
+    if (index := _loaded_indexes.get(path)) is not None and index.signature == signature:
+        return index
+
+    compiled_path = _compiled_path(path.resolve())
+    if (index := _map_compiled(compiled_path)) is None or index.signature != signature:
+        raw = WalkIndex.compile(read_lines(path), signature)
+        try:
+            compiled_path.parent.mkdir(parents=True, exist_ok=True)
+            ObjectStore(compiled_path, serializer=BytesSerializer()).write_obj(raw)
+        except (OSError, MKGeneralException):
+            # Not being able to persist the index only costs performance
+            index = WalkIndex(raw)
+        else:
+            index = _map_compiled(compiled_path) or WalkIndex(raw)
+
+    _loaded_indexes[path] = index
+    return index
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""In-process SNMP backend with persistent sessions
+
+Instead of spawning one snmpwalk/snmpget process per tree, the requests are
+BER encoded in process and sent over a UDP socket that is kept open for the
+host.  The sessions are pooled per process, so that all trees of a fetch (and
+all fetches of a keepalive helper) reuse them.
+
+Only SNMPv1 and SNMPv2c are supported. SNMPv3 hosts are handled by the
+classic backend (see `make_backend`).
+"""
+
+import itertools
+import logging
+import random
+import select
+import socket
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Final, NamedTuple
+
+from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.log import console
+from cmk.utils.type_defs import SectionName
+
+from cmk.snmplib.type_defs import (
+    OID,
+    SNMPBackend,
+    SNMPContextName,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
+
+from ._ber import decode_response, encode_request, PDUType, SNMPResponse, ValueType, VarBind
+
+__all__ = ["PooledSNMPBackend", "SNMPSession", "close_sessions"]
+
+# Net-SNMP defaults
+_DEFAULT_TIMEOUT: Final = 1.0
+_DEFAULT_RETRIES: Final = 5
+
+_MAX_SESSIONS: Final = 512
+_MAX_MESSAGE_SIZE: Final = 65535
+_NO_SUCH_NAME: Final = 2
+
+
+class _SessionKey(NamedTuple):
+    family: socket.AddressFamily
+    address: str
+    port: int
+    version: int
+    community: str
+    timeout: float
+    retries: int
+
+
+class SNMPSession:
+    """A connected UDP socket to one SNMP agent"""
+
+    def __init__(
+        self,
+        *,
+        family: socket.AddressFamily,
+        address: str,
+        port: int,
+        version: int,
+        community: bytes,
+        timeout: float,
+        retries: int,
+    ) -> None:
+        self.version: Final = version
+        self._community: Final = community
+        self._timeout: Final = timeout
+        self._retries: Final = retries
+        self._request_ids = itertools.count(random.randint(1, 2**30))
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            self._socket.connect((address, port))
+        except OSError:
+            self._socket.close()
+            raise
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def request(
+        self,
+        pdu_type: PDUType,
+        oids: Sequence[Sequence[int]],
+        *,
+        max_repetitions: int = 0,
+    ) -> SNMPResponse:
+        request_id = next(self._request_ids) & 0x7FFFFFFF
+        message = encode_request(
+            version=self.version,
+            community=self._community,
+            pdu_type=pdu_type,
+            request_id=request_id,
+            oids=oids,
+            max_repetitions=max_repetitions,
+        )
+        for _attempt in range(self._retries + 1):
+            self._socket.send(message)
+            if (response := self._receive(request_id)) is not None:
+                return response
+        raise MKSNMPError("Timeout: No Response from %s" % (self._socket.getpeername(),))
+
+    def _receive(self, request_id: int) -> SNMPResponse | None:
+        # Responses to earlier, timed out requests may still arrive. They
+        # are recognized by their request ID and dropped, without extending
+        # the time to wait for the response.
+        deadline = time.monotonic() + self._timeout
+        while select.select([self._socket], [], [], max(deadline - time.monotonic(), 0))[0]:
+            try:
+                response = decode_response(self._socket.recv(_MAX_MESSAGE_SIZE))
+            except ConnectionRefusedError:
+                return None
+            except ValueError:
+                continue
+            if response.request_id == request_id:
+                return response
+        return None
+
+
+# The pool is keyed by everything that defines a session. Least recently used
+# sessions are closed if there are too many.
+_sessions: OrderedDict[_SessionKey, SNMPSession] = OrderedDict()
+
+
+def _get_session(key: _SessionKey) -> SNMPSession:
+    try:
+        _sessions.move_to_end(key)
+        return _sessions[key]
+    except KeyError:
+        pass
+
+    session = SNMPSession(
+        family=key.family,
+        address=key.address,
+        port=key.port,
+        version=key.version,
+        community=key.community.encode("utf-8"),
+        timeout=key.timeout,
+        retries=key.retries,
+    )
+    _sessions[key] = session
+    while len(_sessions) > _MAX_SESSIONS:
+        _sessions.popitem(last=False)[1].close()
+    return session
+
+
+def close_sessions() -> None:
+    while _sessions:
+        _sessions.popitem()[1].close()
+
+
+def _parse_oid(oid: OID) -> tuple[int, ...]:
+    try:
+        return tuple(int(c) for c in oid.strip(".").split("."))
+    except ValueError:
+        raise MKGeneralException("Invalid OID %s" % oid)
+
+
+def _format_oid(oid: Sequence[int]) -> OID:
+    return "." + ".".join(map(str, oid))
+
+
+class PooledSNMPBackend(SNMPBackend):
+    def __init__(self, snmp_config: SNMPHostConfig, logger: logging.Logger) -> None:
+        super().__init__(snmp_config, logger)
+        if not isinstance(self.config.credentials, str):
+            raise MKGeneralException(
+                "The pooled SNMP backend does not support SNMPv3 (host %s)" % self.hostname
+            )
+        self._community: Final = self.config.credentials
+
+    @property
+    def _version(self) -> int:
+        # 0 is SNMPv1, 1 is SNMPv2c
+        return int(self.config.is_bulkwalk_host or self.config.is_snmpv2or3_without_bulkwalk_host)
+
+    @property
+    def _session(self) -> SNMPSession:
+        return _get_session(
+            _SessionKey(
+                family=socket.AF_INET6 if self.config.is_ipv6_primary else socket.AF_INET,
+                address=self.config.ipaddress or "0.0.0.0",
+                port=self.config.port,
+                version=self._version,
+                community=self._community,
+                timeout=float(self.config.timing.get("timeout", _DEFAULT_TIMEOUT)),
+                retries=int(self.config.timing.get("retries", _DEFAULT_RETRIES)),
+            )
+        )
+
+    def get(self, oid: OID, context_name: SNMPContextName | None = None) -> SNMPRawValue | None:
+        if oid.endswith(".*"):
+            oid_prefix = _parse_oid(oid[:-2])
+            pdu_type = PDUType.GETNEXT
+        else:
+            oid_prefix = _parse_oid(oid)
+            pdu_type = PDUType.GET
+
+        try:
+            response = self._session.request(pdu_type, [oid_prefix])
+        except (MKSNMPError, OSError) as exc:
+            console.verbose("SNMP error: %s\n" % exc)
+            return None
+
+        if response.error_status or not response.varbinds:
+            return None
+
+        varbind = response.varbinds[0]
+        console.vverbose("SNMP answer: ==> [%r]\n" % (varbind.value,))
+        if varbind.is_exception:
+            return None
+
+        # In case of .*, check if prefix is the one we are looking for
+        if pdu_type is PDUType.GETNEXT and not _is_below(varbind.oid, oid_prefix):
+            return None
+
+        return varbind.value
+
+    def walk(
+        self,
+        oid: OID,
+        section_name: SectionName | None = None,
+        table_base_oid: OID | None = None,
+        context_name: SNMPContextName | None = None,
+    ) -> SNMPRowInfo:
+        base = _parse_oid(oid)
+        console.vverbose(f"Walking {oid} ({'bulk' if self.config.is_bulkwalk_host else 'next'})\n")
+        try:
+            rowinfo = self._walk(self._session, base)
+            if not rowinfo:
+                # Like snmpwalk: Try to get the OID itself, if there is no subtree.
+                response = self._session.request(PDUType.GET, [base])
+                rowinfo = [
+                    (_format_oid(varbind.oid), varbind.value)
+                    for varbind in response.varbinds
+                    if not response.error_status and not varbind.is_exception
+                ]
+        except (MKSNMPError, OSError) as exc:
+            raise MKSNMPError(f"SNMP Error on {self.config.ipaddress}: {exc}")
+        return rowinfo
+
+    def _walk(self, session: SNMPSession, base: tuple[int, ...]) -> SNMPRowInfo:
+        rowinfo: SNMPRowInfo = []
+        current = base
+        while True:
+            if self.config.is_bulkwalk_host:
+                response = session.request(
+                    PDUType.GETBULK, [current], max_repetitions=self.config.bulk_walk_size_of
+                )
+            else:
+                response = session.request(PDUType.GETNEXT, [current])
+
+            if response.error_status == _NO_SUCH_NAME and session.version == 0:
+                return rowinfo  # SNMPv1 way of saying "end of MIB"
+            if response.error_status:
+                raise MKSNMPError(
+                    "Error in packet: error status %d, index %d"
+                    % (response.error_status, response.error_index)
+                )
+
+            last = current
+            for varbind in response.varbinds:
+                if _is_end_of_walk(varbind, base) or varbind.oid == last:
+                    return rowinfo
+                rowinfo.append((_format_oid(varbind.oid), varbind.value))
+                last = varbind.oid
+
+            if last == current:
+                return rowinfo
+            current = last
+
+
+def _is_below(oid: tuple[int, ...], base: tuple[int, ...]) -> bool:
+    return len(oid) > len(base) and oid[: len(base)] == base
+
+
+def _is_end_of_walk(varbind: VarBind, base: tuple[int, ...]) -> bool:
+    return varbind.type == ValueType.END_OF_MIB_VIEW or not _is_below(varbind.oid, base)
@@ -11,7 +11,7 @@ from typing import Final
 
 import cmk.utils.agent_simulator as agent_simulator
 import cmk.utils.paths
-from cmk.utils.exceptions import MKGeneralException, MKSNMPError
+from cmk.utils.exceptions import MKSNMPError
 from cmk.utils.log import console
 from cmk.utils.type_defs import AgentRawData, SectionName
 
@@ -25,6 +25,7 @@ from cmk.snmplib.type_defs import (
 )
 
 from ._utils import strip_snmp_value
+from ._walk_index import load_walk_index, WalkIndex
 
 __all__ = ["StoredWalkSNMPBackend"]
 
@@ -68,32 +69,15 @@ class StoredWalkSNMPBackend(SNMPBackend):
             dot_star = False
 
         console.vverbose(f"  Loading {oid}")
-        lines = self.read_walk_data()
-
-        begin = 0
-        end = len(lines)
-        hit = None
-        while end - begin > 0:
-            current = (begin + end) // 2
-            parts = lines[current].split(None, 1)
-            comp = parts[0]
-            hit = StoredWalkSNMPBackend._compare_oids(oid_prefix, comp)
-            if hit == 0:
+        rowinfo = []
+        for found_oid, raw_value in self.read_walk_index().lookup(
+            oid_prefix, include_prefix=not dot_star
+        ):
+            # FIXME: This encoding ping-pong is horrible...
+            value = agent_simulator.process(AgentRawData(raw_value.encode())).decode()
+            rowinfo.append((found_oid, strip_snmp_value(value)))
+            if dot_star:
                 break
-            if hit == 1:  # we are too low
-                begin = current + 1
-            else:
-                end = current
-
-        if hit != 0:
-            return []  # not found
-
-        rowinfo = StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current, -1)
-        rowinfo.reverse()
-        rowinfo += StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current + 1, 1)
-
-        if dot_star:
-            return [rowinfo[0]]
 
         return rowinfo
 
@@ -117,54 +101,9 @@ class StoredWalkSNMPBackend(SNMPBackend):
         except OSError:
             raise MKSNMPError("No snmpwalk file %s" % self.path)
 
-    @staticmethod
-    def _compare_oids(a: OID, b: OID) -> int:
-        aa = StoredWalkSNMPBackend._to_bin_string(a)
-        bb = StoredWalkSNMPBackend._to_bin_string(b)
-        if len(aa) <= len(bb) and bb[: len(aa)] == aa:
-            result = 0
-        else:
-            result = (aa > bb) - (aa < bb)
-        return result
-
-    @staticmethod
-    def _to_bin_string(oid: OID) -> tuple[int, ...]:
+    def read_walk_index(self) -> WalkIndex:
+        """The compiled index of the walk, shared with all backends using the same file"""
         try:
-            return tuple(map(int, oid.strip(".").split(".")))
-        except Exception:
-            raise MKGeneralException("Invalid OID %s" % oid)
-
-    @staticmethod
-    def _collect_until(
-        oid: OID, oid_prefix: OID, lines: Sequence[str], index: int, direction: int
-    ) -> SNMPRowInfo:
-        rows = []
-        # Handle case, where we run after the end of the lines list
-        if index >= len(lines):
-            if direction > 0:
-                return []
-            index -= 1
-        while True:
-            line = lines[index]
-            parts = line.split(None, 1)
-            o = parts[0]
-            if o.startswith("."):
-                o = o[1:]
-            if o == oid or o.startswith(oid_prefix + "."):
-                if len(parts) > 1:
-                    # FIXME: This encoding ping-pong is horrible...
-                    value = agent_simulator.process(
-                        AgentRawData(
-                            parts[1].encode(),
-                        ),
-                    ).decode()
-                else:
-                    value = ""
-                # Fix for missing starting oids
-                rows.append(("." + o, strip_snmp_value(value)))
-                index += direction
-                if index < 0 or index >= len(lines):
-                    break
-            else:
-                break
-        return rows
+            return load_walk_index(self.path, self.read_walk_from_path)
+        except OSError:
+            raise MKSNMPError("No snmpwalk file %s" % self.path)
@@ -5,6 +5,7 @@
 
 from __future__ import annotations
 
+from cmk.gui.config import active_config
 from cmk.gui.hooks import request_memoize
 from cmk.gui.i18n import _
 from cmk.gui.valuespec import DropdownChoiceEntries
@@ -37,6 +38,7 @@ def _get_cached_bi_compiler() -> BICompiler:
     return BICompiler(
         BIManager.bi_configuration_file(),
         SitesCallback(all_sites_with_id_and_online, bi_livestatus_query, _),
+        active_config.bi_compilation_workers,
     )
 
 
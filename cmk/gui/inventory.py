@@ -134,6 +134,17 @@ def load_filtered_and_merged_tree(row: Row) -> StructuredDataNode | None:
     return _filter_tree(merged_tree)
 
 
+def load_filtered_and_merged_table_tree(row: Row, path: SDPath) -> StructuredDataNode | None:
+    """Like load_filtered_and_merged_tree, but of the inventory tree only the
+    nodes at and below 'path' are loaded"""
+    hostname = row.get("host_name")
+    inventory_tree = _load_structured_data_tree("inventory", hostname, path)
+    status_data_tree = _load_status_data_tree(hostname, row)
+
+    merged_tree = _merge_inventory_and_status_data_tree(inventory_tree, status_data_tree)
+    return _filter_tree(merged_tree)
+
+
 def get_status_data_via_livestatus(site: livestatus.SiteId | None, hostname: HostName) -> Row:
     query = (
         "GET hosts\nColumns: host_structured_status\nFilter: host_name = %s\n"
@@ -488,7 +499,9 @@ class LoadStructuredDataError(MKException):
 
 @request_memoize(maxsize=None)
 def _load_structured_data_tree(
-    tree_type: Literal["inventory", "status_data"], hostname: HostName | None
+    tree_type: Literal["inventory", "status_data"],
+    hostname: HostName | None,
+    path: SDPath | None = None,
 ) -> StructuredDataNode | None:
     """Load data of a host, cache it in the current HTTP request"""
     if not hostname:
@@ -498,6 +511,14 @@ def _load_structured_data_tree(
         # just for security reasons
         return None
 
+    # The tree is filtered by the permitted paths later on, there is no need
+    # to decode the other parts of it.
+    paths: list[SDPath] | None = None
+    if path is not None:
+        paths = [path]
+    elif permitted_paths := _get_permitted_inventory_paths():
+        paths = [make_filter(entry).path for entry in permitted_paths if entry]
+
     try:
         return load_tree(
             Path(
@@ -505,7 +526,8 @@ def _load_structured_data_tree(
                 if tree_type == "inventory"
                 else cmk.utils.paths.status_data_dir
             )
-            / hostname
+            / hostname,
+            paths=paths,
         )
     except Exception as e:
         if active_config.debug:
@@ -222,6 +222,7 @@ def register(
     config_var_registry.register(ConfigVariableEventConsoleEventLimit)
     config_var_registry.register(ConfigVariableEventConsoleHistoryRotation)
     config_var_registry.register(ConfigVariableEventConsoleHistoryLifetime)
+    config_var_registry.register(ConfigVariableEventConsoleHistoryFsync)
     config_var_registry.register(ConfigVariableEventConsoleSocketQueueLength)
     config_var_registry.register(ConfigVariableEventConsoleEventSocketQueueLength)
     config_var_registry.register(ConfigVariableEventConsoleTranslateSNMPTraps)
@@ -4298,6 +4299,29 @@ class ConfigVariableEventConsoleHistoryLifetime(ConfigVariable):
         )
 
 
+class ConfigVariableEventConsoleHistoryFsync(ConfigVariable):
+    def group(self) -> type[ConfigVariableGroup]:
+        return ConfigVariableGroupEventConsoleGeneric
+
+    def domain(self) -> type[ABCConfigDomain]:
+        return ConfigDomainEventConsole
+
+    def ident(self) -> str:
+        return "history_fsync"
+
+    def valuespec(self) -> ValueSpec:
+        return Checkbox(
+            title=_("Synchronize event history to disk"),
+            label=_("call fsync after each write to the event history logfile"),
+            help=_(
+                "The entries of the event history are written to the logfile in batches by a "
+                "background thread. If this option is enabled, each batch is synchronized to "
+                "disk before the next one is written. This makes sure that no history entries "
+                "are lost if the system crashes, but it slows down writing the history."
+            ),
+        )
+
+
 class ConfigVariableEventConsoleSocketQueueLength(ConfigVariable):
     def group(self) -> type[ConfigVariableGroup]:
         return ConfigVariableGroupEventConsoleGeneric
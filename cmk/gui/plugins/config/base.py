@@ -584,6 +584,7 @@ class CREConfig:
             "aggregations": {},
         }
     )
+    bi_compilation_workers: int = 1
 
     # Deprecated. Kept for compatibility.
     bi_compile_log: str | None = None
@@ -572,6 +572,35 @@ class ConfigVariableHardQueryLimit(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableBICompilationWorkers(ConfigVariable):
+    def group(self) -> type[ConfigVariableGroup]:
+        return ConfigVariableGroupUserInterface
+
+    def domain(self) -> type[ABCConfigDomain]:
+        return ConfigDomainGUI
+
+    def ident(self) -> str:
+        return "bi_compilation_workers"
+
+    def valuespec(self) -> ValueSpec:
+        return Integer(
+            title=_("Parallel BI compilation"),
+            help=_(
+                "The number of processes compiling the BI aggregations after the configuration "
+                "or the monitored hosts have changed. With one process, the default, the "
+                "aggregations are compiled within the web server process requesting them. "
+                "Additional processes are started from a fresh Python interpreter for every "
+                "compilation, so only large BI configurations on machines with several CPUs "
+                "benefit from more processes. The compiled aggregations are always prepared "
+                "for the views in the web server process one after the other, which limits "
+                "the speedup."
+            ),
+            minvalue=1,
+            maxvalue=64,
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableQuicksearchDropdownLimit(ConfigVariable):
     def group(self) -> type[ConfigVariableGroup]:
@@ -2895,20 +2924,25 @@ class ConfigVariableUseDNSCache(ConfigVariable):
 
 
 def transform_snmp_backend_default_to_valuespec(
-    backend: Literal["classic", "inline"]
+    backend: Literal["classic", "inline", "pooled"]
 ) -> SNMPBackendEnum:
     return {
         "classic": SNMPBackendEnum.CLASSIC,
         "inline": SNMPBackendEnum.INLINE,
+        "pooled": SNMPBackendEnum.POOLED,
     }[backend]
 
 
-def transform_snmp_backend_from_valuespec(backend: SNMPBackendEnum) -> Literal["classic", "inline"]:
+def transform_snmp_backend_from_valuespec(
+    backend: SNMPBackendEnum,
+) -> Literal["classic", "inline", "pooled"]:
     match backend:
         case SNMPBackendEnum.CLASSIC:
             return "classic"
         case SNMPBackendEnum.INLINE:
             return "inline"
+        case SNMPBackendEnum.POOLED:
+            return "pooled"
         case _:
             raise MKConfigError("SNMPBackendEnum %r not implemented" % backend)
 
@@ -2933,6 +2967,7 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                 choices=[
                     (SNMPBackendEnum.CLASSIC, _("Use Classic SNMP Backend")),
                     (SNMPBackendEnum.INLINE, _("Use Inline SNMP Backend")),
+                    (SNMPBackendEnum.POOLED, _("Use Pooled SNMP Backend")),
                 ],
                 help=_(
                     "By default Checkmk uses command line calls of Net-SNMP tools like snmpget or "
@@ -2941,7 +2976,9 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                     "which calls the respective libraries directly via its python bindings. This "
                     "should increase the performance of SNMP checks in a significant way. Both "
                     "SNMP modes are features which improve the performance for large installations and are "
-                    "only available via our subscription."
+                    "only available via our subscription. The Pooled SNMP Backend keeps one "
+                    "connection per host open and talks SNMPv1 and SNMPv2c without the Net-SNMP "
+                    "tools. SNMPv3 hosts are always queried with the Classic SNMP Backend."
                 ),
             ),
             to_valuespec=transform_snmp_backend_hosts_to_valuespec,
@@ -5182,6 +5219,8 @@ def transform_snmp_backend_hosts_to_valuespec(backend):
         # We dropped pysnmp during the 2.1 beta because it is currently slow
         # and unreliable.
         return SNMPBackendEnum.CLASSIC
+    if backend == "pooled":
+        return SNMPBackendEnum.POOLED
     raise MKConfigError("SNMPBackendEnum %r not implemented" % backend)
 
 
@@ -5192,6 +5231,7 @@ def _valuespec_snmp_backend():
             choices=[
                 (SNMPBackendEnum.INLINE, _("Use Inline SNMP Backend")),
                 (SNMPBackendEnum.CLASSIC, _("Use Classic Backend")),
+                (SNMPBackendEnum.POOLED, _("Use Pooled SNMP Backend (SNMPv1 and SNMPv2c only)")),
             ],
         ),
         to_valuespec=transform_snmp_backend_hosts_to_valuespec,
@@ -1503,7 +1503,9 @@ class RowTableInventory(ABCRowTable):
 
     def _get_inv_data(self, hostrow: Row) -> Sequence[SDRow]:
         try:
-            merged_tree = inventory.load_filtered_and_merged_tree(hostrow)
+            merged_tree = inventory.load_filtered_and_merged_table_tree(
+                hostrow, self._inventory_path.path
+            )
         except inventory.LoadStructuredDataError:
             user_errors.add(
                 MKUserError(
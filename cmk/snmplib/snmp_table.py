@@ -4,7 +4,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Provide methods to get an snmp table with or without caching
 """
-from collections.abc import Callable, Iterable, Iterator, MutableMapping, Sequence
+from collections.abc import Callable, Iterable, Iterator, Mapping, MutableMapping, Sequence
 from pathlib import Path
 
 import cmk.utils.debug
@@ -17,6 +17,7 @@ from .type_defs import (
     BackendSNMPTree,
     OID,
     SNMPBackend,
+    SNMPContextName,
     SNMPDecodedValues,
     SNMPRawValue,
     SNMPRowInfo,
@@ -134,6 +135,93 @@ class WalkCache(
             self._write_row(path, rowinfo)
 
 
+def plan_walks(fetchoids: Iterable[OID]) -> Mapping[OID, Sequence[OID]]:
+    """Coalesce the OIDs to be walked into a minimal set of subtree walks
+
+    Maps every OID that actually has to be walked to the requested OIDs it
+    covers (including itself). An OID is covered by another one, if it lies
+    in the subtree of the other.
+
+    Sibling columns of a table are not merged into a walk of the table: the
+    walk would also fetch all columns nobody requested, which usually costs
+    more requests than the one request ending each column walk.
+    """
+    plan: dict[OID, list[OID]] = {}
+    root: tuple[int, ...] | None = None
+    root_oid = ""
+    for fetchoid in sorted(set(fetchoids), key=_key_oid_prefix):
+        key = _key_oid_prefix(fetchoid)
+        if root is None or key[: len(root)] != root:
+            root, root_oid = key, fetchoid
+            plan[root_oid] = []
+        plan[root_oid].append(fetchoid)
+    return plan
+
+
+def prefetch_snmp_walks(
+    *,
+    trees: Mapping[SectionName, Iterable[BackendSNMPTree]],
+    walk_cache: MutableMapping[str, tuple[bool, SNMPRowInfo]],
+    backend: SNMPBackend,
+) -> None:
+    """Walk the columns of all trees in as few subtree walks as possible
+
+    The rows of every requested column are stored in the walk cache, from
+    where `get_snmp_table` picks them up per section.
+
+    Sections with OID range limits are left alone, as the limits are applied
+    per section by the backend. The same goes for sections that are queried
+    in different SNMPv3 contexts, they are only coalesced with each other.
+    """
+    grouped: dict[
+        tuple[SNMPContextName | None, ...], dict[OID, tuple[SectionName, BackendSNMPTree, bool]]
+    ] = {}
+    for section_name, section_trees in trees.items():
+        if section_name in backend.config.oid_range_limits:
+            continue
+        group = grouped.setdefault(tuple(backend.config.snmpv3_contexts_of(section_name)), {})
+        for tree in section_trees:
+            for oid in tree.oids:
+                if isinstance(oid.column, SpecialColumn):
+                    continue
+                fetchoid = f"{tree.base}.{oid.column}"
+                if fetchoid in walk_cache:
+                    continue
+                # The first section requesting an OID is the one it is walked for.
+                # It is only cached if no section needs live data, see WalkCache.load.
+                first_section, first_tree, save_to_cache = group.get(
+                    fetchoid, (section_name, tree, True)
+                )
+                group[fetchoid] = (first_section, first_tree, save_to_cache and oid.save_to_cache)
+
+    for requested in grouped.values():
+        # Keep the order of the sections: CPU sections are fetched first on purpose.
+        order = {fetchoid: index for index, fetchoid in enumerate(requested)}
+        for root_oid, covered in sorted(
+            plan_walks(requested).items(),
+            key=lambda item: min(order[fetchoid] for fetchoid in item[1]),
+        ):
+            section_name, tree, _save_to_cache = requested[root_oid]
+            rowinfo = _perform_snmpwalk(section_name, tree.base, root_oid, backend=backend)
+            if len(covered) > 1:
+                console.vverbose(f"Walked {root_oid} for {', '.join(covered)}\n")
+            for fetchoid in covered:
+                walk_cache[fetchoid] = (
+                    requested[fetchoid][2],
+                    rowinfo if fetchoid == root_oid else _subtree_rows(rowinfo, fetchoid),
+                )
+
+
+def _subtree_rows(rowinfo: SNMPRowInfo, fetchoid: OID) -> SNMPRowInfo:
+    oid = fetchoid.lstrip(".")
+    prefix = f"{oid}."
+    return [
+        (row_oid, value)
+        for row_oid, value in rowinfo
+        if (stripped := row_oid.lstrip(".")) == oid or stripped.startswith(prefix)
+    ]
+
+
 def get_snmp_table(
     *,
     section_name: SectionName | None,
@@ -256,6 +344,10 @@ def _key_oids(o1: OID) -> list[int]:
     return _oid_to_intlist(o1)
 
 
+def _key_oid_prefix(oid: OID) -> tuple[int, ...]:
+    return tuple(_oid_to_intlist(oid.lstrip(".")))
+
+
 def _key_oid_pairs(pair1: tuple[OID, SNMPRawValue]) -> list[int]:
     return _oid_to_intlist(pair1[0].lstrip("."))
 
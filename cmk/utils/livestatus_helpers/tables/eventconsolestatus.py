@@ -171,6 +171,13 @@ class Eventconsolestatus(Table):
     )
     """The number of events received since startup of the Event Console"""
 
+    status_history_queue_length = Column(
+        'status_history_queue_length',
+        col_type='int',
+        description='The number of history entries waiting to be written',
+    )
+    """The number of history entries waiting to be written"""
+
     status_message_rate = Column(
         'status_message_rate',
         col_type='float',
@@ -7,7 +7,8 @@ import errno
 import logging
 import os
 import tempfile
-from collections.abc import Container, Iterable, Iterator, Mapping, Sequence
+import time
+from collections.abc import Callable, Container, Iterable, Iterator, Mapping, Sequence
 from contextlib import suppress
 from dataclasses import dataclass
 from pathlib import Path
@@ -17,6 +18,7 @@ import cmk.utils
 import cmk.utils.paths
 import cmk.utils.store as store
 import cmk.utils.translations
+from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import VERBOSE
 from cmk.utils.regex import regex
 from cmk.utils.render import Age
@@ -65,6 +67,9 @@ _PiggybackTimeSettingsMap = Mapping[tuple[str | None, str], int]
 # "source_hostname":
 # - Path(tmp/check_mk/piggyback/HOST/SOURCE).name
 # - Path(tmp/check_mk/piggyback_sources/SOURCE).name
+#
+# "piggyback_index":
+# - tmp/check_mk/piggyback/HOST/.index
 
 
 def get_piggyback_raw_data(
@@ -233,33 +238,33 @@ def _get_piggyback_processed_file_infos(
     _get_piggyback_processed_file_infos(), store_piggyback_raw_data() or cleanup_piggyback_files()
     functions. Therefor all these functions needs to deal with suddenly vanishing or
     updated files/directories.
+
+    The piggyback index of the host is used if there is one. Otherwise its
+    folder is scanned.
     """
-    source_hostnames = get_source_hostnames(piggybacked_hostname)
-    expanded_time_settings = _TimeSettingsMap(source_hostnames, piggybacked_hostname, time_settings)
+    file_mtimes = _load_piggyback_index(piggybacked_hostname)
+    expanded_time_settings = _TimeSettingsMap(file_mtimes, piggybacked_hostname, time_settings)
     return [
         _get_piggyback_processed_file_info(
             source_hostname,
             piggybacked_hostname,
-            _get_piggybacked_file_path(source_hostname, piggybacked_hostname),
+            file_mtime,
+            _get_source_status_mtime(source_hostname),
             expanded_time_settings,
         )
-        for source_hostname in source_hostnames
-        if not source_hostname.startswith(".")
+        for source_hostname, file_mtime in file_mtimes.items()
     ]
 
 
 def _get_piggyback_processed_file_info(
     source_hostname: HostName,
     piggybacked_hostname: HostName,
-    piggyback_file_path: Path,
+    file_mtime: float,
+    status_mtime: float | None,
     settings: _TimeSettingsMap,
 ) -> PiggybackFileInfo:
-    try:
-        file_age = cmk.utils.cachefile_age(piggyback_file_path)
-    except FileNotFoundError:
-        return PiggybackFileInfo(
-            source_hostname, piggyback_file_path, False, "Piggyback file is missing", 0
-        )
+    piggyback_file_path = _get_piggybacked_file_path(source_hostname, piggybacked_hostname)
+    file_age = time.time() - file_mtime
 
     if (outdated := file_age - settings.max_cache_age(source_hostname, piggybacked_hostname)) > 0:
         return PiggybackFileInfo(
@@ -273,8 +278,7 @@ def _get_piggyback_processed_file_info(
     validity_period = settings.validity_period(source_hostname, piggybacked_hostname)
     validity_state = settings.validity_state(source_hostname, piggybacked_hostname)
 
-    status_file_path = _get_source_status_file_path(source_hostname)
-    if not status_file_path.exists():
+    if status_mtime is None:
         valid_msg = _validity_period_message(file_age, validity_period)
         return PiggybackFileInfo(
             source_hostname,
@@ -284,7 +288,7 @@ def _get_piggyback_processed_file_info(
             validity_state if valid_msg else 0,
         )
 
-    if _is_piggyback_file_outdated(status_file_path, piggyback_file_path):
+    if status_mtime > file_mtime:
         valid_msg = _validity_period_message(file_age, validity_period)
         return PiggybackFileInfo(
             source_hostname,
@@ -312,20 +316,6 @@ def _validity_period_message(
     return f" (still valid, {Age(time_left)} left)"
 
 
-def _is_piggyback_file_outdated(
-    status_file_path: Path,
-    piggyback_file_path: Path,
-) -> bool:
-    try:
-        # TODO use Path.stat() but be aware of:
-        # On POSIX platforms Python reads atime and mtime at nanosecond resolution
-        # but only writes them at microsecond resolution.
-        # (We're using os.utime() in _store_status_file_of())
-        return os.stat(str(status_file_path))[8] > os.stat(str(piggyback_file_path))[8]
-    except FileNotFoundError:
-        return True
-
-
 def _remove_piggyback_file(piggyback_file_path: Path) -> bool:
     try:
         piggyback_file_path.unlink()
@@ -367,7 +357,11 @@ def store_piggyback_raw_data(
         logger.log(VERBOSE, "Received piggyback data for %d hosts", len(piggybacked_raw_data))
 
         status_file_path = _get_source_status_file_path(source_hostname)
-        _store_status_file_of(status_file_path, piggyback_file_paths)
+        _store_status_file_of(
+            status_file_path,
+            piggyback_file_paths,
+            lambda status_mtime: _index_source(source_hostname, piggybacked_raw_data, status_mtime),
+        )
     else:
         logger.debug("Received no piggyback data")
         remove_source_status_file(source_hostname)
@@ -376,7 +370,12 @@ def store_piggyback_raw_data(
 def _store_status_file_of(
     status_file_path: Path,
     piggyback_file_paths: Iterable[Path],
+    index: Callable[[float], object],
 ) -> None:
+    """Store the status file, the piggyback files are indexed with its mtime
+
+    The index is updated before the status file is replaced, so that the
+    files are never considered outdated in between."""
     store.makedirs(status_file_path.parent)
 
     # Cannot use store.save_bytes_to_file like:
@@ -407,6 +406,7 @@ def _store_status_file_of(
                 os.utime(str(piggyback_file_path), status_file_times)
             except FileNotFoundError:
                 continue
+        index(status_file_times[1])
     os.rename(tmp_path, str(status_file_path))
 
 
@@ -423,13 +423,12 @@ def _store_status_file_of(
 def get_source_hostnames(piggybacked_hostname: HostName | None = None) -> Sequence[HostName]:
     if piggybacked_hostname is None:
         return [
-            HostName(source_host.name)
+            source_hostname
             for piggybacked_host_folder in _get_piggybacked_host_folders()
-            for source_host in _files_in(piggybacked_host_folder)
+            for source_hostname in _load_piggyback_index(HostName(piggybacked_host_folder.name))
         ]
 
-    piggybacked_host_folder = cmk.utils.paths.piggyback_dir / Path(piggybacked_hostname)
-    return [HostName(source_host.name) for source_host in _files_in(piggybacked_host_folder)]
+    return list(_load_piggyback_index(piggybacked_hostname))
 
 
 def _get_piggybacked_host_folders() -> Sequence[Path]:
@@ -451,6 +450,13 @@ def _get_source_status_file_path(source_hostname: HostName) -> Path:
     return cmk.utils.paths.piggyback_source_dir / str(source_hostname)
 
 
+def _get_source_status_mtime(source_hostname: HostName) -> float | None:
+    try:
+        return _get_source_status_file_path(source_hostname).stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
 def _get_piggybacked_file_path(
     source_hostname: HostName,
     piggybacked_hostname: HostName,
@@ -458,6 +464,98 @@ def _get_piggybacked_file_path(
     return cmk.utils.paths.piggyback_dir / piggybacked_hostname / source_hostname
 
 
+# .
+#   .--index---------------------------------------------------------------.
+#   |                       _           _                                  |
+#   |                      (_)_ __   __| | _____  __                       |
+#   |                      | | '_ \ / _` |/ _ \ \/ /                       |
+#   |                      | | | | | (_| |  __/>  <                        |
+#   |                      |_|_| |_|\__,_|\___/_/\_\                       |
+#   |                                                                      |
+#   '----------------------------------------------------------------------'
+
+# The piggyback index of a piggybacked host holds the mtimes of its piggyback
+# files by source host, so that the validity of its piggyback data can be
+# computed without listing and reading its folder. It is stored in the folder of
+# the host and updated under its lock by all functions creating or removing the
+# piggyback files. It is built from the folder if it is missing.
+#
+# A source sets the mtime of the files it stores to the one of its status file.
+# In the index the very same value is used for both, so a file is outdated if and
+# only if its mtime is older than the one of the status file.
+
+_PiggybackIndex = dict[HostName, float]
+
+
+def _get_piggyback_index_store(
+    piggybacked_hostname: HostName,
+) -> store.ObjectStore[_PiggybackIndex | None]:
+    return store.ObjectStore(
+        cmk.utils.paths.piggyback_dir / piggybacked_hostname / ".index",
+        serializer=store.MarshalSerializer(),
+    )
+
+
+def _load_piggyback_index(piggybacked_hostname: HostName) -> _PiggybackIndex:
+    index_store = _get_piggyback_index_store(piggybacked_hostname)
+    try:
+        if (index := index_store.read_obj(default=None)) is not None:
+            return index
+    except (MKGeneralException, ValueError, EOFError, TypeError):
+        logger.log(VERBOSE, "Cannot read piggyback index '%s'", index_store.path)
+    return _build_piggyback_index(piggybacked_hostname)
+
+
+def _build_piggyback_index(piggybacked_hostname: HostName) -> _PiggybackIndex:
+    """Build the index from the folder of the piggybacked host"""
+    index: _PiggybackIndex = {}
+    for piggybacked_host_source in _files_in(cmk.utils.paths.piggyback_dir / piggybacked_hostname):
+        source_hostname = HostName(piggybacked_host_source.name)
+        try:
+            file_mtime = piggybacked_host_source.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        # The mtimes are read at nanosecond resolution, but have been written at
+        # microsecond resolution (see _store_status_file_of). Only whole seconds
+        # can be compared.
+        status_mtime = _get_source_status_mtime(source_hostname)
+        if status_mtime is not None and int(status_mtime) <= int(file_mtime):
+            file_mtime = max(file_mtime, status_mtime)
+        index[source_hostname] = file_mtime
+    return index
+
+
+def update_piggyback_index_of_host(host_name: HostName) -> None:
+    """Update the indexes after the files of the host have been changed by other means
+
+    E.g. when renaming or removing a host, its files as piggybacked host and
+    as source host are moved or removed without the functions of this module.
+    The index of a piggybacked host is moved or removed along with its folder,
+    so only the indexes listing the host as source need an update.
+    """
+    for piggybacked_host_folder in _get_piggybacked_host_folders():
+        piggybacked_hostname = HostName(piggybacked_host_folder.name)
+        if (piggybacked_host_folder / host_name).exists() or host_name in _load_piggyback_index(
+            piggybacked_hostname
+        ):
+            index_store = _get_piggyback_index_store(piggybacked_hostname)
+            with index_store.locked():
+                index_store.write_obj(_build_piggyback_index(piggybacked_hostname))
+
+
+def _index_source(
+    source_hostname: HostName,
+    piggybacked_hostnames: Iterable[HostName],
+    status_mtime: float,
+) -> None:
+    for piggybacked_hostname in piggybacked_hostnames:
+        index_store = _get_piggyback_index_store(piggybacked_hostname)
+        with index_store.locked():
+            index = _load_piggyback_index(piggybacked_hostname)
+            index[source_hostname] = status_mtime
+            index_store.write_obj(index)
+
+
 # .
 #   .--clean up------------------------------------------------------------.
 #   |                     _                                                |
@@ -491,42 +589,39 @@ def cleanup_piggyback_files(time_settings: PiggybackTimeSettings) -> None:
 
 def _get_piggybacked_hosts_settings(
     time_settings: PiggybackTimeSettings,
-) -> Sequence[tuple[Path, Sequence[Path], _TimeSettingsMap]]:
+) -> Sequence[tuple[HostName, Sequence[HostName], _TimeSettingsMap]]:
     piggybacked_hosts_settings = []
     for piggybacked_host_folder in _get_piggybacked_host_folders():
-        source_hosts = _files_in(piggybacked_host_folder)
-        time_settings_map = _TimeSettingsMap(
-            [HostName(source_host.name) for source_host in source_hosts],
-            HostName(piggybacked_host_folder.name),
-            time_settings,
-        )
+        piggybacked_hostname = HostName(piggybacked_host_folder.name)
+        source_hostnames = list(_load_piggyback_index(piggybacked_hostname))
         piggybacked_hosts_settings.append(
-            (piggybacked_host_folder, source_hosts, time_settings_map)
+            (
+                piggybacked_hostname,
+                source_hostnames,
+                _TimeSettingsMap(source_hostnames, piggybacked_hostname, time_settings),
+            )
         )
     return piggybacked_hosts_settings
 
 
 def _cleanup_old_source_status_files(
-    piggybacked_hosts_settings: Iterable[tuple[Path, Iterable[Path], _TimeSettingsMap]]
+    piggybacked_hosts_settings: Iterable[tuple[HostName, Iterable[HostName], _TimeSettingsMap]],
 ) -> None:
     """Remove source status files which exceed configured maximum cache age.
     There may be several 'Piggybacked Host Files' rules where the max age is configured.
     We simply use the greatest one per source."""
 
     max_cache_age_by_sources: dict[str, int] = {}
-    for piggybacked_host_folder, source_hosts, time_settings in piggybacked_hosts_settings:
-        for source_host in source_hosts:
-            max_cache_age = time_settings.max_cache_age(
-                HostName(source_host.name),
-                HostName(piggybacked_host_folder.name),
-            )
+    for piggybacked_hostname, source_hostnames, time_settings in piggybacked_hosts_settings:
+        for source_hostname in source_hostnames:
+            max_cache_age = time_settings.max_cache_age(source_hostname, piggybacked_hostname)
 
-            max_cache_age_of_source = max_cache_age_by_sources.get(source_host.name)
+            max_cache_age_of_source = max_cache_age_by_sources.get(source_hostname)
             if max_cache_age_of_source is None:
-                max_cache_age_by_sources[source_host.name] = max_cache_age
+                max_cache_age_by_sources[source_hostname] = max_cache_age
 
             elif max_cache_age >= max_cache_age_of_source:
-                max_cache_age_by_sources[source_host.name] = max_cache_age
+                max_cache_age_by_sources[source_hostname] = max_cache_age
 
     for source_state_file in _get_source_state_files():
         try:
@@ -555,31 +650,46 @@ def _cleanup_old_source_status_files(
 
 
 def _cleanup_old_piggybacked_files(
-    piggybacked_hosts_settings: Iterable[tuple[Path, Iterable[Path], _TimeSettingsMap]]
+    piggybacked_hosts_settings: Iterable[tuple[HostName, Iterable[HostName], _TimeSettingsMap]],
 ) -> None:
     """Remove piggybacked data files which exceed configured maximum cache age."""
 
-    for piggybacked_host_folder, source_hosts, time_settings in piggybacked_hosts_settings:
-        for piggybacked_host_source in source_hosts:
-            file_info = _get_piggyback_processed_file_info(
-                HostName(piggybacked_host_source.name),
-                HostName(piggybacked_host_folder.name),
-                piggybacked_host_source,
-                time_settings,
-            )
-
-            if not file_info.successfully_processed:
-                logger.log(
-                    VERBOSE,
-                    "Piggyback file '%s' is outdated (%s). Remove it.",
-                    piggybacked_host_source,
-                    file_info.message,
+    for piggybacked_hostname, _source_hostnames, time_settings in piggybacked_hosts_settings:
+        index_store = _get_piggyback_index_store(piggybacked_hostname)
+        with index_store.locked():
+            file_mtimes = _load_piggyback_index(piggybacked_hostname)
+            for source_hostname, file_mtime in list(file_mtimes.items()):
+                file_info = _get_piggyback_processed_file_info(
+                    source_hostname,
+                    piggybacked_hostname,
+                    file_mtime,
+                    _get_source_status_mtime(source_hostname),
+                    time_settings,
                 )
-                _remove_piggyback_file(piggybacked_host_source)
 
-        # Remove empty backed host directory
+                if not file_info.successfully_processed:
+                    logger.log(
+                        VERBOSE,
+                        "Piggyback file '%s' is outdated (%s). Remove it.",
+                        file_info.file_path,
+                        file_info.message,
+                    )
+                    _remove_piggyback_file(file_info.file_path)
+                    del file_mtimes[source_hostname]
+
+            if file_mtimes:
+                index_store.write_obj(file_mtimes)
+                continue
+
+            # Remove empty backed host directory, a source storing a file in
+            # the meantime builds the index again
+            index_store.path.unlink(missing_ok=True)
+
+        piggybacked_host_folder = cmk.utils.paths.piggyback_dir / piggybacked_hostname
         try:
             piggybacked_host_folder.rmdir()
+        except FileNotFoundError:
+            pass
         except OSError as e:
             if e.errno == errno.ENOTEMPTY:
                 continue
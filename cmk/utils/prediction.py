@@ -91,6 +91,36 @@ class PredictionData:
         return json.dumps(asdict(self))
 
 
+@dataclass(frozen=True)
+class PredictionSlices:
+    """The completed slices of a prediction, as consolidated by the RRD
+
+    Each slice is kept in the resolution it was fetched in, as its time window
+    relative to the start of the slice and its values. With these at hand a
+    refresh of the prediction only needs to fetch the slices that have been
+    completed since the last one."""
+
+    cf: ConsolidationFunctionName
+    slices: dict[Timestamp, tuple[TimeWindow, TimeSeriesValues]]
+
+    @classmethod
+    def loads(cls, raw: str) -> "PredictionSlices":
+        data = json.loads(raw)
+        return cls(
+            cf=ConsolidationFunctionName(data["cf"]),
+            slices={
+                Timestamp(int(slice_start)): (
+                    (Timestamp(start), Timestamp(end), Seconds(step)),
+                    [None if e is None else float(e) for e in values],
+                )
+                for slice_start, ((start, end, step), values) in data["slices"].items()
+            },
+        )
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self))
+
+
 def is_dst(timestamp: float) -> bool:
     """Check wether a certain time stamp lies with in daylight saving time (DST)"""
     return bool(time.localtime(timestamp).tm_isdst)
@@ -182,19 +212,31 @@ class TimeSeries:
         twindow : 3-tuple, (start, end, step)
              description of target time interval
         """
+        start, end, step = twindow
+        if start == self.start and end == self.end and step == self.step:
+            return self.values
+
+        if step <= 0 or start >= end:
+            return self._bfill_upsample_stepwise(twindow, shift)
+
+        from cmk.utils import prediction_arrays  # pylint: disable=import-outside-toplevel
+
+        upsampled = prediction_arrays.bfill_upsample(
+            self.values, rrd_timestamps(self.twindow), twindow, shift
+        )
+        return self._bfill_upsample_stepwise(twindow, shift) if upsampled is None else upsampled
+
+    def _bfill_upsample_stepwise(self, twindow: TimeWindow, shift: Seconds) -> TimeSeriesValues:
         upsa = []
         i = 0
         start, end, step = twindow
         current_times = rrd_timestamps(self.twindow)
-        if start != self.start or end != self.end or step != self.step:
-            for t in range(start, end, step):
-                if t >= current_times[i] + shift:
-                    i += 1
-                upsa.append(self.values[i])
+        for t in range(start, end, step):
+            if t >= current_times[i] + shift:
+                i += 1
+            upsa.append(self.values[i])
 
-            return upsa
-
-        return self.values
+        return upsa
 
     def downsample(
         self, twindow: TimeWindow, cf: ConsolidationFunctionName = "max"
@@ -206,26 +248,40 @@ class TimeSeries:
         cf : str ('max', 'average', 'min')
              consolidation function imitating RRD methods
         """
+        start, end, step = twindow
+        if start == self.start and end == self.end and step == self.step:
+            return self.values
+
+        from cmk.utils import prediction_arrays  # pylint: disable=import-outside-toplevel
+
+        downsampled = prediction_arrays.downsample(
+            self.values,
+            rrd_timestamps(self.twindow)[: len(self.values)],
+            rrd_timestamps(twindow),
+            cf,
+        )
+        return self._downsample_stepwise(twindow, cf) if downsampled is None else downsampled
+
+    def _downsample_stepwise(
+        self, twindow: TimeWindow, cf: ConsolidationFunctionName
+    ) -> TimeSeriesValues:
         dwsa = []
         i = 0
         co: TimeSeriesValues = []
-        start, end, step = twindow
         desired_times = rrd_timestamps(twindow)
-        if start != self.start or end != self.end or step != self.step:
-            for t, val in self.time_data_pairs():
-                if t > desired_times[i]:
-                    dwsa.append(aggregation_functions(co, cf))
-                    co = []
-                    i += 1
-                co.append(val)
-
-            diff_len = len(desired_times) - len(dwsa)
-            if diff_len > 0:
+        for t, val in self.time_data_pairs():
+            if t > desired_times[i]:
                 dwsa.append(aggregation_functions(co, cf))
-                dwsa = dwsa + [None] * (diff_len - 1)
+                co = []
+                i += 1
+            co.append(val)
 
-            return dwsa
-        return self.values
+        diff_len = len(desired_times) - len(dwsa)
+        if diff_len > 0:
+            dwsa.append(aggregation_functions(co, cf))
+            dwsa = dwsa + [None] * (diff_len - 1)
+
+        return dwsa
 
     def time_data_pairs(self) -> list[tuple[Timestamp, TimeSeriesValue]]:
         return list(zip(rrd_timestamps(self.twindow), self.values))
@@ -379,6 +435,9 @@ class PredictionStore:
     def _info_file(self, timegroup: Timegroup) -> Path:
         return self._dir / f"{timegroup}.info"
 
+    def _slices_file(self, timegroup: Timegroup) -> Path:
+        return self._dir / f"{timegroup}.slices"
+
     def save_predictions(
         self,
         info: PredictionInfo,
@@ -390,11 +449,20 @@ class PredictionStore:
         with self._data_file(info.name).open("w") as fname:
             fname.write(data_for_pred.dumps())
 
+    def save_slices(self, timegroup: Timegroup, slices: PredictionSlices) -> None:
+        self._dir.mkdir(exist_ok=True, parents=True)
+        with self._slices_file(timegroup).open("w") as fname:
+            fname.write(slices.dumps())
+
     def clean_prediction_files(self, timegroup: Timegroup, force: bool = False) -> None:
         # In previous versions it could happen that the files were created with 0 bytes of size
         # which was never handled correctly so that the prediction could never be used again until
         # manual removal of the files. Clean this up.
-        for file_path in [self._data_file(timegroup), self._info_file(timegroup)]:
+        for file_path in [
+            self._data_file(timegroup),
+            self._info_file(timegroup),
+            self._slices_file(timegroup),
+        ]:
             with suppress(FileNotFoundError):
                 if force or file_path.stat().st_size == 0:
                     file_path.unlink()
@@ -408,6 +476,13 @@ class PredictionStore:
         raw = self._read_file(self._data_file(timegroup))
         return None if raw is None else PredictionData.loads(raw)
 
+    def get_slices(self, timegroup: Timegroup) -> PredictionSlices | None:
+        """The slices are only a cache, anything unreadable is recomputed"""
+        try:
+            return PredictionSlices.loads(self._slices_file(timegroup).read_text())
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
     def _read_file(self, file_path: Path) -> str | None:
         try:
             with file_path.open() as fh:
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Vectorized computations for the predictions
+
+Importing numpy takes longer than many a check helper needs for its work, and
+most of the processes importing cmk.utils.prediction never compute anything
+with it. So numpy is only imported here, and this module is only imported where
+a time series is actually resampled or a prediction computed.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+from cmk.utils.prediction import (
+    ConsolidationFunctionName,
+    DataStats,
+    Seconds,
+    TimeSeriesValue,
+    TimeSeriesValues,
+    Timestamp,
+    TimeWindow,
+)
+
+
+def _as_array(values: TimeSeriesValues) -> npt.NDArray[np.float64]:
+    """Return the values as array, None becomes NaN"""
+    return np.array(values, dtype=np.float64)
+
+
+def _is_stepwise(indices: npt.NDArray[np.intp], limit: int) -> bool:
+    """Check if the indices start at 0 or 1, and increase by at most 1 up to below the limit
+
+    This is what the element by element loops over time series produce.
+    """
+    return (
+        len(indices) > 0
+        and indices[0] <= 1
+        and indices[-1] < limit
+        and bool(np.all(np.diff(indices) <= 1))
+    )
+
+
+def bfill_upsample(
+    values: TimeSeriesValues,
+    current_times: list[Timestamp],
+    twindow: TimeWindow,
+    shift: Seconds,
+) -> TimeSeriesValues | None:
+    """Upsample like TimeSeries.bfill_upsample, None if not possible in one go"""
+    start, end, step = twindow
+    indices = np.searchsorted(
+        np.array(current_times) + shift, np.arange(start, end, step), side="right"
+    )
+    if not _is_stepwise(indices, min(len(values), len(current_times))):
+        return None
+
+    # Take the very objects, not the floats of an array
+    return np.array(values, dtype=object)[indices].tolist()
+
+
+def downsample(
+    values: TimeSeriesValues,
+    current_times: list[Timestamp],
+    desired_times: list[Timestamp],
+    cf: ConsolidationFunctionName | None,
+) -> TimeSeriesValues | None:
+    """Downsample like TimeSeries.downsample, None if not possible in one go
+
+    The values of a group are adjacent, i.e. the groups are sorted. They are
+    arranged as the columns of a matrix, so that all groups are aggregated at
+    once. Groups without values are aggregated to None.
+    """
+    groups = np.searchsorted(desired_times, current_times, side="left")
+    if not _is_stepwise(groups, len(desired_times)):
+        return None
+
+    aggr = "max" if cf is None else cf.lower()
+    num_groups = len(desired_times)
+    series = values[: len(groups)]
+
+    group_starts = np.searchsorted(groups, np.arange(num_groups))
+    rows = np.arange(len(groups)) - group_starts[groups]
+    matrix = np.full((int(rows.max(initial=-1)) + 1, num_groups), np.nan)
+    matrix[rows, groups] = _as_array(series)
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=0)
+
+    if aggr == "average":
+        # Summed up in order and starting at (positive) zero, so that the result
+        # is the one of the built-in sum
+        sums = np.cumsum(np.where(present, matrix, 0.0), axis=0)[-1] + 0.0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = (sums / counts).tolist()
+        return [average if count else None for average, count in zip(averages, counts)]
+
+    if aggr == "max":
+        positions = np.argmax(np.where(present, matrix, -np.inf), axis=0)
+    elif aggr == "min":
+        positions = np.argmin(np.where(present, matrix, np.inf), axis=0)
+    elif counts.any():
+        raise ValueError("Invalid Aggregation function %s, only max, min, average allowed" % aggr)
+    else:
+        return [None] * num_groups
+
+    result: list[TimeSeriesValue] = [
+        series[start + position] if count else None
+        for start, position, count in zip(group_starts, positions, counts)
+    ]
+    return result
+
+
+def data_stats(slices: list[TimeSeriesValues]) -> DataStats:
+    """Statistically summarize all the upsampled RRD data
+
+    The slices are the rows of a matrix, all points in time are summarized at
+    once along its columns.
+
+    The average, minimum and maximum are the ones of the former per point loop.
+    The standard deviation squares the values as x*x, the loop as x**2. For
+    some values the two differ in the last bit, which leaves the standard
+    deviation within a relative difference of 1e-14."""
+    num_points = min((len(s) for s in slices), default=0)
+    if not num_points:
+        return []
+
+    points = np.array([s[:num_points] for s in slices], dtype=np.float64)
+    present = ~np.isnan(points)
+    samples = present.sum(axis=0)
+    values = np.where(present, points, 0.0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Summed up in order and starting at (positive) zero, like the built-in sum
+        average = (np.cumsum(values, axis=0)[-1] + 0.0) / samples
+        squares = np.cumsum(values * values, axis=0)[-1] + 0.0
+        # In the case of a single data-point an unbiased standard deviation is
+        # undefined. In this case we take the magnitude of the measured value
+        # itself as a measure of the dispersion.
+        std_dev = np.where(
+            samples == 1,
+            np.abs(average),
+            np.sqrt(np.abs(squares - average * average * samples) / (samples - 1)),
+        )
+
+    # Report the extrema as the original values, not as their float conversion
+    minima = np.argmin(np.where(present, points, np.inf), axis=0).tolist()
+    maxima = np.argmax(np.where(present, points, -np.inf), axis=0).tolist()
+
+    return [
+        [average, slices[minimum][column], slices[maximum][column], std_dev]
+        if num_samples
+        else [None, None, None, None]
+        for column, (average, minimum, maximum, std_dev, num_samples) in enumerate(
+            zip(average.tolist(), minima, maxima, std_dev.tolist(), samples.tolist())
+        )
+    ]
@@ -4,6 +4,8 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """This module provides generic Check_MK ruleset processing functionality"""
 
+import re
+from collections import OrderedDict
 from collections.abc import Callable, Generator, Iterable, Mapping, Sequence
 from re import Pattern
 from typing import Any, cast, Generic, Literal, NamedTuple, Required, TypedDict, TypeVar
@@ -68,6 +70,9 @@ PreprocessedServiceRuleset = list[
     tuple[object, set[HostName], LabelConditions, tuple, PreprocessedPattern]
 ]
 
+# Number of hosts for which the matching service rules are kept per ruleset
+_MAX_INDEXED_HOSTS = 32
+
 # FIXME: A lot of signatures regarding rules and rule sets are simply lying:
 # They claim to expect a RuleConditionsSpec or Ruleset, but
 # they are silently handling a very chaotic tuple-based structure, too. We
@@ -191,8 +196,6 @@ class RulesetMatcher:
         self.label_sources_of_service = self.ruleset_optimizer.label_sources_of_service
         self.clear_caches = self.ruleset_optimizer.clear_caches
 
-        self._service_match_cache: dict = {}
-
     def is_matching_host_ruleset(
         self, match_object: RulesetMatchObject, ruleset: Iterable[RuleSpec[bool]]
     ) -> bool:
@@ -287,72 +290,15 @@ class RulesetMatcher:
         Replaces service_extra_conf"""
         self.tuple_transformer.transform_in_place(ruleset, is_service=True, is_binary=is_binary)
 
+        if match_object.service_description is None or match_object.host_name is None:
+            return
+
         with_foreign_hosts = (
             match_object.host_name not in self.ruleset_optimizer.all_processed_hosts()
         )
-        optimized_ruleset = self.ruleset_optimizer.get_service_ruleset(ruleset, with_foreign_hosts)
-
-        for (
-            value,
-            hosts,
-            service_labels_condition,
-            service_labels_condition_cache_id,
-            service_description_condition,
-        ) in optimized_ruleset:
-            if match_object.service_description is None:
-                continue
-
-            if match_object.host_name not in hosts:
-                continue
-
-            service_cache_id = (
-                match_object.service_cache_id,
-                service_description_condition,
-                service_labels_condition_cache_id,
-            )
-
-            if service_cache_id in self._service_match_cache:
-                match = self._service_match_cache[service_cache_id]
-            else:
-                match = self._matches_service_conditions(
-                    service_description_condition, service_labels_condition, match_object
-                )
-                self._service_match_cache[service_cache_id] = match
-
-            if match:
-                yield value
-
-    def _matches_service_conditions(
-        self,
-        service_description_condition: tuple[bool, Pattern[str]],
-        service_labels_condition: Mapping[str, object],
-        match_object: RulesetMatchObject,
-    ) -> bool:
-        if not self._matches_service_description_condition(
-            service_description_condition, match_object
-        ):
-            return False
-
-        if service_labels_condition and not matches_labels(
-            match_object.service_labels, service_labels_condition
-        ):
-            return False
-
-        return True
-
-    def _matches_service_description_condition(
-        self,
-        service_description_condition: tuple[bool, Pattern[str]],
-        match_object: RulesetMatchObject,
-    ) -> bool:
-        negate, pattern = service_description_condition
-
-        if (
-            match_object.service_description is not None
-            and pattern.match(match_object.service_description) is not None
-        ):
-            return not negate
-        return negate
+        yield from self.ruleset_optimizer.get_service_ruleset_index(
+            ruleset, with_foreign_hosts
+        ).rules_of_host(match_object.host_name).values(match_object)
 
     def get_values_for_generic_agent(
         self, ruleset: Iterable[RuleSpec[object]], path_for_rule_matching: str
@@ -426,6 +372,7 @@ class RulesetOptimizer:
         self._all_processed_hosts_similarity = 1.0
 
         self._service_ruleset_cache: dict = {}
+        self._service_ruleset_index_cache: dict = {}
         self._host_ruleset_cache: dict = {}
         self._all_matching_hosts_match_cache: dict = {}
 
@@ -437,16 +384,24 @@ class RulesetOptimizer:
         # Reference hostname -> tag group reference
         self._host_grouped_ref: dict[HostName, tuple[tuple[TagGroupID, TagID], ...]] = {}
 
+        # Label (key, value) -> hosts having this label. Filled on demand for the
+        # hosts in _label_indexed_hosts, since computing the labels is expensive.
+        self._hosts_by_label: dict[tuple[str, str], set[HostName]] = {}
+        self._label_indexed_hosts: set[HostName] = set()
+
         # TODO: Clean this one up?
         self._initialize_host_lookup()
 
     def clear_ruleset_caches(self) -> None:
         self._host_ruleset_cache.clear()
         self._service_ruleset_cache.clear()
+        self._service_ruleset_index_cache.clear()
 
     def clear_caches(self) -> None:
         self._host_ruleset_cache.clear()
         self._all_matching_hosts_match_cache.clear()
+        self._hosts_by_label.clear()
+        self._label_indexed_hosts.clear()
 
     def all_processed_hosts(self) -> set[HostName]:
         """Returns a set of all processed hosts"""
@@ -535,6 +490,18 @@ class RulesetOptimizer:
         self._service_ruleset_cache[cache_id] = cached_ruleset
         return cached_ruleset
 
+    def get_service_ruleset_index(
+        self, ruleset: Iterable[RuleSpec[TRuleValue]], with_foreign_hosts: bool
+    ) -> "ServiceRulesetIndex":
+        cache_id = id(ruleset), with_foreign_hosts
+
+        if cache_id in self._service_ruleset_index_cache:
+            return self._service_ruleset_index_cache[cache_id]
+
+        index = ServiceRulesetIndex(self.get_service_ruleset(ruleset, with_foreign_hosts))
+        self._service_ruleset_index_cache[cache_id] = index
+        return index
+
     def _convert_service_ruleset(
         self, ruleset: Iterable[RuleSpec[TRuleValue]], with_foreign_hosts: bool
     ) -> PreprocessedServiceRuleset:
@@ -592,7 +559,7 @@ class RulesetOptimizer:
         self, condition: RuleConditionsSpec, with_foreign_hosts: bool
     ) -> set[HostName]:
         """Returns a set containing the names of hosts that match the given
-        tags and hostlist conditions."""
+        tags, labels and hostlist conditions."""
         hostlist = condition.get("host_name")
         tag_conditions: Mapping[TagGroupID, TagCondition] = condition.get("host_tags", {})
         labels = condition.get("host_labels", {})
@@ -624,27 +591,37 @@ class RulesetOptimizer:
             valid_hosts
         )
 
-        if tag_conditions and hostlist is None and not labels:
-            # TODO: Labels could also be optimized like the tags
-            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tag_conditions)
-            if matched_by_tags is not None:
-                return matched_by_tags
-
-        matching: set[HostName] = set()
         only_specific_hosts = (
             hostlist is not None
             and not isinstance(hostlist, dict)
             and all(not isinstance(x, dict) for x in hostlist)
         )
 
+        if labels:
+            # The label conditions are resolved using the label index. The other
+            # conditions only need to be checked for the hosts having the labels.
+            valid_hosts = self._match_hosts_by_labels(
+                valid_hosts.intersection(hostlist)
+                if only_specific_hosts and hostlist is not None
+                else valid_hosts,
+                labels,
+            )
+
+        if tag_conditions and hostlist is None:
+            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tag_conditions)
+            if matched_by_tags is not None:
+                return matched_by_tags
+
+        matching: set[HostName] = set()
+
         if hostlist == []:
             pass  # Empty host list -> Nothing matches
 
-        elif not tag_conditions and not labels and not hostlist:
+        elif not tag_conditions and not hostlist:
             # If no tags are specified and the hostlist only include @all (all hosts)
             matching = valid_hosts
 
-        elif not tag_conditions and not labels and only_specific_hosts and hostlist is not None:
+        elif not tag_conditions and only_specific_hosts and hostlist is not None:
             # If no tags are specified and there are only specific hosts we already have the matches
             matching = valid_hosts.intersection(hostlist)
 
@@ -664,11 +641,6 @@ class RulesetOptimizer:
                 ):
                     continue
 
-                if labels:
-                    host_labels = self.labels_of_host(hostname)
-                    if not matches_labels(host_labels, labels):
-                        continue
-
                 if not self.matches_host_name(hostlist, hostname):
                     continue
 
@@ -812,6 +784,25 @@ class RulesetOptimizer:
         self._all_matching_hosts_match_cache[cache_id] = matching
         return matching
 
+    def _match_hosts_by_labels(
+        self, hosts: set[HostName], label_conditions: LabelConditions
+    ) -> set[HostName]:
+        """Returns the hosts matching all label conditions"""
+        for hostname in hosts - self._label_indexed_hosts:
+            for label in self.labels_of_host(hostname).items():
+                self._hosts_by_label.setdefault(label, set()).add(hostname)
+            self._label_indexed_hosts.add(hostname)
+
+        matching = set(hosts)
+        for label_id, label_spec in label_conditions.items():
+            if isinstance(label_spec, str):
+                matching.intersection_update(self._hosts_by_label.get((label_id, label_spec), ()))
+            else:
+                matching.difference_update(
+                    self._hosts_by_label.get((label_id, label_spec["$ne"]), ())
+                )
+        return matching
+
     def _filter_hosts_with_same_tags_as_host(
         self,
         hostname: HostName,
@@ -932,6 +923,125 @@ class RulesetOptimizer:
         )
 
 
+class ServiceRulesetIndex:
+    """Index of a preprocessed service ruleset by host
+
+    The rules which may match the services of a host are determined once per
+    host instead of once per service. Only the most recently requested hosts
+    are kept, as well as the most recently used combined patterns."""
+
+    def __init__(self, ruleset: PreprocessedServiceRuleset) -> None:
+        self._ruleset = ruleset
+        self._hosts: OrderedDict[HostName, HostServiceRules] = OrderedDict()
+        self._combined_patterns: OrderedDict[tuple[str, ...], Pattern[str] | None] = OrderedDict()
+
+    def rules_of_host(self, host_name: HostName) -> "HostServiceRules":
+        try:
+            self._hosts.move_to_end(host_name)
+            return self._hosts[host_name]
+        except KeyError:
+            pass
+
+        rules = [
+            (value, service_labels_condition, service_description_condition)
+            for (
+                value,
+                hosts,
+                service_labels_condition,
+                _service_labels_condition_cache_id,
+                service_description_condition,
+            ) in self._ruleset
+            if host_name in hosts
+        ]
+        host_rules = HostServiceRules(
+            rules,
+            self._combined_pattern(
+                sorted(
+                    {
+                        pattern.pattern
+                        for _value, _labels, (negate, pattern) in rules
+                        if _is_combinable(negate, pattern)
+                    }
+                )
+            ),
+        )
+        self._hosts[host_name] = host_rules
+        while len(self._hosts) > _MAX_INDEXED_HOSTS:
+            self._hosts.popitem(last=False)
+        return host_rules
+
+    def _combined_pattern(self, parts: Sequence[str]) -> Pattern[str] | None:
+        key = tuple(parts)
+        try:
+            self._combined_patterns.move_to_end(key)
+            return self._combined_patterns[key]
+        except KeyError:
+            pass
+
+        combined_pattern = _combine_patterns(parts)
+        self._combined_patterns[key] = combined_pattern
+        while len(self._combined_patterns) > _MAX_INDEXED_HOSTS:
+            self._combined_patterns.popitem(last=False)
+        return combined_pattern
+
+
+class HostServiceRules:
+    """The service rules of a ruleset which apply to a host
+
+    The service description patterns of the rules are combined into a single
+    pattern. Most services only match a few of the rules, so this pattern
+    rules out most of them with a single match. Patterns with groups are not
+    combined, as combining renumbers the groups, which breaks backreferences.
+    The matching values are remembered per service."""
+
+    def __init__(
+        self,
+        rules: Sequence[tuple[object, LabelConditions, PreprocessedPattern]],
+        any_pattern: Pattern[str] | None,
+    ) -> None:
+        self._rules = rules
+        self._any_pattern = any_pattern
+        self._values: dict[tuple[str | None, int], tuple[object, ...]] = {}
+
+    def values(self, match_object: RulesetMatchObject) -> tuple[object, ...]:
+        try:
+            return self._values[match_object.service_cache_id]
+        except KeyError:
+            pass
+
+        assert match_object.service_description is not None
+        description = match_object.service_description
+        any_matches = self._any_pattern is None or self._any_pattern.match(description) is not None
+
+        values = tuple(
+            value
+            for value, service_labels_condition, (negate, pattern) in self._rules
+            if (any_matches or not _is_combinable(negate, pattern))
+            and (pattern.match(description) is None) is negate
+            and (
+                not service_labels_condition
+                or matches_labels(match_object.service_labels, service_labels_condition)
+            )
+        )
+        self._values[match_object.service_cache_id] = values
+        return values
+
+
+def _is_combinable(negate: bool, pattern: Pattern[str]) -> bool:
+    return not negate and not pattern.groups
+
+
+def _combine_patterns(parts: Sequence[str]) -> Pattern[str] | None:
+    """Return a pattern matching if any of the patterns match, None if not worth it"""
+    if len(parts) < 2 or "" in parts:
+        return None
+    try:
+        return re.compile("|".join("(?:%s)" % p for p in parts))
+    except re.error:
+        # E.g. global flags not at the start of the patterns
+        return None
+
+
 def _tags_or_labels_cache_id(tag_or_label_spec: object) -> object:
     if isinstance(tag_or_label_spec, dict):
         if "$ne" in tag_or_label_spec:
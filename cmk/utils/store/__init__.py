@@ -19,8 +19,10 @@ from cmk.utils.i18n import _
 from cmk.utils.store._file import (
     BytesSerializer,
     DimSerializer,
+    MarshalSerializer,
     ObjectStore,
     PickleSerializer,
+    raise_for_permissions,
     TextSerializer,
 )
 from cmk.utils.store._locks import acquire_lock, cleanup_locks, configuration_lockfile, have_lock
@@ -38,6 +40,7 @@ from cmk.utils.store._locks import (
 __all__ = [
     "BytesSerializer",
     "DimSerializer",
+    "MarshalSerializer",
     "ObjectStore",
     "PickleSerializer",
     "TextSerializer",
@@ -48,6 +51,7 @@ __all__ = [
     "lock_checkmk_configuration",
     "lock_exclusive",
     "locked",
+    "raise_for_permissions",
     "release_all_locks",
     "release_lock",
     "try_acquire_lock",
@@ -2,6 +2,7 @@
 # Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
+import marshal
 import pickle
 import pprint
 import tempfile
@@ -22,9 +23,11 @@ from ._locks import acquire_lock, have_lock, release_lock
 __all__ = [
     "BytesSerializer",
     "DimSerializer",
+    "MarshalSerializer",
     "ObjectStore",
     "PickleSerializer",
     "TextSerializer",
+    "raise_for_permissions",
 ]
 
 TObject = TypeVar("TObject")
@@ -73,6 +76,34 @@ class DimSerializer:
         return literal_eval(raw.decode("utf-8"))
 
 
+class MarshalSerializer:
+    """A fast binary serializer for the data the `DimSerializer` handles
+
+    Data written by the `DimSerializer` is still read, so the existing files
+    are migrated with the next write. Data marshal can not handle (e.g.
+    instances of subclasses of the builtin types) is written in that format.
+    """
+
+    _MAGIC: Final = b"\x00CMK-MARSHAL\x00\x01"
+
+    def serialize(self, data: Any) -> bytes:
+        try:
+            return self._MAGIC + marshal.dumps(data, marshal.version)
+        except ValueError:
+            return DimSerializer().serialize(data)
+
+    def deserialize(self, raw: bytes) -> Any:
+        if raw.startswith(self._MAGIC):
+            # There is no need to fall back to the text format here: marshal
+            # reads the data of all older marshal versions, and the sites only
+            # get newer interpreters with an update.  The files are replaced
+            # atomically, so a ValueError, EOFError or TypeError only occurs for
+            # corrupted data, which the text format could not read either.  It
+            # is raised like a SyntaxError of literal_eval before.
+            return marshal.loads(memoryview(raw)[len(self._MAGIC) :])  # nosec B302 # BNS:5a3d7e
+        return DimSerializer.deserialize(raw)
+
+
 class PickleSerializer(Generic[TObject]):
     """A dangerous serializer that uses pickle"""
 
@@ -84,7 +115,7 @@ class PickleSerializer(Generic[TObject]):
         return obj
 
 
-def _raise_for_permissions(path: Path) -> None:
+def raise_for_permissions(path: Path) -> None:
     """Ensure that the file is owned by the current user or root and not world writable.
     Raise an exception otherwise."""
     stat = path.stat()
@@ -162,7 +193,7 @@ class ObjectStore(Generic[TObject]):
 
     def _load_bytes_from_file(self) -> bytes:
         try:
-            _raise_for_permissions(self.path)
+            raise_for_permissions(self.path)
             return self.path.read_bytes()
         except FileNotFoundError:
             # Since locking (currently) creates an empty file,
@@ -11,7 +11,11 @@ from __future__ import annotations
 
 import gzip
 import io
+import marshal
+import mmap
+import os
 import pprint
+import struct
 from collections import Counter
 from collections.abc import Callable, Iterable, Mapping, Sequence
 from dataclasses import dataclass, field
@@ -19,6 +23,7 @@ from pathlib import Path
 from typing import Any, Iterator, Literal, NamedTuple, TypedDict
 
 from cmk.utils import store
+from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.type_defs import HostName
 
 # TODO Cleanup path in utils, base, gui, find ONE place (type defs or similar)
@@ -170,19 +175,383 @@ class UpdateResult:
 #   - status_data/HOSTNAME, status_data/HOSTNAME.gz
 
 
-def load_tree(filepath: Path) -> StructuredDataNode:
+def load_tree(filepath: Path, *, paths: Sequence[SDPath] | None = None) -> StructuredDataNode:
+    """Load a tree from a file in the packed or in the repr format
+
+    If `paths` are given, the packed format is only decoded for the nodes at
+    and below these paths.  The other nodes may be missing in the result.
+
+    Archived trees may be stored as patches against their successor, see
+    `TreeOrArchiveStore`.  These are resolved, `paths` is ignored for them.
+
+    An up to date packed copy of a tree file in the repr format (see
+    `TreeStore`) is loaded instead of the file itself.
+    """
+    if (buffer := _map_packed_tree(_packed_copy_or_file(filepath))) is not None:
+        if buffer[: len(_TREE_PATCH_MAGIC)] == _TREE_PATCH_MAGIC:
+            return _load_patched_tree(filepath, buffer)
+        return _unpack_tree(buffer, paths)
     if raw_tree := store.load_object_from_file(filepath, default=None):
         return StructuredDataNode.deserialize(raw_tree)
     return StructuredDataNode()
 
 
+# Layout of the packed tree format (all integers little endian):
+#
+#     magic | number of nodes N | length of the strings block
+#     nodes (N times: name, parent, attributes offset and length, table offset and length)
+#     strings | attributes and table blocks
+#
+# The nodes are stored in pre-order, the root node first.  The strings block
+# holds the names of the nodes and the keys of the attributes and tables, the
+# blocks refer to them by index.  The blocks are encoded with marshal, the
+# tables column by column.  Missing values in a column are stored as `...`.
+_PACKED_TREE_MAGIC = b"CMKSDT\x00\x01"
+_PACKED_TREE_HEADER = struct.Struct("<8sII")
+_PACKED_TREE_NODE = struct.Struct("<IiQQQQ")
+
+
+def _pack_tree(tree: StructuredDataNode) -> bytes:
+    """Pack the tree, raises ValueError if a value can not be marshalled"""
+    strings: dict[SDKey, int] = {}
+    nodes: list[bytes] = []
+    blocks: list[bytes] = []
+    blocks_length = 0
+
+    def add_block(block: bytes) -> tuple[int, int]:
+        nonlocal blocks_length
+        blocks.append(block)
+        blocks_length += len(block)
+        return blocks_length - len(block), len(block)
+
+    def add_node(node: StructuredDataNode, parent: int) -> None:
+        index = len(nodes)
+        nodes.append(
+            _PACKED_TREE_NODE.pack(
+                strings.setdefault(node.name, len(strings)),
+                parent,
+                *add_block(_pack_attributes(node.attributes, strings)),
+                *add_block(_pack_table(node.table, strings)),
+            )
+        )
+        for sub_node in node.nodes:
+            add_node(sub_node, index)
+
+    add_node(tree, -1)
+    raw_strings = marshal.dumps(tuple(strings))
+    return b"".join(
+        (
+            _PACKED_TREE_HEADER.pack(_PACKED_TREE_MAGIC, len(nodes), len(raw_strings)),
+            *nodes,
+            raw_strings,
+            *blocks,
+        )
+    )
+
+
+def _pack_attributes(attributes: Attributes, strings: dict[SDKey, int]) -> bytes:
+    if attributes.is_empty() and not attributes.retentions:
+        return b""
+    return marshal.dumps(
+        (
+            tuple(strings.setdefault(key, len(strings)) for key in attributes.pairs),
+            tuple(attributes.pairs.values()),
+            _serialize_retentions(attributes.retentions),
+        )
+    )
+
+
+def _pack_table(table: Table, strings: dict[SDKey, int]) -> bytes:
+    if table.is_empty() and not table.retentions:
+        return b""
+    key_columns, keys, columns = _table_to_columns(table)
+    return marshal.dumps(
+        (
+            tuple(strings.setdefault(key, len(strings)) for key in key_columns),
+            tuple(strings.setdefault(key, len(strings)) for key in keys),
+            columns,
+            {
+                ident: _serialize_retentions(intervals)
+                for ident, intervals in table.retentions.items()
+            },
+        )
+    )
+
+
+def _packed_copy(filepath: Path) -> Path:
+    return filepath.with_name(f".{filepath.name}.packed")
+
+
+def _packed_copy_or_file(filepath: Path) -> Path:
+    """Return the packed copy of the tree file if it has the same mtime"""
+    packed_copy = _packed_copy(filepath)
+    try:
+        if packed_copy.stat().st_mtime_ns == filepath.stat().st_mtime_ns:
+            return packed_copy
+    except FileNotFoundError:
+        pass
+    return filepath
+
+
+def _map_packed_tree(filepath: Path) -> mmap.mmap | None:
+    try:
+        with filepath.open("rb") as f:
+            if f.read(len(_PACKED_TREE_MAGIC)) not in (_PACKED_TREE_MAGIC, _TREE_PATCH_MAGIC):
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except OSError:
+        return None
+
+
+def _unpack_tree(buffer: bytes | mmap.mmap, paths: Sequence[SDPath] | None) -> StructuredDataNode:
+    _magic, nodes_count, strings_length = _PACKED_TREE_HEADER.unpack_from(buffer)
+    strings_at = _PACKED_TREE_HEADER.size + nodes_count * _PACKED_TREE_NODE.size
+    blocks_at = strings_at + strings_length
+    strings = marshal.loads(buffer[strings_at:blocks_at])
+
+    tree = StructuredDataNode()
+    node_paths: list[SDPath] = []
+    for name, parent, *block_infos in _PACKED_TREE_NODE.iter_unpack(
+        buffer[_PACKED_TREE_HEADER.size : strings_at]
+    ):
+        path = () if parent < 0 else node_paths[parent] + (strings[name],)
+        node_paths.append(path)
+        if paths is not None and not any(path[: len(p)] == p for p in paths):
+            if any(p[: len(path)] == path for p in paths):
+                tree.setdefault_node(path)
+            continue
+
+        attributes_at, attributes_length, table_at, table_length = block_infos
+        node = tree.setdefault_node(path)
+        if attributes_length:
+            node.add_attributes(
+                _unpack_attributes(
+                    buffer[
+                        blocks_at + attributes_at : blocks_at + attributes_at + attributes_length
+                    ],
+                    strings,
+                    path,
+                )
+            )
+        if table_length:
+            node.add_table(
+                _unpack_table(
+                    buffer[blocks_at + table_at : blocks_at + table_at + table_length],
+                    strings,
+                    path,
+                )
+            )
+    return tree
+
+
+def _unpack_attributes(block: bytes, strings: Sequence[SDKey], path: SDPath) -> Attributes:
+    keys, values, raw_retentions = marshal.loads(block)
+    attributes = Attributes(path=path, retentions=_deserialize_retentions(raw_retentions))
+    attributes.add_pairs({strings[key]: value for key, value in zip(keys, values)})
+    return attributes
+
+
+def _unpack_table(block: bytes, strings: Sequence[SDKey], path: SDPath) -> Table:
+    key_columns, keys, columns, raw_retentions = marshal.loads(block)
+    return _table_from_columns(
+        path,
+        [strings[key] for key in key_columns],
+        [strings[key] for key in keys],
+        columns,
+        retentions={
+            ident: _deserialize_retentions(raw_intervals)
+            for ident, raw_intervals in raw_retentions.items()
+        },
+    )
+
+
+_TableColumns = tuple[SDKeyColumns, SDKeys, tuple[tuple[SDValue, ...], ...]]
+
+
+def _table_to_columns(table: Table) -> _TableColumns:
+    rows = table.rows
+    keys = list(dict.fromkeys(key for row in rows for key in row))
+    return (
+        table.key_columns if rows else [],
+        keys,
+        tuple(tuple(row.get(key, ...) for row in rows) for key in keys),
+    )
+
+
+def _table_from_columns(
+    path: SDPath,
+    key_columns: SDKeyColumns,
+    keys: SDKeys,
+    columns: Sequence[Sequence[SDValue]],
+    *,
+    retentions: TableRetentions | None = None,
+) -> Table:
+    table = Table(path=path, key_columns=key_columns, retentions=retentions)
+    if not columns or any(... in column for column in columns):
+        table.add_rows(
+            {key: value for key, value in zip(keys, row) if value is not ...}
+            for row in zip(*columns)
+        )
+        return table
+
+    # Without missing values the rows and their idents can be built column
+    # wise, which is considerably faster for large tables.
+    rows = [dict(zip(keys, row)) for row in zip(*columns)]
+    idents = zip(*(columns[keys.index(key)] for key in key_columns if key in keys))
+    if len(rows_by_ident := dict(zip(idents, rows))) == len(rows):
+        table.update_rows(rows_by_ident)
+    else:
+        table.add_rows(rows)
+    return table
+
+
+# A patch describes how to get from one tree to another, node by node.  It
+# consists of the paths of the removed nodes and, for the new and the
+# changed nodes, the serialized attributes and the table or the table patch
+# (`None` means unchanged).  A table patch consists of the retentions, the
+# idents of the removed rows and the new and changed rows.
+_TREE_PATCH_MAGIC = b"CMKSDP\x00\x01"
+
+_RawTablePatch = tuple[dict, list[SDRowIdent], list[SDRow]]
+_TreePatch = tuple[
+    list[SDPath], dict[SDPath, tuple[SDRawTree | None, SDRawTree | _RawTablePatch | None]]
+]
+
+
+def _iter_nodes(node: StructuredDataNode) -> Iterator[StructuredDataNode]:
+    yield node
+    for sub_node in node.nodes:
+        yield from _iter_nodes(sub_node)
+
+
+def _make_tree_patch(tree: StructuredDataNode, target: StructuredDataNode) -> _TreePatch:
+    nodes = {node.path: node for node in _iter_nodes(tree)}
+    target_nodes = {node.path: node for node in _iter_nodes(target)}
+
+    changed: dict[SDPath, tuple[SDRawTree | None, SDRawTree | _RawTablePatch | None]] = {}
+    for path, target_node in target_nodes.items():
+        if (node := nodes.get(path)) is None:
+            changed[path] = (target_node.attributes.serialize(), target_node.table.serialize())
+            continue
+
+        raw_attributes = target_node.attributes.serialize()
+        table_patch = _make_table_patch(node.table, target_node.table)
+        if raw_attributes != node.attributes.serialize() or table_patch is not None:
+            changed[path] = (
+                None if raw_attributes == node.attributes.serialize() else raw_attributes,
+                table_patch,
+            )
+
+    return [path for path in nodes if path not in target_nodes], changed
+
+
+def _make_table_patch(table: Table, target: Table) -> SDRawTree | _RawTablePatch | None:
+    if table.key_columns != target.key_columns:
+        return target.serialize()
+
+    removed = [ident for ident in table._rows if ident not in target._rows]
+    rows = [row for ident, row in target._rows.items() if table._rows.get(ident) != row]
+    if not removed and not rows and table.retentions == target.retentions:
+        return None
+
+    return (
+        {ident: _serialize_retentions(intervals) for ident, intervals in target.retentions.items()},
+        removed,
+        rows,
+    )
+
+
+def _apply_tree_patch(tree: StructuredDataNode, patch: _TreePatch) -> StructuredDataNode:
+    removed, changed = patch
+    removed_paths = set(removed)
+
+    patched = StructuredDataNode()
+    for node in _iter_nodes(tree):
+        if node.path in removed_paths:
+            continue
+        raw_attributes, table_patch = changed.get(node.path, (None, None))
+        patched_node = patched.setdefault_node(node.path)
+        patched_node.add_attributes(
+            node.attributes
+            if raw_attributes is None
+            else Attributes.deserialize(path=node.path, raw_pairs=raw_attributes)
+        )
+        patched_node.add_table(_apply_table_patch(node.table, table_patch))
+
+    for path, (raw_attributes, raw_table) in changed.items():
+        if tree.get_node(path) is not None:
+            continue
+        assert raw_attributes is not None and isinstance(raw_table, dict)
+        patched_node = patched.setdefault_node(path)
+        patched_node.add_attributes(Attributes.deserialize(path=path, raw_pairs=raw_attributes))
+        patched_node.add_table(Table.deserialize(path=path, raw_rows=raw_table))
+
+    return patched
+
+
+def _apply_table_patch(table: Table, patch: SDRawTree | _RawTablePatch | None) -> Table:
+    if patch is None:
+        return table
+    if isinstance(patch, dict):
+        return Table.deserialize(path=table.path, raw_rows=patch)
+
+    raw_retentions, removed, rows = patch
+    patched = Table(
+        path=table.path,
+        key_columns=table.key_columns,
+        retentions={
+            ident: _deserialize_retentions(raw_intervals)
+            for ident, raw_intervals in raw_retentions.items()
+        },
+    )
+    # Changed rows are replaced as a whole.
+    skipped = set(removed).union(patched._make_row_ident(row) for row in rows)
+    for ident, row in table._rows.items():
+        if ident not in skipped:
+            patched.add_row(ident, row)
+    patched.add_rows(rows)
+    return patched
+
+
+def _load_patched_tree(filepath: Path, buffer: bytes | mmap.mmap) -> StructuredDataNode:
+    successor_name, removed, changed = marshal.loads(buffer[len(_TREE_PATCH_MAGIC) :])
+    if not (successor := filepath.with_name(successor_name)).exists():
+        raise FileNotFoundError(successor)
+    return _apply_tree_patch(load_tree(successor), (removed, changed))
+
+
+def _is_tree_patch(filepath: Path) -> bool:
+    try:
+        with filepath.open("rb") as f:
+            return f.read(len(_TREE_PATCH_MAGIC)) == _TREE_PATCH_MAGIC
+    except OSError:
+        return False
+
+
 class TreeStore:
-    def __init__(self, tree_dir: Path | str) -> None:
+    """Store the trees of the hosts
+
+    The trees are written in the repr format, and a gzipped copy of it which
+    Livestatus exposes.  Both are serialized once.  If `packed` is set, a copy
+    in the packed format is written next to the tree file and gets its mtime.
+    `load_tree` only uses the copy if the mtimes match, so a tree file written
+    by other means is never shadowed by an outdated copy.
+
+    The packed copy only pays off for trees that are loaded partially, i.e. by
+    the paths of the inventory tables and of the permitted inventory paths.
+    This is why only the inventory trees are stored with it, not the status
+    data trees.
+    """
+
+    def __init__(self, tree_dir: Path | str, *, packed: bool = False) -> None:
         self._tree_dir = Path(tree_dir)
         self._last_filepath = Path(tree_dir) / ".last"
+        self._packed = packed
 
-    def load(self, *, host_name: HostName | str) -> StructuredDataNode:
-        return load_tree(self._tree_file(host_name))
+    def load(
+        self, *, host_name: HostName | str, paths: Sequence[SDPath] | None = None
+    ) -> StructuredDataNode:
+        return load_tree(self._tree_file(host_name), paths=paths)
 
     def save(self, *, host_name: HostName, tree: StructuredDataNode, pretty: bool = False) -> None:
         self._tree_dir.mkdir(parents=True, exist_ok=True)
@@ -190,18 +559,37 @@ class TreeStore:
         tree_file = self._tree_file(host_name)
 
         output = tree.serialize()
-        store.save_object_to_file(tree_file, output, pretty=pretty)
+        serialized = store.DimSerializer().serialize(output)
+        if pretty:
+            store.save_object_to_file(tree_file, output, pretty=True)
+        else:
+            store.save_bytes_to_file(tree_file, serialized)
+        self._save_packed_copy(tree_file, tree)
 
         buf = io.BytesIO()
         with gzip.GzipFile(fileobj=buf, mode="wb") as f:
-            f.write((repr(output) + "\n").encode("utf-8"))
+            f.write(serialized)
         store.save_bytes_to_file(self._gz_file(host_name), buf.getvalue())
 
         # Inform Livestatus about the latest inventory update
         self._last_filepath.touch()
 
+    def _save_packed_copy(self, tree_file: Path, tree: StructuredDataNode) -> None:
+        packed_copy = _packed_copy(tree_file)
+        if not self._packed:
+            packed_copy.unlink(missing_ok=True)
+            return
+        try:
+            store.save_bytes_to_file(packed_copy, _pack_tree(tree))
+        except ValueError:
+            packed_copy.unlink(missing_ok=True)
+            return
+        stat = tree_file.stat()
+        os.utime(packed_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
     def remove(self, *, host_name: HostName) -> None:
         self._tree_file(host_name).unlink(missing_ok=True)
+        _packed_copy(self._tree_file(host_name)).unlink(missing_ok=True)
         self._gz_file(host_name).unlink(missing_ok=True)
 
     def _tree_file(self, host_name: HostName) -> Path:
@@ -212,9 +600,26 @@ class TreeStore:
 
 
 class TreeOrArchiveStore(TreeStore):
-    def __init__(self, tree_dir: Path | str, archive: Path | str) -> None:
-        super().__init__(tree_dir)
+    """Store the current trees and archive the previous ones
+
+    The newest archived tree is stored as it is.  When a tree is archived,
+    the one before is replaced by a patch against it, keeping its mtime.  An
+    archived tree thus only depends on newer ones and the archive can be
+    cleaned up from the oldest file on.  At most `max_patch_chain` patches
+    are stored in a row, so that loading an archived tree never needs to
+    apply more patches than that.
+    """
+
+    def __init__(
+        self,
+        tree_dir: Path | str,
+        archive: Path | str,
+        *,
+        max_patch_chain: int = 8,
+    ) -> None:
+        super().__init__(tree_dir, packed=True)
         self._archive_dir = Path(archive)
+        self._max_patch_chain = max_patch_chain
 
     def load_previous(self, *, host_name: HostName | str) -> StructuredDataNode:
         if (tree_file := self._tree_file(host_name=host_name)).exists():
@@ -229,17 +634,59 @@ class TreeOrArchiveStore(TreeStore):
 
         return load_tree(latest_archive_tree_file)
 
-    def _archive_host_dir(self, host_name: HostName) -> Path:
+    def _archive_host_dir(self, host_name: HostName | str) -> Path:
         return self._archive_dir / str(host_name)
 
+    def _archived_tree_files(self, host_name: HostName) -> list[Path]:
+        try:
+            return sorted(
+                (f for f in self._archive_host_dir(host_name).iterdir() if f.name.isdigit()),
+                key=lambda f: int(f.name),
+            )
+        except FileNotFoundError:
+            return []
+
     def archive(self, *, host_name: HostName) -> None:
         if not (tree_file := self._tree_file(host_name)).exists():
             return
+        archived_tree_files = self._archived_tree_files(host_name)
         target_dir = self._archive_host_dir(host_name)
         target_dir.mkdir(parents=True, exist_ok=True)
-        tree_file.rename(target_dir / str(int(tree_file.stat().st_mtime)))
+        target = target_dir / str(int(tree_file.stat().st_mtime))
+        # Archive the packed copy if it is up to date, it loads faster
+        if (source := _packed_copy_or_file(tree_file)) != tree_file:
+            source.rename(target)
+            tree_file.unlink()
+        else:
+            tree_file.rename(target)
+            _packed_copy(tree_file).unlink(missing_ok=True)
         self._gz_file(host_name).unlink(missing_ok=True)
 
+        if archived_tree_files and archived_tree_files[-1] != target:
+            self._replace_by_patch(archived_tree_files, successor=target)
+
+    def _replace_by_patch(self, archived_tree_files: Sequence[Path], *, successor: Path) -> None:
+        filepath, *older = reversed(archived_tree_files)
+        chain = 0
+        for older_filepath in older:
+            if not _is_tree_patch(older_filepath):
+                break
+            chain += 1
+        if chain >= self._max_patch_chain:
+            return
+
+        try:
+            raw_patch = _TREE_PATCH_MAGIC + marshal.dumps(
+                (successor.name, *_make_tree_patch(load_tree(successor), load_tree(filepath)))
+            )
+        except (OSError, ValueError, MKGeneralException):
+            # Keep the tree as it is
+            return
+
+        stat = filepath.stat()
+        store.save_bytes_to_file(filepath, raw_patch)
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
 
 # .
 #   .--filters-------------------------------------------------------------.
@@ -728,6 +1175,12 @@ class Table:
     def _make_row_ident(self, row: SDRow) -> SDRowIdent:
         return tuple(row[k] for k in self.key_columns if k in row)
 
+    def update_rows(self, rows: SDRows) -> None:
+        """Add rows whose idents are known to be unique and made from the key columns"""
+        if not self.key_columns:
+            raise ValueError("Cannot add row due to missing key_columns")
+        self._rows.update(rows)
+
     def add_row(self, ident: SDRowIdent, row: SDRow) -> None:
         if not self.key_columns:
             raise ValueError("Cannot add row due to missing key_columns")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure loading the value store and the persisted sections of a big interface host
+
+The data of a synthetic host with many interfaces is written with the text
+format (DimSerializer) the stores used before and with the MarshalSerializer.
+Loading includes reading the file.
+
+Run it from the root of the repository or in a site:
+
+    PYTHONPATH=. python3 doc/benchmark/marshal_stores.py [--interfaces N] [--runs N]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from cmk.utils import store
+
+_COUNTERS = ("in", "out", "inucast", "outucast", "inmcast", "outmcast", "inerr", "outerr")
+
+
+def _value_store(interfaces: int) -> dict[tuple[str, str, str, str], Any]:
+    return {
+        ("bighost", "interfaces", f"{nr}", f"{counter}.{nr}"): (1672531200.0 + nr, nr * 1000003)
+        for nr in range(1, interfaces + 1)
+        for counter in _COUNTERS
+    }
+
+
+def _if64_section(interfaces: int) -> dict[str, tuple[int, int, list[list[str]]]]:
+    return {
+        "if64": (
+            1672531200,
+            1672531380,
+            [
+                [
+                    str(nr),
+                    f"GigabitEthernet0/{nr}",
+                    "6",
+                    "1000000000",
+                    "1",
+                    *(str(nr * factor) for factor in range(1, 12)),
+                    f"uplink {nr}",
+                    "00 1A 2B 3C 4D 5E",
+                    "0",
+                    "0",
+                ]
+                for nr in range(1, interfaces + 1)
+            ],
+        )
+    }
+
+
+def _measure(
+    path: Path, serializer: store.DimSerializer | store.MarshalSerializer, runs: int
+) -> float:
+    object_store = store.ObjectStore(path, serializer=serializer)
+    durations = []
+    for _run in range(runs):
+        start = time.perf_counter()
+        object_store.read_obj(default={})
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--interfaces", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.interfaces} interfaces, best of {args.runs}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for title, data in (
+            ("value store", _value_store(args.interfaces)),
+            ("if64 section", _if64_section(args.interfaces)),
+        ):
+            serializers: tuple[tuple[str, store.DimSerializer | store.MarshalSerializer], ...] = (
+                ("text", store.DimSerializer()),
+                ("marshal", store.MarshalSerializer()),
+            )
+            for format_name, serializer in serializers:
+                path = Path(tmp, f"{title}.{format_name}")
+                path.write_bytes(serializer.serialize(data))
+                duration = _measure(path, serializer, args.runs)
+                print(
+                    f"{title:14} {format_name:8} {path.stat().st_size / 1e6:6.1f}MB"
+                    f" {duration * 1e3:9.1f}ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure the startup of a helper loading the packed config
+
+A synthetic config with rulesets and host specific variables is written
+once as a single pickle, as the versions before the host specific configs
+did, and once by the PackedConfigStore. Each measurement starts a fresh
+interpreter that imports cmk.base.config and calls load_packed_config.
+
+Run it from the root of the repository or in a site:
+
+    PYTHONPATH=. python3 doc/benchmark/packed_config_startup.py [--hosts N] [--rulesets N]
+"""
+
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from cmk.utils.type_defs import HostName
+
+from cmk.base.config import PackedConfigStore, PackedHostConfig
+
+_LOAD = """
+import sys, time
+t0 = time.perf_counter()
+from cmk.base import config
+t1 = time.perf_counter()
+config.load_packed_config(sys.argv[1], hostnames=None if sys.argv[2] == "-" else [sys.argv[2]])
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+
+def _store(config_dir: Path) -> PackedConfigStore:
+    return PackedConfigStore(config_dir / "precompiled_check_config.mk")
+
+
+def _make_config(num_hosts: int, num_rulesets: int) -> tuple[dict[str, Any], dict[str, Any]]:
+    hostnames = [f"host{i:06d}" for i in range(num_hosts)]
+    conditions = [{"host_tags": {"site": f"site{i}"}} for i in range(10)]
+    variables: dict[str, Any] = {
+        f"synthetic_ruleset_{r:03d}": [
+            {
+                "id": f"{r}-{i}",
+                "value": {"levels": (80.0, 90.0), "description": f"rule {i}"},
+                "condition": conditions[i % len(conditions)],
+            }
+            for i in range(200)
+        ]
+        for r in range(num_rulesets)
+    }
+    host_variables: dict[str, Any] = {
+        "all_hosts": [f"{h}|lan|prod|site:site{i % 10}" for i, h in enumerate(hostnames)],
+        "host_paths": {h: f"/wato/folder{i % 50}/hosts.mk" for i, h in enumerate(hostnames)},
+        "host_labels": {h: {"os": "linux", "rack": f"r{i % 40}"} for i, h in enumerate(hostnames)},
+        "ipaddresses": {
+            h: f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i, h in enumerate(hostnames)
+        },
+    }
+    return variables, host_variables
+
+
+def _write_single_pickle(config_dir: Path, variables: dict, host_variables: dict) -> None:
+    config_dir.mkdir(parents=True)
+    with _store(config_dir).path.open("wb") as f:
+        pickle.dump({**variables, **host_variables}, f)
+
+
+def _write_packed(config_dir: Path, variables: dict, host_variables: dict) -> None:
+    config_dir.mkdir(parents=True)
+    per_host: dict[HostName, dict[str, Any]] = {}
+    for entry in host_variables["all_hosts"]:
+        per_host.setdefault(HostName(entry.split("|", 1)[0]), {}).setdefault(
+            "all_hosts", []
+        ).append(entry)
+    for varname in ("host_paths", "host_labels", "ipaddresses"):
+        for hostname, value in host_variables[varname].items():
+            per_host.setdefault(HostName(hostname), {}).setdefault(varname, {})[hostname] = value
+    _store(config_dir).write(
+        variables,
+        {hostname: PackedHostConfig([], entries) for hostname, entries in per_host.items()},
+    )
+
+
+def _measure(config_dir: Path, hostname: str, runs: int) -> tuple[float, float, float]:
+    results = []
+    for _run in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", _LOAD, str(config_dir), hostname],
+            check=True,
+            env={"OMD_SITE": "benchmark", **os.environ},
+            capture_output=True,
+            text=True,
+        ).stdout
+        wall = time.perf_counter() - start
+        import_time, load_time = (float(t) for t in output.split())
+        results.append((wall, import_time, load_time))
+    return min(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--hosts", type=int, default=5000)
+    parser.add_argument("--rulesets", type=int, default=300)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    variables, host_variables = _make_config(args.hosts, args.rulesets)
+    with tempfile.TemporaryDirectory() as tmp:
+        single_pickle = Path(tmp, "single_pickle")
+        packed = Path(tmp, "packed")
+        _write_single_pickle(single_pickle, variables, host_variables)
+        _write_packed(packed, variables, host_variables)
+
+        print(f"{args.hosts} hosts, {args.rulesets} rulesets, best of {args.runs}")
+        print(f"{'':32} {'size':>8} {'startup':>9} {'import':>8} {'load':>8}")
+        for title, config_dir, hostname in (
+            ("single pickle", single_pickle, "-"),
+            ("packed, all hosts", packed, "-"),
+            ("packed, one host", packed, "host000000"),
+        ):
+            size = _store(config_dir).path.stat().st_size
+            wall, import_time, load_time = _measure(config_dir, hostname, args.runs)
+            print(
+                f"{title:32} {size / 1e6:6.1f}MB {wall * 1e3:7.0f}ms"
+                f" {import_time * 1e3:6.0f}ms {load_time * 1e3:6.0f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure walking SNMP trees with the pooled and the classic backend
+
+A minimal SNMPv2c agent serves a number of tables on a local UDP port. The
+trees are walked once with the pooled backend and, if the net-snmp command
+line tools are installed, once with the classic backend. The agent runs in a
+thread of this process, so the timings include its share of the work.
+
+Run it from the root of the repository or in a site:
+
+    PYTHONPATH=. python3 doc/benchmark/pooled_snmp_walk.py [--trees N] [--rows N]
+"""
+
+import argparse
+import bisect
+import shutil
+import socket
+import threading
+import time
+from collections.abc import Mapping
+
+from cmk.utils.log import logger
+from cmk.utils.type_defs import HostName
+
+from cmk.snmplib.type_defs import SNMPBackend, SNMPBackendEnum, SNMPHostConfig
+
+import cmk.fetchers.snmp_backend._ber as ber
+from cmk.fetchers.snmp_backend import ClassicSNMPBackend, PooledSNMPBackend
+from cmk.fetchers.snmp_backend.pooled import close_sessions
+
+_BASE_OID = (1, 3, 6, 1, 4, 1, 4711)
+
+
+class _Agent:
+    def __init__(self, data: Mapping[tuple[int, ...], bytes]) -> None:
+        self.data = data
+        self.oids = sorted(data)
+        self.requests = 0
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        while True:
+            message, peer = self.socket.recvfrom(65535)
+            self.requests += 1
+            self.socket.sendto(self._respond(memoryview(message)), peer)
+
+    def _respond(self, message: memoryview) -> bytes:
+        _tag, content, _offset = ber._read_tlv(message, 0)
+        _tag, version, offset = ber._read_tlv(content, 0)
+        _tag, community, offset = ber._read_tlv(content, offset)
+        pdu_type, pdu, _offset = ber._read_tlv(content, offset)
+        _tag, request_id, offset = ber._read_tlv(pdu, 0)
+        _tag, _non_repeaters, offset = ber._read_tlv(pdu, offset)
+        _tag, max_repetitions, offset = ber._read_tlv(pdu, offset)
+        _tag, varbind_list, _offset = ber._read_tlv(pdu, offset)
+        _tag, varbind, _offset = ber._read_tlv(varbind_list, 0)
+        _tag, raw_oid, _offset = ber._read_tlv(varbind, 0)
+        oid = ber._decode_oid(raw_oid)
+
+        count = ber._decode_integer(max_repetitions) if pdu_type == ber.PDUType.GETBULK else 1
+        index = bisect.bisect_right(self.oids, oid)
+        varbinds = [
+            (o, ber.ValueType.OCTET_STRING, self.data[o]) for o in self.oids[index : index + count]
+        ]
+        if len(varbinds) < count:
+            varbinds.append((oid, ber.ValueType.END_OF_MIB_VIEW, b""))
+
+        pdu_content = b"".join(
+            (
+                ber._tlv(ber.ValueType.INTEGER, bytes(request_id)),
+                ber._encode_integer(0),
+                ber._encode_integer(0),
+                ber._tlv(
+                    0x30,
+                    b"".join(
+                        ber._tlv(0x30, ber._encode_oid(o) + ber._tlv(tag, value))
+                        for o, tag, value in varbinds
+                    ),
+                ),
+            )
+        )
+        return ber._tlv(
+            0x30,
+            ber._tlv(ber.ValueType.INTEGER, bytes(version))
+            + ber._tlv(ber.ValueType.OCTET_STRING, bytes(community))
+            + ber._tlv(ber.PDUType.RESPONSE, pdu_content),
+        )
+
+
+def _config(port: int, backend: SNMPBackendEnum) -> SNMPHostConfig:
+    return SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname=HostName("benchmark"),
+        ipaddress="127.0.0.1",
+        credentials="public",
+        port=port,
+        is_bulkwalk_host=True,
+        is_snmpv2or3_without_bulkwalk_host=True,
+        bulk_walk_size_of=10,
+        timing={"timeout": 1, "retries": 0},
+        oid_range_limits={},
+        snmpv3_contexts=[],
+        character_encoding=None,
+        snmp_backend=backend,
+    )
+
+
+def _measure(agent: _Agent, backend: SNMPBackend, trees: int) -> tuple[float, int, int]:
+    requests = agent.requests
+    start = time.perf_counter()
+    rows = sum(
+        len(backend.walk(".%s" % ".".join(map(str, (*_BASE_OID, tree))))) for tree in range(trees)
+    )
+    return time.perf_counter() - start, agent.requests - requests, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--trees", type=int, default=60)
+    parser.add_argument("--rows", type=int, default=48)
+    args = parser.parse_args()
+
+    agent = _Agent(
+        {
+            (*_BASE_OID, tree, 1, row): f"tree {tree} row {row}".encode()
+            for tree in range(args.trees)
+            for row in range(args.rows)
+        }
+    )
+    backends: list[tuple[str, SNMPBackend]] = [
+        ("pooled", PooledSNMPBackend(_config(agent.port, SNMPBackendEnum.POOLED), logger))
+    ]
+    if shutil.which("snmpbulkwalk"):
+        backends.append(
+            ("classic", ClassicSNMPBackend(_config(agent.port, SNMPBackendEnum.CLASSIC), logger))
+        )
+
+    print(f"{args.trees} trees of {args.rows} rows, bulk size 10")
+    for title, backend in backends:
+        duration, requests, rows = _measure(agent, backend, args.trees)
+        print(f"{title:8} {rows:6} rows {requests:6} requests {duration * 1e3:8.1f}ms")
+    close_sessions()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,21 +7,23 @@
 from __future__ import annotations
 
 import ast
+import codecs
 import contextlib
 import json
 import os
 import re
 import select
+import selectors
 import socket
 import ssl
 import threading
 import time
-from collections.abc import Iterator, Sequence
+from collections.abc import Callable, Iterator, Sequence
 from dataclasses import dataclass, field
 from enum import Enum
 from functools import lru_cache
 from io import BytesIO
-from typing import Any, Literal, NamedTuple, NewType, Type, TypedDict
+from typing import Any, Final, Literal, NamedTuple, NewType, Type, TypedDict
 
 UserId = NewType("UserId", str)
 SiteId = NewType("SiteId", str)
@@ -152,6 +154,12 @@ remove_cache_regex = re.compile("\nCache:[^\n]*")
 # Pattern for allowed UserId values
 validate_user_id_regex = re.compile(r"^[\w$][-@.\w$]*$", re.UNICODE)
 
+# Seconds to wait for the content of a response once its header has arrived
+RESPONSE_CONTENT_TIMEOUT = 30
+
+# Maximum number of bytes read from a socket at once
+RECEIVE_BUFFER_SIZE = 65536
+
 
 class MKLivestatusException(Exception):
     pass
@@ -734,24 +742,46 @@ class SingleSiteConnection(Helpers):
         suppress_exceptions: tuple[Type[Exception], ...],
         timeout_at: float | None = None,
     ) -> bytes:
+        return self.complete_raw_response(
+            query, suppress_exceptions, self._receive_frame, timeout_at
+        )
+
+    def _receive_frame(self) -> tuple[bytes, bytes]:
+        # Headers are always ASCII encoded
+        header = self.receive_data(16)
+        length = self.parse_response_length(header)
+
+        # Apply a lower timeout for the content because the data is already available
+        # in the socket. The liveproxyd (same system) has the complete data available
+        # while the data from a standard connection can still take some time.
+        # 30 seconds should be more than enough for the maximum telegram size of 100MB
+        return header, self.receive_data(length, RESPONSE_CONTENT_TIMEOUT)
+
+    def parse_response_length(self, header: bytes) -> int:
         try:
-            # Headers are always ASCII encoded
-            resp = self.receive_data(16)
-            code = resp[0:3].decode("ascii")
-            try:
-                length = int(resp[4:15].lstrip())
-            except Exception:
-                self.disconnect()
-                raise MKLivestatusSocketError(
-                    "Malformed output. Livestatus TCP socket might be unreachable or wrong"
-                    "encryption settings are used."
-                )
+            return int(header[4:15].lstrip())
+        except Exception:
+            self.disconnect()
+            raise MKLivestatusSocketError(
+                "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+                "encryption settings are used."
+            )
+
+    def complete_raw_response(
+        self,
+        query: str,
+        suppress_exceptions: tuple[Type[Exception], ...],
+        receive_frame: Callable[[], tuple[bytes, bytes]],
+        timeout_at: float | None = None,
+    ) -> bytes:
+        """Check the response header and content returned by receive_frame
 
-            # Apply a lower timeout for the content because the data is already available
-            # in the socket. The liveproxyd (same system) has the complete data available
-            # while the data from a standard connection can still take some time.
-            # 30 seconds should be more than enough for the maximum telegram size of 100MB
-            data = self.receive_data(length, 30)
+        The frame may have been received by the caller already, e.g. while
+        waiting for other sites. In case the socket has been closed, the query
+        is sent again on a new connection."""
+        try:
+            header, data = receive_frame()
+            code = header[0:3].decode("ascii")
 
             if code == "200":
                 return data
@@ -813,6 +843,77 @@ class SingleSiteConnection(Helpers):
         except (ValueError, SyntaxError):
             raise MKLivestatusQueryError("Malformed raw response output")
 
+    def receive_rows(self, query: str, query_obj: Query) -> Iterator[LivestatusRow]:
+        """Receive the response to the query sent and yield the rows as they are decoded
+
+        Only a chunk of the response is held in memory at a time. Errors before
+        the content of a successful response is received are handled like in
+        receive_raw_response, which includes querying again after a reconnect."""
+        try:
+            header = self.receive_data(16)
+            length = self.parse_response_length(header)
+        except Exception as e:
+            error = e
+            header, length = b"", 0
+
+            def receive_frame() -> tuple[bytes, bytes]:
+                raise error
+
+        else:
+
+            def receive_frame() -> tuple[bytes, bytes]:
+                return header, self.receive_data(length, RESPONSE_CONTENT_TIMEOUT)
+
+        if header[0:3] != b"200":
+            yield from self.parse_raw_response(
+                self.complete_raw_response(query, query_obj.suppress_exceptions, receive_frame),
+                query_obj,
+            )
+            return
+
+        decoder = _RowDecoder(query_obj.supports_json_format())
+        complete = False
+        try:
+            # See _receive_frame for the timeout of the content
+            timeout_at = time.time() + RESPONSE_CONTENT_TIMEOUT
+            while length > 0:
+                chunk = self.receive_data(
+                    min(length, RECEIVE_BUFFER_SIZE), max(timeout_at - time.time(), 0)
+                )
+                length -= len(chunk)
+                yield from decoder.feed(chunk)
+            yield from decoder.close()
+            complete = True
+        except (MKLivestatusSocketClosed, IOError) as e:
+            # The rows yielded so far can not be taken back, so there is no
+            # reconnect and query again.
+            raise MKLivestatusSocketError(str(e))
+        finally:
+            if not complete:
+                # Do not mistake the rest of this response for the next one
+                self.disconnect()
+
+    def query_iter(self, query: QueryTypes, add_headers: str = "") -> Iterator[LivestatusRow]:
+        """Like query(), but yield the rows while they are received
+
+        This way large responses never have to be held in memory completely."""
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        if self.limit is not None:
+            normalized_query = Query(
+                "%sLimit: %d\n" % (normalized_query, self.limit),
+                normalized_query.suppress_exceptions,
+            )
+
+        with _livestatus_output_format_switcher(normalized_query, self):
+            str_query = self.build_query(normalized_query, add_headers)
+            self.send_query(str_query)
+
+        for row in self.receive_rows(str_query, normalized_query):
+            if self.prepend_site:
+                row.insert(0, b"")
+            yield row
+
     def set_prepend_site(self, p: bool) -> None:
         self.prepend_site = p
 
@@ -1179,16 +1280,136 @@ class MultiSiteConnection(Helpers):
     # New parallelized version of query(). The semantics differs in the handling
     # of Limit: since all sites are queried in parallel, the Limit: is simply
     # applied to all sites - resulting in possibly more results then Limit requests.
-    def query_parallel(  # pylint: disable=too-many-branches
+    def query_parallel(
         self,
         query: Query,
         add_headers: str = "",
     ) -> LivestatusResponse:
-        stillalive = []
+        site_rows = dict(self.query_parallel_iter(query, add_headers))
+        # Keep the order of the sites, no matter which one answered first
+        result = LivestatusResponse([])
+        for connected_site in self.connections:
+            result.extend(site_rows.get(connected_site.id, []))
+        return result
+
+    def query_parallel_iter(  # pylint: disable=too-many-branches
+        self,
+        query: Query,
+        add_headers: str = "",
+        timeout: float | None = None,
+    ) -> Iterator[tuple[SiteId, LivestatusResponse]]:
+        """Send the query to all sites and yield the rows of each site as soon as they are there
+
+        The responses of all sites are received at the same time, so a slow
+        site does not delay the others. With a timeout, each site has that
+        many seconds (counted from sending the queries) to answer, otherwise
+        it is considered to be dead."""
+        # Sites which are not contacted are assumed to be alive
+        died: set[SiteId] = set()
+
+        # First send all queries
+        deadline = None if timeout is None else time.time() + timeout
+        pending = [
+            _PendingResponse(connected_site, str_query, deadline)
+            for connected_site, str_query in self._send_to_sites(query, add_headers, died)
+        ]
+
+        # Then receive the responses of all sites at once and convert each of
+        # them to python format as soon as it is complete.
+        with selectors.DefaultSelector() as selector:
+            try:
+                for response in pending:
+                    selector.register(response.socket, selectors.EVENT_READ, response)
+
+                while selector.get_map():
+                    for response, complete in _wait_for_responses(selector):
+                        selector.unregister(response.socket)
+                        connected_site = response.site
+                        if not complete:
+                            connected_site.connection.disconnect()
+                            died.add(connected_site.id)
+                            self.deadsites[connected_site.id] = {
+                                "exception": MKLivestatusSocketError(
+                                    "Timeout while waiting for the response of the site"
+                                ),
+                                "site": connected_site.config,
+                            }
+                            continue
+
+                        try:
+                            rows = connected_site.connection.parse_raw_response(
+                                connected_site.connection.complete_raw_response(
+                                    response.query, query.suppress_exceptions, response.frame
+                                ),
+                                query,
+                            )
+                        except query.suppress_exceptions:
+                            # Mostly handles exception types MKLivestatusTableNotFoundError
+                            continue
+                        except LivestatusTestingError:
+                            raise
+                        except Exception as e:
+                            connected_site.connection.disconnect()
+                            died.add(connected_site.id)
+                            self.deadsites[connected_site.id] = {
+                                "exception": e,
+                                "site": connected_site.config,
+                            }
+                            continue
+
+                        if self.prepend_site:
+                            for row in rows:
+                                row.insert(0, connected_site.id)
+                        yield connected_site.id, rows
+            finally:
+                # The responses not received (the caller stopped iterating)
+                # would be mistaken for the ones of the next query.
+                for key in selector.get_map().values():
+                    key.data.site.connection.disconnect()
+                self.connections = [c for c in self.connections if c.id not in died]
+
+    def query_iter(self, query: QueryTypes, add_headers: str = "") -> Iterator[LivestatusRow]:
+        """Like query(), but yield the rows while they are received, site by site
+
+        The query is sent to all sites first. A site failing after some of its
+        rows have been yielded is considered to be dead, like any other one."""
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        died: set[SiteId] = set()
+        pending = self._send_to_sites(normalized_query, add_headers, died)
+        try:
+            while pending:
+                connected_site, str_query = pending[0]
+                try:
+                    for row in connected_site.connection.receive_rows(str_query, normalized_query):
+                        if self.prepend_site:
+                            row.insert(0, connected_site.id)
+                        yield row
+                except normalized_query.suppress_exceptions:
+                    pass
+                except LivestatusTestingError:
+                    raise
+                except Exception as e:
+                    connected_site.connection.disconnect()
+                    died.add(connected_site.id)
+                    self.deadsites[connected_site.id] = {
+                        "exception": e,
+                        "site": connected_site.config,
+                    }
+                del pending[0]
+        finally:
+            # The responses not received (the caller stopped iterating)
+            # would be mistaken for the ones of the next query.
+            for connected_site, _str_query in pending:
+                connected_site.connection.disconnect()
+            self.connections = [c for c in self.connections if c.id not in died]
+
+    def _send_to_sites(
+        self, query: Query, add_headers: str, died: set[SiteId]
+    ) -> list[tuple[ConnectedSite, str]]:
+        """Send the query to all sites in question, return the sites and the queries sent"""
         if self.only_sites is not None:
             connect_to_sites = [c for c in self.connections if c[0] in self.only_sites]
-            # Unused sites are assumed to be alive
-            stillalive.extend([c for c in self.connections if c[0] not in self.only_sites])
         else:
             connect_to_sites = self.connections
 
@@ -1198,70 +1419,24 @@ class MultiSiteConnection(Helpers):
         else:
             limit_header = ""
 
-        # First send all queries
-        retrieve_responses: list[tuple[str, ConnectedSite]] = []
-        for connected_site in connect_to_sites:
-            try:
-                str_query = connected_site.connection.build_query(query, add_headers + limit_header)
-                connected_site.connection.send_query(str_query)
-                retrieve_responses.append((str_query, connected_site))
-            except LivestatusTestingError:
-                raise
-            except Exception as e:
-                self.deadsites[connected_site.id] = {
-                    "exception": e,
-                    "site": connected_site.config,
-                }
-
-        # Then retrieve all raw responses. We will be as slow as the slowest of all connections.
-        site_responses: list[tuple[ConnectedSite, bytes]] = []
-        for str_query, connected_site in retrieve_responses:
-            try:
-                site_responses.append(
-                    (
-                        connected_site,
-                        connected_site.connection.receive_raw_response(
-                            str_query, query.suppress_exceptions
-                        ),
+        sent = []
+        with _livestatus_output_format_switcher(query, self):
+            for connected_site in connect_to_sites:
+                try:
+                    str_query = connected_site.connection.build_query(
+                        query, add_headers + limit_header
                     )
-                )
-            except query.suppress_exceptions:
-                # Mostly handles exception types MKLivestatusTableNotFoundError
-                stillalive.append(connected_site)
-                continue
-            except LivestatusTestingError:
-                raise
-            except Exception as e:
-                connected_site.connection.disconnect()
-                self.deadsites[connected_site.id] = {
-                    "exception": e,
-                    "site": connected_site.config,
-                }
-
-        # Convert responses to python format
-        result = LivestatusResponse([])
-        for connected_site, raw_response in site_responses:
-            try:
-                rows = connected_site.connection.parse_raw_response(raw_response, query)
-                stillalive.append(connected_site)
-                if self.prepend_site:
-                    for row in rows:
-                        row.insert(0, connected_site.id)
-                result.extend(rows)
-            except query.suppress_exceptions:
-                stillalive.append(connected_site)
-                continue
-            except LivestatusTestingError:
-                raise
-            except Exception as e:
-                connected_site.connection.disconnect()
-                self.deadsites[connected_site.id] = {
-                    "exception": e,
-                    "site": connected_site.config,
-                }
-
-        self.connections = stillalive
-        return result
+                    connected_site.connection.send_query(str_query)
+                    sent.append((connected_site, str_query))
+                except LivestatusTestingError:
+                    raise
+                except Exception as e:
+                    died.add(connected_site.id)
+                    self.deadsites[connected_site.id] = {
+                        "exception": e,
+                        "site": connected_site.config,
+                    }
+        return sent
 
     def command(self, command: str, sitename: SiteId | None = SiteId("local")) -> None:
         if sitename in self.deadsites:
@@ -1291,6 +1466,161 @@ class MultiSiteConnection(Helpers):
         raise KeyError("Connection does not exist")
 
 
+class _RowDecoder:
+    """Decode a response row by row while it is received
+
+    Livestatus puts every row on a line of its own, separated by commas and
+    enclosed in brackets. The complete lines received so far are decoded as a
+    list of rows. Should that fail, e.g. because a row spans several lines,
+    more lines are waited for."""
+
+    def __init__(self, json_format: bool) -> None:
+        self._parse: Callable[[str], Any] = json.loads if json_format else ast.literal_eval
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+        self._started = False
+
+    def feed(self, data: bytes) -> Iterator[LivestatusRow]:
+        self._pending += self._decoder.decode(data)
+        end_of_lines = self._pending.rfind("\n")
+        if end_of_lines < 0:
+            return
+        rows = self._parse_rows(self._pending[:end_of_lines], final=False)
+        if rows is not None:
+            self._pending = self._pending[end_of_lines + 1 :]
+            yield from rows
+
+    def close(self) -> Iterator[LivestatusRow]:
+        self._pending += self._decoder.decode(b"", final=True)
+        rows = self._parse_rows(self._pending, final=True)
+        assert rows is not None
+        self._pending = ""
+        yield from rows
+
+    def _parse_rows(self, lines: str, final: bool) -> list[LivestatusRow] | None:
+        text = lines.strip()
+        if not self._started:
+            if not text.startswith("["):
+                raise MKLivestatusQueryError("Malformed raw response output")
+            text = text[1:]
+
+        if text.endswith(","):
+            # More rows to come
+            text = text[:-1]
+        elif text.endswith("]"):
+            # The end of the response
+            text = text[:-1]
+        elif not final:
+            return None
+
+        try:
+            rows: list[LivestatusRow] = self._parse("[%s]" % text)
+        except (ValueError, SyntaxError):
+            if final:
+                raise MKLivestatusQueryError("Malformed raw response output")
+            return None
+
+        self._started = True
+        return rows
+
+
+class _PendingResponse:
+    """A response of a site which is received in pieces, while waiting for the other sites"""
+
+    def __init__(self, site: ConnectedSite, query: str, deadline: float | None) -> None:
+        assert site.connection.socket is not None
+        self.site = site
+        self.query = query
+        self.deadline = deadline
+        self.socket: Final = site.connection.socket
+        self._header = b""
+        self._data = BytesIO()
+        self._length: int | None = None
+        self._error: Exception | None = None
+
+    def receive(self) -> bool:
+        """Read the available data, return whether the response is complete"""
+        if self._length is None:
+            size = 16 - len(self._header)
+        else:
+            size = self._length - self._data.tell()
+
+        try:
+            # Never read more than the current response. TLS sockets may not
+            # have a complete record yet, the timeout covers this.
+            self.socket.settimeout(RESPONSE_CONTENT_TIMEOUT)
+            packet = self.socket.recv(min(size, RECEIVE_BUFFER_SIZE))
+            if not packet:
+                raise MKLivestatusSocketClosed(
+                    "Read zero data from socket, remote peer closed connection."
+                )
+        except (MKLivestatusSocketClosed, IOError) as e:
+            # Let complete_raw_response reconnect and query again
+            self._error = e
+            return True
+
+        if self._length is not None:
+            self._data.write(packet)
+            return self._data.tell() >= self._length
+
+        self._header += packet
+        if len(self._header) < 16:
+            return False
+
+        try:
+            self._length = self.site.connection.parse_response_length(self._header)
+        except MKLivestatusSocketError as e:
+            self._error = e
+            return True
+
+        # See SingleSiteConnection._receive_frame
+        content_deadline = time.time() + RESPONSE_CONTENT_TIMEOUT
+        self.deadline = (
+            content_deadline if self.deadline is None else min(self.deadline, content_deadline)
+        )
+        return self._length == 0
+
+    def frame(self) -> tuple[bytes, bytes]:
+        if self._error is not None:
+            raise self._error
+        return self._header, self._data.getvalue()
+
+
+def _wait_for_responses(
+    selector: selectors.BaseSelector,
+) -> Iterator[tuple[_PendingResponse, bool]]:
+    """Receive from all sockets which are ready
+
+    Yield the responses which are complete (True) or have run into their
+    deadline (False)."""
+    responses = [key.data for key in selector.get_map().values()]
+
+    # Data already decrypted by the TLS layer is not signalled by the socket
+    # (see is_socket_readable)
+    ready = [
+        response
+        for response in responses
+        if isinstance(response.socket, ssl.SSLSocket) and response.socket.pending()
+    ]
+    deadlines = [response.deadline for response in responses if response.deadline is not None]
+    if ready:
+        select_timeout: float | None = 0
+    elif deadlines:
+        select_timeout = max(0, min(deadlines) - time.time())
+    else:
+        select_timeout = None
+
+    ready.extend(key.data for key, _events in selector.select(select_timeout))
+
+    now = time.time()
+    for response in responses:
+        if response in ready:
+            if response.receive():
+                yield response, True
+        elif response.deadline is not None and response.deadline <= now:
+            yield response, False
+
+
 @contextlib.contextmanager
 def _livestatus_output_format_switcher(
     query: Query, connection: MultiSiteConnection | SingleSiteConnection
@@ -645,6 +645,7 @@ static ColumnDefinitions event_console_status_columns() {
         {"status_event_limit_rule", ColumnType::int_},
         {"status_event_rate", ColumnType::double_},
         {"status_events", ColumnType::int_},
+        {"status_history_queue_length", ColumnType::int_},
         {"status_message_rate", ColumnType::double_},
         {"status_messages", ColumnType::int_},
         {"status_num_open_events", ColumnType::int_},
@@ -27,6 +27,9 @@ TableEventConsoleStatus::TableEventConsoleStatus(MonitoringCore *mc)
     addColumn(ECRow::makeIntColumn("status_virtual_memory_size",
                                    "The current virtual memory size in bytes",
                                    offsets));
+    addColumn(ECRow::makeIntColumn(
+        "status_history_queue_length",
+        "The number of history entries waiting to be written", offsets));
 
     addColumn(ECRow::makeIntColumn(
         "status_messages",
@@ -34,7 +34,7 @@ import cmk.utils.paths
 import cmk.snmplib.snmp_cache as snmp_cache
 from cmk.snmplib.type_defs import SNMPBackend, SNMPBackendEnum, SNMPHostConfig
 
-from cmk.fetchers.snmp_backend import ClassicSNMPBackend, StoredWalkSNMPBackend
+from cmk.fetchers.snmp_backend import ClassicSNMPBackend, PooledSNMPBackend, StoredWalkSNMPBackend
 
 try:
     from cmk.checkers.cee.snmp_backend.inline import InlineSNMPBackend  # type: ignore[import]
@@ -209,6 +209,8 @@ def backend_fixture(request, snmp_data_dir):
             backend = ClassicSNMPBackend
         case SNMPBackendEnum.STORED_WALK:
             backend = StoredWalkSNMPBackend
+        case SNMPBackendEnum.POOLED:
+            backend = PooledSNMPBackend
         case _:
             assert_never(backend_type)
 
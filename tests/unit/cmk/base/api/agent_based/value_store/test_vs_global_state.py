@@ -23,9 +23,11 @@ def test_load_host_value_store_loads_file(monkeypatch: MonkeyPatch) -> None:
 
     monkeypatch.setattr(
         store,
-        "load_text_from_file",
-        lambda *_a, **_kw: "{('test_load_host_value_store_loads_file', '%s', %r, 'loaded_file'): True}"
-        % service_id,
+        "load_bytes_from_file",
+        lambda *_a, **_kw: (
+            "{('test_load_host_value_store_loads_file', '%s', %r, 'loaded_file'): True}"
+            % service_id
+        ).encode(),
     )
 
     with load_host_value_store(
@@ -3,15 +3,16 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from ast import literal_eval
 from pathlib import Path
 
 # pylint: disable=protected-access
 import pytest
 
 from cmk.utils import store
+from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.type_defs import CheckPluginName
 
+import cmk.base.api.agent_based.value_store._utils as value_store_utils
 from cmk.base.api.agent_based.value_store._utils import (
     _DiskSyncedMapping,
     _DynamicDiskSyncedMapping,
@@ -79,20 +80,20 @@ class Test_DynamicDiskSyncedMapping:
 class Test_StaticDiskSyncedMapping:
     def _mock_load(self, mocker):
         stored_item_states = (
-            '{("check1", None, "stored-user-key-1"): 23,'
-            ' ("check2", "item", "stored-user-key-2"): 42}'
+            b'{("check1", None, "stored-user-key-1"): 23,'
+            b' ("check2", "item", "stored-user-key-2"): 42}'
         )
 
         mocker.patch.object(
             store,
-            "load_text_from_file",
+            "load_bytes_from_file",
             side_effect=lambda *a, **kw: stored_item_states,
         )
 
     def _mock_store(self, mocker):
         mocker.patch.object(
             store,
-            "save_text_to_file",
+            "save_bytes_to_file",
             autospec=True,
         )
 
@@ -103,8 +104,8 @@ class Test_StaticDiskSyncedMapping:
         return _StaticDiskSyncedMapping(
             path=tmp_path / "test-host",
             log_debug=lambda msg: None,
-            serializer=repr,
-            deserializer=literal_eval,
+            serializer=store.MarshalSerializer().serialize,
+            deserializer=store.MarshalSerializer().deserialize,
         )
 
     def test_mapping_features(self, mocker, tmp_path: Path) -> None:  # type: ignore[no-untyped-def]
@@ -138,9 +139,72 @@ class Test_StaticDiskSyncedMapping:
             ("check1", None, "stored-user-key-1"): 23,
             ("check3", "el Barto", "Ay caramba"): "ASDF",
         }
-        written = store.save_text_to_file.call_args.args[1]  # type: ignore[attr-defined]
-        assert written == repr(expected_values)
+        assert not store.save_bytes_to_file.called  # type: ignore[attr-defined]
+        assert (tmp_path / ".test-host.log").stat().st_size
         assert list(sdsm.items()) == list(expected_values.items())
+        assert list(self._get_sdsm(tmp_path).items()) == list(expected_values.items())
+
+    def test_replay_changes_of_others(self, tmp_path: Path) -> None:
+        sdsm = self._get_sdsm(tmp_path)
+        other = self._get_sdsm(tmp_path)
+
+        other.disksync(updated=[(("check1", None, "key"), 1), (("check1", None, "other"), 2)])
+        sdsm.disksync(updated=[(("check2", None, "key"), 3)])
+        other.disksync(removed={("check1", None, "other")})
+        sdsm.disksync()
+
+        assert dict(sdsm) == {("check1", None, "key"): 1, ("check2", None, "key"): 3}
+
+    def test_compaction(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        monkeypatch.setattr(value_store_utils, "_MIN_COMPACTION_SIZE", 0)
+        sdsm = self._get_sdsm(tmp_path)
+        for value in range(5):
+            sdsm.disksync(updated=[(("check", None, "key"), value)])
+
+        assert (tmp_path / "test-host").exists()
+        assert dict(self._get_sdsm(tmp_path)) == {("check", None, "key"): 4}
+
+    def test_crash_while_compacting(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        sdsm = self._get_sdsm(tmp_path)
+        for value in range(3):
+            sdsm.disksync(updated=[(("check", None, "key"), value)])
+
+        def crash(*args: object) -> None:
+            raise KeyboardInterrupt()
+
+        monkeypatch.setattr(value_store_utils, "_MIN_COMPACTION_SIZE", 0)
+        monkeypatch.setattr(value_store_utils.os, "truncate", crash)
+        with pytest.raises(KeyboardInterrupt):
+            sdsm.disksync(updated=[(("check", None, "key"), 3), (("check", None, "new"), 4)])
+
+        assert (tmp_path / ".test-host.log").stat().st_size
+        assert dict(self._get_sdsm(tmp_path)) == {
+            ("check", None, "key"): 3,
+            ("check", None, "new"): 4,
+        }
+
+    def test_incomplete_change_is_dropped(self, tmp_path: Path) -> None:
+        sdsm = self._get_sdsm(tmp_path)
+        sdsm.disksync(updated=[(("check", None, "key"), 1)])
+        log_path = tmp_path / ".test-host.log"
+        complete_size = log_path.stat().st_size
+        with log_path.open("ab") as log:
+            log.write(b"\x10\x00\x00\x00\x10\x00\x00\x00incomplete")
+
+        other = self._get_sdsm(tmp_path)
+
+        assert dict(other) == {("check", None, "key"): 1}
+        assert log_path.stat().st_size == complete_size
+        other.disksync(updated=[(("check", None, "key"), 2)])
+        assert dict(self._get_sdsm(tmp_path)) == {("check", None, "key"): 2}
+
+    def test_world_writable_log_is_not_read(self, tmp_path: Path) -> None:
+        self._get_sdsm(tmp_path).disksync(updated=[(("check", None, "key"), 1)])
+        (tmp_path / ".test-host.log").chmod(0o666)
+
+        with pytest.raises(MKGeneralException) as exc_info:
+            self._get_sdsm(tmp_path)
+        assert "world writable" in str(exc_info.value.__cause__)
 
 
 class Test_DiskSyncedMapping:
@@ -3,6 +3,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import pickle
 import re
 import shutil
 import socket
@@ -2725,6 +2726,34 @@ def test_load_packed_config(config_path: VersionedConfigPath) -> None:
     del config.__dict__["abc"]
 
 
+def test_packed_config_host_configs(
+    monkeypatch: MonkeyPatch, config_path: VersionedConfigPath
+) -> None:
+    ts = Scenario()
+    for hostname in ("node1", "node2", "other"):
+        ts.add_host(HostName(hostname), labels={"name": hostname})
+    ts.add_cluster(HostName("cluster"), nodes=[HostName("node1"), HostName("node2")])
+    generator = config.PackedConfigGenerator(ts.apply(monkeypatch))
+    store = config.PackedConfigStore.from_serial(config_path)
+
+    store.write(*generator.split_host_configs(generator.generate()))
+
+    assert "host_labels" not in store.read()
+    host_configs = store.read_host_configs()
+    assert host_configs["node1"].related_hosts == ["cluster", "node2"]
+    assert host_configs["cluster"].related_hosts == ["node1", "node2"]
+    assert host_configs["other"].related_hosts == []
+
+    merged = config._merge_host_configs(host_configs, [HostName("node1")])
+    assert merged["host_labels"] == {"node1": {"name": "node1"}, "node2": {"name": "node2"}}
+    assert [entry.split("|", 1)[0] for entry in merged["all_hosts"]] == ["node1", "node2"]
+    assert set(merged["host_paths"]) == {"node1", "node2", "cluster"}
+    assert list(merged["clusters"]) == ["cluster"]
+
+    merged = config._merge_host_configs(host_configs, None)
+    assert [entry.split("|", 1)[0] for entry in merged["all_hosts"]] == ["node1", "node2", "other"]
+
+
 class TestPackedConfigStore:
     @pytest.fixture()
     def store(self, config_path: VersionedConfigPath) -> config.PackedConfigStore:
@@ -2741,7 +2770,39 @@ class TestPackedConfigStore:
         store.write({"abc": 1})
 
         assert precompiled_check_config.exists()
+        assert dict(store.read()) == {"abc": 1}
+
+    def test_read_keeps_shared_objects(self, store: config.PackedConfigStore) -> None:
+        shared = {"a": [1, 2]}
+        store.write({"abc": shared, "xyz": [shared]})
+
+        packed_config = store.read()
+        assert packed_config == {"abc": {"a": [1, 2]}, "xyz": [{"a": [1, 2]}]}
+        assert packed_config["xyz"][0] is packed_config["abc"]
+
+    def test_read_host_configs_on_access(self, store: config.PackedConfigStore) -> None:
+        store.write(
+            {"abc": 1},
+            {
+                HostName("heute"): config.PackedHostConfig([], {"all_hosts": ["heute"]}),
+                HostName("morgen"): config.PackedHostConfig([], {"all_hosts": ["morgen"]}),
+            },
+        )
+
+        host_configs = store.read_host_configs()
+        assert isinstance(host_configs, config.PackedHostConfigs)
+        assert list(host_configs) == ["heute", "morgen"]
+        assert host_configs["morgen"].variables == {"all_hosts": ["morgen"]}
+        assert list(host_configs._loaded) == ["morgen"]
+        with pytest.raises(KeyError):
+            _ = host_configs["gestern"]
+
+    def test_read_unsectioned_file(self, store: config.PackedConfigStore) -> None:
+        store.path.parent.mkdir(parents=True, exist_ok=True)
+        store.path.write_bytes(pickle.dumps({"abc": 1}))
+
         assert store.read() == {"abc": 1}
+        assert store.read_host_configs() == {}
 
 
 def test__extract_check_plugins(monkeypatch: MonkeyPatch) -> None:
@@ -4,6 +4,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import math
+import random
 import time
 from collections.abc import Callable, Sequence
 from pprint import pprint
@@ -12,7 +13,15 @@ import pytest
 
 from tests.testlib import on_time
 
-from cmk.utils.prediction import DataStats, Seconds, Timegroup, TimeSeriesValues, Timestamp
+from cmk.utils.prediction import (
+    DataStats,
+    Seconds,
+    Timegroup,
+    TimeSeries,
+    TimeSeriesValues,
+    Timestamp,
+)
+from cmk.utils.prediction_arrays import data_stats
 
 from cmk.base import prediction
 
@@ -196,4 +205,110 @@ def test_time_slices(
     ],
 )
 def test_data_stats(slices: list[TimeSeriesValues], result: DataStats) -> None:
-    assert prediction._data_stats(slices) == result
+    assert data_stats(slices) == result
+
+
+def _data_stats_per_point(slices: list[TimeSeriesValues]) -> DataStats:
+    "The element by element computation data_stats replaces"
+    descriptors: DataStats = []
+    for time_column in zip(*slices):
+        point_line = [x for x in time_column if x is not None]
+        if not point_line:
+            descriptors.append([None, None, None, None])
+            continue
+        samples = len(point_line)
+        average = sum(point_line) / float(samples)
+        std_dev = (
+            abs(average)
+            if samples == 1
+            else math.sqrt(
+                abs(sum(p**2 for p in point_line) - average**2 * samples) / float(samples - 1)
+            )
+        )
+        descriptors.append([average, min(point_line), max(point_line), std_dev])
+    return descriptors
+
+
+def test_data_stats_as_per_point() -> None:
+    rng = random.Random(4711)
+    slices: list[TimeSeriesValues] = [
+        [None if rng.random() < 0.1 else rng.uniform(-1.0, 1.0) for _ in range(1000)]
+        for _ in range(5)
+    ]
+    for computed, expected in zip(data_stats(slices), _data_stats_per_point(slices)):
+        # Average, minimum and maximum are exactly the same
+        assert computed[:3] == expected[:3]
+        # The squares are x*x instead of x**2, which differ in the last bit for
+        # some values. This is the difference accepted for the standard deviation.
+        assert (computed[3] is None) is (expected[3] is None)
+        if computed[3] is not None and expected[3] is not None:
+            assert math.isclose(computed[3], expected[3], rel_tol=1e-14)
+
+
+def _fake_rrd_column(
+    fetched: list[Timestamp], fine_from: Timestamp | None = None
+) -> prediction.RRDColumnFunction:
+    def rrd_column(start: Timestamp, end: Timestamp) -> TimeSeries:
+        fetched.append(start)
+        if fine_from is not None and start >= fine_from:
+            return TimeSeries([float(start // 100 + i // 5) for i in range(10)], (start, end, 10))
+        return TimeSeries([float(start // 100 + i) for i in range(4)], (start, end, 25))
+
+    return rrd_column
+
+
+def test_calculate_data_for_prediction_reuses_slices() -> None:
+    fetched: list[Timestamp] = []
+    rrd_column = _fake_rrd_column(fetched)
+    time_windows = [(300, 400), (200, 300), (100, 200)]
+
+    data, slices = prediction._calculate_data_for_prediction(time_windows, rrd_column, "max", 350)
+    assert fetched == [300, 200, 100]
+    assert slices.slices == {
+        200: ((0, 100, 25), [2.0, 3.0, 4.0, 5.0]),
+        100: ((0, 100, 25), [1.0, 2.0, 3.0, 4.0]),
+    }
+
+    fetched.clear()
+    next_windows = [(400, 500), (300, 400), (200, 300)]
+    next_data, _next_slices = prediction._calculate_data_for_prediction(
+        next_windows, rrd_column, "max", 450, slices
+    )
+    assert fetched == [400, 300]
+    assert (
+        next_data
+        == prediction._calculate_data_for_prediction(next_windows, rrd_column, "max", 450)[0]
+    )
+    assert next_data != data
+
+
+def test_calculate_data_for_prediction_ignores_slices_of_other_cf() -> None:
+    fetched: list[Timestamp] = []
+    rrd_column = _fake_rrd_column(fetched)
+    time_windows = [(300, 400), (200, 300), (100, 200)]
+
+    _data, slices = prediction._calculate_data_for_prediction(time_windows, rrd_column, "max", 450)
+    fetched.clear()
+    prediction._calculate_data_for_prediction(time_windows, rrd_column, "min", 450, slices)
+    assert fetched == [300, 200, 100]
+
+
+def test_calculate_data_for_prediction_reuses_slices_of_other_resolution() -> None:
+    fetched: list[Timestamp] = []
+    time_windows = [(300, 400), (200, 300), (100, 200)]
+    _data, slices = prediction._calculate_data_for_prediction(
+        time_windows, _fake_rrd_column(fetched), "max", 350
+    )
+
+    fetched.clear()
+    next_windows = [(400, 500), (300, 400), (200, 300)]
+    rrd_column = _fake_rrd_column(fetched, fine_from=400)
+    next_data, _next_slices = prediction._calculate_data_for_prediction(
+        next_windows, rrd_column, "max", 450, slices
+    )
+    assert fetched == [400, 300]
+    assert next_data.step == 10
+    assert (
+        next_data
+        == prediction._calculate_data_for_prediction(next_windows, rrd_column, "max", 450)[0]
+    )
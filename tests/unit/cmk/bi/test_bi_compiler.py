@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import ast
+import copy
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from livestatus import LivestatusOutputFormat, LivestatusResponse, LivestatusRow, SiteId
+
+import cmk.bi.compiler
+import cmk.bi.data_fetcher
+from cmk.bi.aggregation import BIAggregation
+from cmk.bi.compiler import BICompiler, ConfigStatus
+from cmk.bi.data_fetcher import SiteProgramStart
+from cmk.bi.lib import SitesCallback
+from cmk.bi.trees import BICompiledAggregation, BICompiledRule
+
+from .bi_test_data import sample_config
+from .conftest import MockBIAggregationPack
+
+_SAMPLE_PACK: dict[str, Any] = sample_config.bi_packs_config["packs"][0]  # type: ignore[index]
+
+
+def _rule(rule_id: str, title: str, nodes: Sequence[dict]) -> dict:
+    (rule,) = (rule for rule in _SAMPLE_PACK["rules"] if rule["id"] == "host")
+    return {
+        **copy.deepcopy(rule),
+        "id": rule_id,
+        "nodes": list(nodes),
+        "properties": {**rule["properties"], "title": title},
+    }
+
+
+def _aggregation(aggr_id: str, search: dict, rule_id: str = "host") -> dict:
+    aggregation = copy.deepcopy(_SAMPLE_PACK["aggregations"][0])
+    aggregation["id"] = aggr_id
+    aggregation["node"] = {
+        "action": {
+            "params": {"arguments": ["$HOSTNAME$"]},
+            "rule_id": rule_id,
+            "type": "call_a_rule",
+        },
+        "search": search,
+    }
+    return aggregation
+
+
+def _host_search(pattern: str, refer_to: str = "host") -> dict:
+    return {
+        "conditions": {
+            "host_choice": {"type": "host_name_regex", "pattern": pattern},
+            "host_folder": "",
+            "host_labels": {},
+            "host_tags": {},
+        },
+        "refer_to": {"type": refer_to},
+        "type": "host_search",
+    }
+
+
+_HOST_RULE = _rule(
+    "host",
+    "Host $HOSTNAME$",
+    [
+        {
+            "action": {"host_regex": "$HOSTNAME$", "type": "state_of_host"},
+            "search": {"type": "empty"},
+        },
+        {
+            "action": {
+                "host_regex": "$HOSTNAME$",
+                "service_regex": "Uptime",
+                "type": "state_of_service",
+            },
+            "search": {"type": "empty"},
+        },
+    ],
+)
+
+
+def _packs_config(aggregations: Sequence[dict], rules: Sequence[dict] = (_HOST_RULE,)) -> dict:
+    return {
+        "packs": [
+            {
+                **_SAMPLE_PACK,
+                "aggregations": list(aggregations),
+                "rules": list(rules),
+            }
+        ]
+    }
+
+
+class _Compiler(BICompiler):
+    """Compiles the given packs for a single site with the hosts in `hosts`
+
+    The hosts map the host name to its children and services.  Change
+    `program_start` to make the compiler fetch the hosts again.
+    """
+
+    def __init__(self, packs_config: dict, compilation_workers: int = 1) -> None:
+        self.packs_config = packs_config
+        self.hosts: dict[str, tuple[Sequence[str], Sequence[str]]] = {}
+        self.program_start = 1
+        self.configfile_timestamp = 1.0
+        super().__init__(
+            "bi.mk",
+            SitesCallback(lambda: [(SiteId("heute"), True)], self._query, lambda s: s),
+            compilation_workers,
+        )
+
+    def _setup(self) -> None:
+        super()._setup()
+        self._bi_packs = MockBIAggregationPack(self.packs_config)
+
+    def _query(
+        self,
+        query: str,
+        only_sites: list[SiteId] | None = None,
+        output_format: LivestatusOutputFormat = LivestatusOutputFormat.PYTHON,
+        fetch_full_data: bool = False,
+    ) -> LivestatusResponse:
+        if query.startswith("GET status"):
+            return LivestatusResponse([LivestatusRow(["heute", self.program_start])])
+        if query.startswith("GET hosts"):
+            return LivestatusResponse(
+                [
+                    LivestatusRow(
+                        [
+                            "heute",
+                            host_name,
+                            {},
+                            {},
+                            list(children),
+                            [parent for parent, (c, _s) in self.hosts.items() if host_name in c],
+                            host_name,
+                            "/wato/hosts.mk",
+                        ]
+                    )
+                    for host_name, (children, _services) in self.hosts.items()
+                ]
+            )
+        return LivestatusResponse(
+            [
+                LivestatusRow(["heute", host_name, description, [], {}])
+                for host_name, (_children, services) in self.hosts.items()
+                for description in services
+            ]
+        )
+
+    def prepare_for_compilation(self, online_sites: set[SiteProgramStart]) -> None:
+        # The structure fetcher keeps the hosts of earlier compilations.  Start
+        # afresh, as a new GUI process would.
+        self._bi_structure_fetcher.cleanup()
+        super().prepare_for_compilation(online_sites)
+
+    def compute_current_configstatus(self) -> ConfigStatus:
+        configstatus = super().compute_current_configstatus()
+        configstatus["configfile_timestamp"] = self.configfile_timestamp
+        return configstatus
+
+    def _generate_part_of_aggregation_lookup(
+        self, compiled_aggregations: dict[str, BICompiledAggregation]
+    ) -> None:
+        pass
+
+    def compile(self) -> dict[str, list[str]]:
+        """Compile as needed and return the branch titles by aggregation"""
+        self.cleanup()
+        self.load_compiled_aggregations()
+        return {
+            aggr_id: sorted(branch.properties.title for branch in aggregation.branches)
+            for aggr_id, aggregation in self.compiled_aggregations.items()
+        }
+
+
+def _use_cache_dir(monkeypatch: pytest.MonkeyPatch, cache_dir: Path) -> None:
+    cache_dir.mkdir(exist_ok=True)
+    monkeypatch.setattr(cmk.bi.compiler, "get_cache_dir", lambda: cache_dir)
+    monkeypatch.setattr(cmk.bi.data_fetcher, "get_cache_dir", lambda: cache_dir)
+
+
+@pytest.fixture(name="cache_dir")
+def fixture_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    _use_cache_dir(monkeypatch, tmp_path)
+    return tmp_path
+
+
+def _compiler_with_hosts(aggregation_count: int, compilation_workers: int = 1) -> _Compiler:
+    compiler = _Compiler(
+        _packs_config(
+            [
+                _aggregation(f"aggr{i}", _host_search(f"host{i}-.*"))
+                for i in range(aggregation_count)
+            ]
+        ),
+        compilation_workers,
+    )
+    compiler.hosts = {
+        f"host{i}-{j}": ((), ("Uptime",)) for i in range(aggregation_count) for j in range(3)
+    }
+    return compiler
+
+
+def _serialized(compiled_aggregations: dict[str, BICompiledAggregation]) -> dict[str, dict]:
+    return {
+        aggr_id: aggregation.serialize() for aggr_id, aggregation in compiled_aggregations.items()
+    }
+
+
+def test_compile_with_workers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _use_cache_dir(monkeypatch, tmp_path / "sequential")
+    sequential = _compiler_with_hosts(7, compilation_workers=1)
+    assert sequential.compile() == {
+        f"aggr{i}": [f"Host host{i}-0", f"Host host{i}-1", f"Host host{i}-2"] for i in range(7)
+    }
+    _use_cache_dir(monkeypatch, tmp_path / "parallel")
+    parallel = _compiler_with_hosts(7, compilation_workers=3)
+    parallel.compile()
+
+    assert _serialized(parallel.compiled_aggregations) == _serialized(
+        sequential.compiled_aggregations
+    )
+    for subdir in ("sequential", "parallel"):
+        compilation_times = ast.literal_eval((tmp_path / subdir / "compilation_times").read_text())
+        assert set(compilation_times) == {f"aggr{i}" for i in range(7)}
+        assert all(
+            set(times) == {"compile", "serialize"} and min(times.values()) >= 0
+            for times in compilation_times.values()
+        )
+
+
+@pytest.mark.parametrize("compilation_workers", [1, 3])
+def test_compile_raises_worker_exception(cache_dir: Path, compilation_workers: int) -> None:
+    # The workers are spawned, so the failure has to come with the configuration
+    compiler = _Compiler(
+        _packs_config(
+            [
+                _aggregation(
+                    f"aggr{i}", _host_search(f"host{i}-.*"), "missing" if i == 4 else "host"
+                )
+                for i in range(7)
+            ]
+        ),
+        compilation_workers,
+    )
+    compiler.hosts = {f"host{i}-{j}": ((), ("Uptime",)) for i in range(7) for j in range(3)}
+    with pytest.raises(KeyError, match="missing"):
+        compiler.compile()
+    assert not (cache_dir / "compilation_times").exists()
+
+
+def test_compile_keeps_compiled_aggregations_without_workers(
+    cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def fail(schema: dict[str, Any]) -> BICompiledRule:
+        raise AssertionError("compiled aggregation rebuilt from schema")
+
+    monkeypatch.setattr(BIAggregation, "create_trees_from_schema", fail)
+    compiler = _compiler_with_hosts(3, compilation_workers=1)
+    compiler.cleanup()
+    compiler._check_compilation_status()
+    assert len(compiler.compiled_aggregations) == 3
+
+
+_REMAINING_RULE = _rule(
+    "remaining",
+    "Remaining $HOSTNAME$",
+    [
+        {
+            "action": {"host_regex": "$HOSTNAME$", "type": "state_of_remaining_services"},
+            "search": {"type": "empty"},
+        },
+    ],
+)
+
+_DATABASES_RULE = _rule(
+    "databases",
+    "Databases",
+    [
+        {
+            "action": {"host_regex": "db.*", "service_regex": "Uptime", "type": "state_of_service"},
+            "search": {"type": "empty"},
+        },
+    ],
+)
+
+
+@pytest.fixture(name="incremental_compiler")
+def fixture_incremental_compiler(cache_dir: Path) -> _Compiler:
+    compiler = _Compiler(
+        _packs_config(
+            [
+                _aggregation("aggr0", _host_search("host0-.*")),
+                _aggregation("aggr1", _host_search("host1-.*")),
+                _aggregation("children", _host_search("switch", refer_to="child")),
+                _aggregation("databases", {"type": "empty"}, rule_id="databases"),
+                _aggregation("remaining", _host_search("db1"), rule_id="remaining"),
+            ],
+            [_HOST_RULE, _REMAINING_RULE, _DATABASES_RULE],
+        )
+    )
+    compiler.hosts = {
+        "host0-0": ((), ("Uptime",)),
+        "host1-0": ((), ("Uptime",)),
+        "host1-1": ((), ("Uptime",)),
+        "switch": (("server1",), ()),
+        "server1": ((), ("Uptime",)),
+        "db1": ((), ("Uptime",)),
+        "db2": ((), ("Disk",)),
+    }
+    assert compiler.compile() == {
+        "aggr0": ["Host host0-0"],
+        "aggr1": ["Host host1-0", "Host host1-1"],
+        "children": ["Host server1"],
+        "databases": ["Databases"],
+        "remaining": ["Remaining db1"],
+    }
+    return compiler
+
+
+def _recompile(compiler: _Compiler) -> set[str]:
+    """Compile after a change of the hosts and return the recompiled aggregations"""
+    compiler.program_start += 1
+    compiler.compile()
+    return set(
+        ast.literal_eval((cmk.bi.compiler.get_cache_dir() / "compilation_times").read_text())
+    )
+
+
+def _services(compiler: _Compiler, aggr_id: str) -> set[tuple[str, str | None]]:
+    return {
+        (element.host_name, element.service_description)
+        for branch in compiler.compiled_aggregations[aggr_id].branches
+        for element in branch.required_elements()
+    }
+
+
+def test_compile_unchanged_hosts(incremental_compiler: _Compiler) -> None:
+    assert not _recompile(incremental_compiler)
+    assert len(incremental_compiler.compiled_aggregations) == 5
+
+
+def test_compile_added_host(incremental_compiler: _Compiler) -> None:
+    incremental_compiler.hosts["host0-1"] = ((), ("Uptime",))
+    assert _recompile(incremental_compiler) == {"aggr0"}
+    assert incremental_compiler.compile()["aggr0"] == ["Host host0-0", "Host host0-1"]
+
+
+def test_compile_added_host_of_state_of_service(incremental_compiler: _Compiler) -> None:
+    incremental_compiler.hosts["db3"] = ((), ("Uptime",))
+    assert _recompile(incremental_compiler) == {"databases"}
+    assert ("db3", "Uptime") in _services(incremental_compiler, "databases")
+
+
+def test_compile_removed_host(incremental_compiler: _Compiler) -> None:
+    del incremental_compiler.hosts["host1-1"]
+    assert _recompile(incremental_compiler) == {"aggr1"}
+    assert incremental_compiler.compile()["aggr1"] == ["Host host1-0"]
+
+
+def test_compile_service_of_state_of_service_host(incremental_compiler: _Compiler) -> None:
+    incremental_compiler.hosts["db2"] = ((), ("Disk", "Uptime"))
+    assert _recompile(incremental_compiler) == {"databases"}
+    assert _services(incremental_compiler, "databases") == {("db1", "Uptime"), ("db2", "Uptime")}
+
+
+def test_compile_service_of_remaining_host(incremental_compiler: _Compiler) -> None:
+    incremental_compiler.hosts["db1"] = ((), ("Disk", "Uptime"))
+    assert _recompile(incremental_compiler) == {"databases", "remaining"}
+
+
+def test_compile_added_child(incremental_compiler: _Compiler) -> None:
+    incremental_compiler.hosts["switch"] = (("server1", "server2"), ())
+    incremental_compiler.hosts["server2"] = ((), ())
+    assert _recompile(incremental_compiler) == {"children"}
+    assert incremental_compiler.compile()["children"] == ["Host server1", "Host server2"]
+
+
+def test_compile_changed_configuration(incremental_compiler: _Compiler) -> None:
+    incremental_compiler.configfile_timestamp += 1
+    incremental_compiler.compile()
+    assert set(
+        ast.literal_eval((cmk.bi.compiler.get_cache_dir() / "compilation_times").read_text())
+    ) == set(incremental_compiler.compiled_aggregations)
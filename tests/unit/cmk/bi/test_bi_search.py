@@ -183,3 +183,41 @@ def test_service_search(
     search = BIServiceSearch(schema_config)
     results = search.execute({}, bi_searcher_with_sample_config)
     assert len(results) == expected_matches
+
+
+@pytest.mark.parametrize(
+    "changed_hosts, expected_affected",
+    [
+        pytest.param({}, False, id="Nothing changed"),
+        pytest.param({"heute_clone": None}, True, id="Found host removed"),
+        pytest.param({"heute": {"alias": "gestern_alias"}}, True, id="Found host changed"),
+        pytest.param(
+            {"morgen": {"name": "morgen", "alias": "morgen_alias"}},
+            True,
+            id="New host found by search",
+        ),
+        pytest.param(
+            {"morgen": {"name": "morgen", "tags": {("tcp", "no-tcp")}}},
+            False,
+            id="New host not found by search",
+        ),
+    ],
+)
+def test_search_dependencies(
+    bi_packs_sample_config, bi_searcher_with_sample_config, changed_hosts, expected_affected
+):
+    bi_aggregation = bi_packs_sample_config.get_aggregation("default_aggregation")
+    with bi_searcher_with_sample_config.record_dependencies() as dependencies:
+        bi_aggregation.compile(bi_searcher_with_sample_config)
+    assert dependencies.host_names == {"heute", "heute_clone"}
+
+    heute = bi_searcher_with_sample_config.hosts["heute"]
+    assert (
+        dependencies.is_affected_by(
+            {
+                host_name: None if changes is None else heute._replace(**changes)
+                for host_name, changes in changed_hosts.items()
+            }
+        )
+        is expected_affected
+    )
@@ -7,6 +7,7 @@ import copy
 import json
 import logging
 from collections.abc import Sequence
+from pathlib import Path
 
 from cmk.utils.type_defs import SectionName
 
@@ -62,6 +63,57 @@ class TestSectionStore:
             str,
         )
 
+    def test_store_and_load(self, tmp_path: Path) -> None:
+        section_store = SectionStore[AgentRawDataSection](
+            tmp_path / "section_store", logger=logging.getLogger("test")
+        )
+        sections = PersistedSections[AgentRawDataSection](
+            {SectionName("section"): (1, 2, [["first", "line"]])}
+        )
+
+        section_store.store(sections)
+
+        assert section_store.load() == sections
+        section_store.store(PersistedSections[AgentRawDataSection]({}))
+        assert not section_store.path.exists()
+
+    def test_load_text_format(self, tmp_path: Path) -> None:
+        path = tmp_path / "section_store"
+        path.write_text("{'section': (1, 2, [['first', 'line']])}\n")
+
+        assert SectionStore[AgentRawDataSection](path, logger=logging.getLogger("test")).load() == {
+            SectionName("section"): (1, 2, [["first", "line"]])
+        }
+
+    def test_store_and_load_decoded(self, tmp_path: Path) -> None:
+        section_store = SectionStore[AgentRawDataSection](
+            tmp_path / "section_store", logger=logging.getLogger("test")
+        )
+        decoded = {SectionName("section"): ("digest", [["first", "line"]])}
+
+        section_store.store_decoded(decoded)
+
+        assert section_store.load_decoded() == decoded
+        assert not section_store.path.exists()
+        section_store.store_decoded({})
+        assert not section_store.decoded_path.exists()
+
+    def test_update_does_not_rewrite_unchanged_sections(self, tmp_path: Path) -> None:
+        section_store = SectionStore[AgentRawDataSection](
+            tmp_path / "section_store", logger=logging.getLogger("test")
+        )
+        section_store.store(
+            PersistedSections[AgentRawDataSection](
+                {SectionName("section"): (1, 2, [["first", "line"]])}
+            )
+        )
+        mtime = section_store.path.stat().st_mtime_ns
+
+        sections = section_store.update({}, {}, lambda _name: None, now=1, keep_outdated=True)
+
+        assert sections == {SectionName("section"): [["first", "line"]]}
+        assert section_store.path.stat().st_mtime_ns == mtime
+
 
 class TestMaxAge:
     def test_repr(self) -> None:
@@ -515,6 +515,11 @@ class TestSNMPFetcherFetch:
             }
         )
 
+    @pytest.fixture(autouse=True)
+    def no_prefetch(self, monkeypatch: MonkeyPatch) -> None:
+        # The tables are mocked below, there is nothing to walk.
+        monkeypatch.setattr(snmp_table, "prefetch_snmp_walks", lambda **__: None)
+
     @pytest.fixture
     def fetcher(self) -> SNMPFetcher:
         return SNMPFetcher(
@@ -9,6 +9,7 @@ import copy
 import itertools
 import logging
 import time
+import unittest.mock
 from collections import defaultdict
 from collections.abc import Sequence
 
@@ -441,6 +442,41 @@ class TestAgentParser:
             }
         )
 
+    def test_unchanged_cached_sections_are_not_decoded_again(  # type: ignore[no-untyped-def]
+        self, parser, store, monkeypatch
+    ) -> None:
+        raw_data = AgentRawData(
+            b"\n".join(
+                (
+                    b"<<<cached_section:cached(1000,900)>>>",
+                    b"first line",
+                    b"<<<live_section>>>",
+                    b"second line",
+                )
+            )
+        )
+        expected = {
+            SectionName("cached_section"): [["first", "line"]],
+            SectionName("live_section"): [["second", "line"]],
+        }
+        assert parser.parse(raw_data, selection=NO_SELECTION).sections == expected
+        assert store.load_decoded() == {
+            SectionName("cached_section"): (unittest.mock.ANY, [["first", "line"]]),
+        }
+
+        parse_line = SectionMarker.parse_line
+
+        def parse_live_line(self: SectionMarker, line: bytes) -> Sequence[str]:
+            assert self.name == SectionName("live_section")
+            return parse_line(self, line)
+
+        monkeypatch.setattr(SectionMarker, "parse_line", parse_live_line)
+        assert parser.parse(raw_data, selection=NO_SELECTION).sections == expected
+
+        changed_data = AgentRawData(raw_data.replace(b"cached(1000,", b"cached(1900,"))
+        with pytest.raises(AssertionError):
+            parser.parse(changed_data, selection=NO_SELECTION)
+
     def test_persist_option_and_persisted_sections(  # type: ignore[no-untyped-def]
         self, parser, store, mocker, monkeypatch
     ) -> None:
@@ -637,6 +673,52 @@ class TestAgentParser:
         }
         assert store.load() == {}
 
+    def test_markers_in_lines_with_whitespace_and_in_content(  # type: ignore[no-untyped-def]
+        self, parser, store
+    ) -> None:
+        raw_data = AgentRawData(
+            b"\r\n".join(
+                (
+                    b"<<<a_section>>>",
+                    b"  first line <<<not a marker>>>",
+                    b"<<<not a marker either",
+                    b"",
+                    b"<<<another_section:nostrip():sep(124)>>>",
+                    b"  second| line ",
+                    b"  <<<<piggy>>>>",
+                    b"<<<piggy_section>>>",
+                    b" third line",
+                    b"<<<<>>>>",
+                    b"<<<a_section>>>",
+                    b"<<<>>>",
+                    b"ignored line",
+                )
+            )
+        )
+
+        ahs = parser.parse(raw_data, selection=NO_SELECTION)
+        assert ahs.sections == {
+            SectionName("a_section"): [
+                ["first", "line", "<<<not", "a", "marker>>>"],
+                ["<<<not", "a", "marker", "either"],
+            ],
+            SectionName("another_section"): [["  second", " line "]],
+        }
+        assert ahs.piggybacked_raw_data["piggy"][1:] == [b" third line"]
+
+    def test_unselected_sections_are_not_split(  # type: ignore[no-untyped-def]
+        self, parser, monkeypatch
+    ) -> None:
+        def parse_line(self: SectionMarker, line: bytes) -> Sequence[str]:
+            assert self.name == SectionName("a_section")
+            return line.decode().split()
+
+        monkeypatch.setattr(SectionMarker, "parse_line", parse_line)
+        raw_data = AgentRawData(b"<<<a_section>>>\nfirst line\n<<<another_section>>>\nline\n")
+
+        ahs = parser.parse(raw_data, selection={SectionName("a_section")})
+        assert ahs.sections == {SectionName("a_section"): [["first", "line"]]}
+
 
 class TestSectionMarker:
     def test_options_serialize_options(self) -> None:
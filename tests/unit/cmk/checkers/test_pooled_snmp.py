@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# Copyright (C) 2023 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import bisect
+import socket
+import threading
+import time
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+import pytest
+
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.log import logger
+from cmk.utils.type_defs import HostName
+
+from cmk.snmplib.type_defs import SNMPBackendEnum, SNMPHostConfig
+
+import cmk.fetchers.snmp_backend._ber as ber
+from cmk.fetchers.snmp import make_backend
+from cmk.fetchers.snmp_backend import ClassicSNMPBackend, PooledSNMPBackend, StoredWalkSNMPBackend
+from cmk.fetchers.snmp_backend.pooled import close_sessions
+
+_Data = Mapping[tuple[int, ...], tuple[int, bytes]]
+
+
+class _Agent:
+    """A minimal SNMP agent standing in for snmpd"""
+
+    def __init__(self, data: _Data) -> None:
+        self.data = data
+        self.oids = sorted(data)
+        self.requests = 0
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self.socket.close()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                message, peer = self.socket.recvfrom(65535)
+            except OSError:
+                return
+            self.requests += 1
+            self.socket.sendto(self._respond(memoryview(message)), peer)
+
+    def _respond(self, message: memoryview) -> bytes:
+        _tag, content, _offset = ber._read_tlv(message, 0)
+        _tag, version, offset = ber._read_tlv(content, 0)
+        _tag, community, offset = ber._read_tlv(content, offset)
+        pdu_type, pdu, _offset = ber._read_tlv(content, offset)
+        _tag, request_id, offset = ber._read_tlv(pdu, 0)
+        _tag, _non_repeaters, offset = ber._read_tlv(pdu, offset)
+        _tag, max_repetitions, offset = ber._read_tlv(pdu, offset)
+        _tag, varbind_list, _offset = ber._read_tlv(pdu, offset)
+        _tag, varbind, _offset = ber._read_tlv(varbind_list, 0)
+        _tag, raw_oid, _offset = ber._read_tlv(varbind, 0)
+        oid = ber._decode_oid(raw_oid)
+
+        if pdu_type == ber.PDUType.GET:
+            varbinds = [(oid, self.data.get(oid, (ber.ValueType.NO_SUCH_OBJECT, b"")))]
+        else:
+            count = ber._decode_integer(max_repetitions) if pdu_type == ber.PDUType.GETBULK else 1
+            index = bisect.bisect_right(self.oids, oid)
+            varbinds = [(o, self.data[o]) for o in self.oids[index : index + count]]
+            if len(varbinds) < count:
+                varbinds.append((oid, (ber.ValueType.END_OF_MIB_VIEW, b"")))
+
+        pdu_content = b"".join(
+            (
+                ber._tlv(ber.ValueType.INTEGER, bytes(request_id)),
+                ber._encode_integer(0),
+                ber._encode_integer(0),
+                ber._tlv(
+                    0x30,
+                    b"".join(
+                        ber._tlv(0x30, ber._encode_oid(o) + ber._tlv(tag, value))
+                        for o, (tag, value) in varbinds
+                    ),
+                ),
+            )
+        )
+        return ber._tlv(
+            0x30,
+            ber._tlv(ber.ValueType.INTEGER, bytes(version))
+            + ber._tlv(ber.ValueType.OCTET_STRING, bytes(community))
+            + ber._tlv(ber.PDUType.RESPONSE, pdu_content),
+        )
+
+
+_DATA: _Data = {
+    (1, 3, 6, 1, 2, 1, 1, 1, 0): (ber.ValueType.OCTET_STRING, b"Linux box"),
+    (1, 3, 6, 1, 2, 1, 1, 3, 0): (ber.ValueType.TIME_TICKS, (123456).to_bytes(3, "big")),
+    **{
+        (1, 3, 6, 1, 2, 1, 2, 2, 1, column, index): (ber.ValueType.INTEGER, bytes((index,)))
+        for column in (1, 2)
+        for index in range(1, 31)
+    },
+    (1, 3, 6, 1, 2, 1, 4, 20, 1, 1, 10, 0, 0, 1): (ber.ValueType.IP_ADDRESS, bytes((10, 0, 0, 1))),
+    (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 6, 1): (
+        ber.ValueType.COUNTER64,
+        (2**40).to_bytes(6, "big"),
+    ),
+    (1, 3, 6, 1, 2, 1, 31, 1, 1, 1, 7, 1): (ber.ValueType.INTEGER, b"\xff"),
+}
+
+
+@pytest.fixture(name="agent")
+def fixture_agent() -> Iterator[_Agent]:
+    agent = _Agent(_DATA)
+    yield agent
+    agent.close()
+    close_sessions()
+
+
+def _config(port: int, *, bulk: bool, credentials: object = "public") -> SNMPHostConfig:
+    return SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname=HostName("localhost"),
+        ipaddress="127.0.0.1",
+        credentials=credentials,  # type: ignore[arg-type]
+        port=port,
+        is_bulkwalk_host=bulk,
+        is_snmpv2or3_without_bulkwalk_host=True,
+        bulk_walk_size_of=10,
+        timing={"timeout": 0.2, "retries": 0},
+        oid_range_limits={},
+        snmpv3_contexts=[],
+        character_encoding=None,
+        snmp_backend=SNMPBackendEnum.POOLED,
+    )
+
+
+@pytest.mark.parametrize(
+    "oid, expected",
+    [
+        (".1.3.6.1.2.1.1.1.0", b"Linux box"),
+        (".1.3.6.1.2.1.1.3.0", b"123456"),
+        (".1.3.6.1.2.1.1.*", b"Linux box"),
+        (".1.3.6.1.2.1.1.2.0", None),
+        (".1.3.6.1.2.1.5.*", None),
+    ],
+)
+def test_get(agent: _Agent, oid: str, expected: bytes | None) -> None:
+    assert PooledSNMPBackend(_config(agent.port, bulk=False), logger).get(oid) == expected
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_walk(agent: _Agent, bulk: bool) -> None:
+    backend = PooledSNMPBackend(_config(agent.port, bulk=bulk), logger)
+    assert backend.walk(".1.3.6.1.2.1.2.2.1.2") == [
+        (f".1.3.6.1.2.1.2.2.1.2.{index}", str(index).encode()) for index in range(1, 31)
+    ]
+    assert agent.requests == (4 if bulk else 31)
+
+
+def test_walk_value_types(agent: _Agent) -> None:
+    backend = PooledSNMPBackend(_config(agent.port, bulk=True), logger)
+    assert backend.walk(".1.3.6.1.2.1.4.20") == [(".1.3.6.1.2.1.4.20.1.1.10.0.0.1", b"10.0.0.1")]
+    assert backend.walk(".1.3.6.1.2.1.31") == [
+        (".1.3.6.1.2.1.31.1.1.1.6.1", str(2**40).encode()),
+        (".1.3.6.1.2.1.31.1.1.1.7.1", b"-1"),
+    ]
+
+
+def test_walk_falls_back_to_get(agent: _Agent) -> None:
+    backend = PooledSNMPBackend(_config(agent.port, bulk=True), logger)
+    assert backend.walk(".1.3.6.1.2.1.1.1.0") == [(".1.3.6.1.2.1.1.1.0", b"Linux box")]
+    assert not backend.walk(".1.3.6.1.2.1.1.2.0")
+
+
+def test_session_is_reused(agent: _Agent) -> None:
+    first = PooledSNMPBackend(_config(agent.port, bulk=True), logger)
+    second = PooledSNMPBackend(_config(agent.port, bulk=True), logger)
+    assert first._session is second._session
+
+
+def test_walk_timeout() -> None:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+        silent.bind(("127.0.0.1", 0))
+        backend = PooledSNMPBackend(_config(silent.getsockname()[1], bulk=True), logger)
+        with pytest.raises(MKSNMPError):
+            backend.walk(".1.3.6.1.2.1.1")
+        assert backend.get(".1.3.6.1.2.1.1.1.0") is None
+    close_sessions()
+
+
+def test_stray_packets_do_not_extend_timeout() -> None:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as chatty:
+        chatty.bind(("127.0.0.1", 0))
+
+        def send_stray_packets() -> None:
+            _message, peer = chatty.recvfrom(65535)
+            for _packet in range(20):
+                chatty.sendto(b"stray", peer)
+                time.sleep(0.05)
+
+        sender = threading.Thread(target=send_stray_packets, daemon=True)
+        sender.start()
+        backend = PooledSNMPBackend(_config(chatty.getsockname()[1], bulk=True), logger)
+        before = time.monotonic()
+        assert backend.get(".1.3.6.1.2.1.1.1.0") is None
+        assert time.monotonic() - before < 0.5
+        sender.join()
+    close_sessions()
+
+
+# The octet strings as snmpwalk prints them, see test_octet_strings_as_classic_backend
+_OCTET_STRINGS = {
+    b"Linux box": '"Linux box"',
+    b"": '""',
+    b"  eth0 ": '"  eth0 "',
+    b"C:\\ Label:4C2E": '"C:\\\\ Label:4C2E"',
+    b'say "hi"': '"say \\"hi\\""',
+    b"AB CD ": '"AB CD "',
+    b"\x00\x1a\x2b\x3c\x4d\x5e": '"00 1A 2B 3C 4D 5E "',
+    "Düsseldorf".encode(): '"44 C3 BC 73 73 65 6C 64 6F 72 66 "',
+}
+
+
+def test_octet_strings_as_classic_backend(tmp_path: Path) -> None:
+    agent = _Agent(
+        {
+            (1, 3, 6, 1, 2, 1, 2, 2, 1, 2, index): (ber.ValueType.OCTET_STRING, raw)
+            for index, raw in enumerate(_OCTET_STRINGS, 1)
+        }
+    )
+    walk_path = tmp_path / "walk"
+    walk_path.write_text(
+        "".join(
+            f".1.3.6.1.2.1.2.2.1.2.{index} {printed}\n"
+            for index, printed in enumerate(_OCTET_STRINGS.values(), 1)
+        )
+    )
+    try:
+        pooled = PooledSNMPBackend(_config(agent.port, bulk=True), logger)
+        stored = StoredWalkSNMPBackend(_config(agent.port, bulk=True), logger, walk_path)
+        assert pooled.walk(".1.3.6.1.2.1.2.2.1.2") == stored.walk(".1.3.6.1.2.1.2.2.1.2")
+    finally:
+        agent.close()
+        close_sessions()
+
+
+def test_make_backend_uses_classic_backend_for_snmpv3() -> None:
+    config = _config(161, bulk=True, credentials=("noAuthNoPriv", "user"))
+    assert isinstance(make_backend(config, logger), ClassicSNMPBackend)
+    assert isinstance(make_backend(_config(161, bulk=True), logger), PooledSNMPBackend)
+
+
+@pytest.mark.parametrize(
+    "oid",
+    [
+        (1, 3, 6, 1, 2, 1, 1, 1, 0),
+        (1, 3, 6, 1, 4, 1, 311, 2**31 - 1, 16383),
+        (2, 100, 3),
+    ],
+)
+def test_ber_oid_roundtrip(oid: tuple[int, ...]) -> None:
+    _tag, payload, _offset = ber._read_tlv(memoryview(ber._encode_oid(oid)), 0)
+    assert ber._decode_oid(payload) == oid
+
+
+@pytest.mark.parametrize(
+    "oid, encoded",
+    [
+        ((1, 3, 6, 1), b"\x06\x03\x2b\x06\x01"),
+        # The first subidentifier 2 * 40 + 100 takes two bytes (X.690, 8.19.5)
+        ((2, 100, 3), b"\x06\x03\x81\x34\x03"),
+    ],
+)
+def test_ber_oid_encoding(oid: tuple[int, ...], encoded: bytes) -> None:
+    assert ber._encode_oid(oid) == encoded
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 255, 256, 2**31 - 1, -1, -129])
+def test_ber_integer_roundtrip(value: int) -> None:
+    _tag, payload, _offset = ber._read_tlv(memoryview(ber._encode_integer(value)), 0)
+    assert ber._decode_integer(payload) == value
@@ -3,11 +3,35 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import logging
+import os
+from pathlib import Path
+
 import pytest
 
+from cmk.utils.type_defs import HostName
+
+from cmk.snmplib.type_defs import SNMPBackendEnum, SNMPHostConfig
+
 import cmk.fetchers.snmp_backend._utils as utils
 from cmk.fetchers.snmp_backend import StoredWalkSNMPBackend
 
+SNMP_CONFIG = SNMPHostConfig(
+    is_ipv6_primary=False,
+    hostname=HostName("unittest"),
+    ipaddress="127.0.0.1",
+    credentials="public",
+    port=161,
+    is_bulkwalk_host=False,
+    is_snmpv2or3_without_bulkwalk_host=False,
+    bulk_walk_size_of=10,
+    timing={},
+    oid_range_limits={},
+    snmpv3_contexts=[],
+    character_encoding=None,
+    snmp_backend=SNMPBackendEnum.STORED_WALK,
+)
+
 
 @pytest.mark.parametrize(
     "value,expected",
@@ -24,21 +48,6 @@ def test_strip_snmp_value(value, expected) -> None:  # type: ignore[no-untyped-d
 
 @pytest.mark.usefixtures("create_files")
 class TestStoredWalkSNMPBackend:
-    @pytest.mark.parametrize(
-        "a, b, result",
-        [
-            ("1.2.3", "1.2.3", 0),
-            ("1.2.3", ".1.2.3", 0),
-            (".1.2.3", "1.2.3", 0),
-            (".1.2.3", ".1.2.3", 0),
-            ("1.2.3", "1.2.3.4", 0),
-            ("1.2.3.4", "1.2.3", 1),
-            ("1.2.3", "4.5.6", -1),
-        ],
-    )
-    def test_compare_oids(self, a, b, result) -> None:  # type: ignore[no-untyped-def]
-        assert StoredWalkSNMPBackend._compare_oids(a, b) == result
-
     def test_read_walk_data(self, tmpdir) -> None:  # type: ignore[no-untyped-def]
         assert StoredWalkSNMPBackend.read_walk_from_path(tmpdir / "walkdata" / "1.txt") == [
             ".1.2.3 foo\n",
@@ -49,6 +58,43 @@ class TestStoredWalkSNMPBackend:
             ".1.2.5 test\n",
         ]
 
+    @pytest.mark.parametrize(
+        "oid, expected",
+        [
+            (".1.2.3", [(".1.2.3", b"foo")]),
+            ("1.2", [(".1.2.3", b"foo"), (".1.2.5", b"test"), (".1.2.10.1", b"\xb2\xe0")]),
+            (".1.2.*", [(".1.2.3", b"foo")]),
+            (".1.2.10", [(".1.2.10.1", b"\xb2\xe0")]),
+            (".1.2.1", []),
+            (".1.3", []),
+        ],
+    )
+    def test_walk(  # type: ignore[no-untyped-def]
+        self, tmpdir, oid: str, expected: list[tuple[str, bytes]]
+    ) -> None:
+        backend = StoredWalkSNMPBackend(
+            SNMP_CONFIG, logging.getLogger("test"), Path(tmpdir / "walkdata" / "3.txt")
+        )
+        assert backend.walk(oid) == expected
+
+    def test_get(self, tmpdir) -> None:  # type: ignore[no-untyped-def]
+        backend = StoredWalkSNMPBackend(
+            SNMP_CONFIG, logging.getLogger("test"), Path(tmpdir / "walkdata" / "3.txt")
+        )
+        assert backend.get(".1.2.5") == b"test"
+        assert backend.get(".1.2.*") == b"foo"
+        assert backend.get(".1.2") is None
+
+    def test_walk_after_change_of_walk_file(self, tmpdir) -> None:  # type: ignore[no-untyped-def]
+        path = Path(tmpdir / "walkdata" / "1.txt")
+        backend = StoredWalkSNMPBackend(SNMP_CONFIG, logging.getLogger("test"), path)
+        assert backend.walk(".1.2.4") == [(".1.2.4", b"bar\nfoobar")]
+
+        path.write_text(".1.2.4 baz\n")
+        os.utime(path, ns=(0, 0))
+        assert backend.walk(".1.2.4") == [(".1.2.4", b"baz")]
+        assert backend.walk(".1.2.3") == []
+
 
 @pytest.fixture
 def create_files(tmpdir):
@@ -57,3 +103,5 @@ def create_files(tmpdir):
     p1.write(".1.2.3 foo\n.1.2.4 bar\nfoobar\n")
     p2 = (tmpdir / "walkdata").join("2.txt")
     p2.write(".1.2.3 foo\n\n\n.1.2.5 test\n")
+    p3 = (tmpdir / "walkdata").join("3.txt")
+    p3.write('.1.2.3 foo\n.1.2.5 "test"\n.1.2.10.1 "B2 E0 "\n')
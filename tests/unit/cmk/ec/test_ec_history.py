@@ -5,9 +5,27 @@
 """EC History methods"""
 import logging
 import shlex
+import time
+from collections.abc import Iterator
 from pathlib import Path
 
-from cmk.ec.history import _grep_pipeline, convert_history_line, History, parse_history_file
+import pytest
+
+from tests.testlib import CMKEventConsole
+
+import cmk.ec.history
+from cmk.ec.config import Config
+from cmk.ec.history import (
+    _grep_pipeline,
+    _history_period,
+    _write_files,
+    convert_history_line,
+    History,
+    parse_history_file,
+)
+from cmk.ec.main import StatusServer, StatusTableEvents, StatusTableHistory
+from cmk.ec.query import QueryGET
+from cmk.ec.settings import Settings
 
 
 def test_convert_history_line(history: History) -> None:
@@ -52,3 +70,167 @@ def test_history_parse(history: History, tmp_path: Path) -> None:
 
     assert len(new_entries) == 4
     assert new_entries[0][1] == 1666942292.3000507
+
+
+@pytest.fixture(name="sqlite_history")
+def fixture_sqlite_history(settings: Settings, config: Config) -> Iterator[History]:
+    history = History(
+        settings,
+        {**config, "archive_mode": "sqlite"},
+        logging.getLogger("cmk.mkeventd"),
+        StatusTableEvents.columns,
+        StatusTableHistory.columns,
+    )
+    yield history
+    history.close()
+    settings.paths.history_db.value.unlink()
+
+
+def _query(status_server: StatusServer, *headers: str) -> QueryGET:
+    return QueryGET(status_server, ["GET history", *headers], logging.getLogger("cmk.mkeventd"))
+
+
+def _add_events(history: History) -> None:
+    for event_id, host in enumerate(["abc", "ABC", "def", "abc"], start=1):
+        history.add(
+            CMKEventConsole.new_event({"id": event_id, "host": host, "rule_id": f"r{event_id}"}),
+            "NEW",
+        )
+
+
+def test_sqlite_history_get(sqlite_history: History, status_server: StatusServer) -> None:
+    _add_events(sqlite_history)
+
+    entries = list(sqlite_history.get(_query(status_server)))
+    assert [e[5] for e in entries] == [4, 3, 2, 1]
+    assert entries[0][0] == 4  # history_line
+    assert entries[0][2] == "NEW"
+    assert entries[0][12] == "abc"
+
+    assert [
+        e[5] for e in sqlite_history.get(_query(status_server, "Filter: event_host = abc"))
+    ] == [
+        4,
+        1,
+    ]
+    assert [
+        e[5] for e in sqlite_history.get(_query(status_server, "Filter: event_host in ABC xyz"))
+    ] == [4, 2, 1]
+    assert [
+        e[5]
+        for e in sqlite_history.get(
+            _query(status_server, "Filter: event_id >= 2", "Filter: event_text ~ ^$")
+        )
+    ] == [4, 3, 2]
+    assert [e[5] for e in sqlite_history.get(_query(status_server, "Limit: 1"))] == [4, 3]
+
+
+def test_sqlite_history_housekeeping(sqlite_history: History, status_server: StatusServer) -> None:
+    _add_events(sqlite_history)
+    assert sqlite_history._sqlite.connection is not None
+    sqlite_history._sqlite.connection.execute("UPDATE history SET time = 0 WHERE event_id < 3")
+
+    sqlite_history.housekeeping()
+
+    assert [e[5] for e in sqlite_history.get(_query(status_server))] == [4, 3]
+
+
+def test_sqlite_history_migrates_files(
+    settings: Settings, config: Config, status_server: StatusServer
+) -> None:
+    history = History(
+        settings,
+        config,
+        logging.getLogger("cmk.mkeventd"),
+        StatusTableEvents.columns,
+        StatusTableHistory.columns,
+    )
+    _add_events(history)
+
+    history.reload_configuration({**config, "archive_mode": "sqlite"})
+    history.reload_configuration({**config, "archive_mode": "sqlite"})  # imports only once
+    try:
+        assert [e[5] for e in history.get(_query(status_server, "Filter: event_host = abc"))] == [
+            4,
+            1,
+        ]
+    finally:
+        history.close()
+        settings.paths.history_db.value.unlink()
+        for path in settings.paths.history_dir.value.glob("*.log"):
+            path.unlink()
+
+
+@pytest.fixture(name="file_history")
+def fixture_file_history(settings: Settings, config: Config) -> Iterator[History]:
+    history = History(
+        settings,
+        config,
+        logging.getLogger("cmk.mkeventd"),
+        StatusTableEvents.columns,
+        StatusTableHistory.columns,
+    )
+    yield history
+    history.close()
+    for path in settings.paths.history_dir.value.glob("*.log"):
+        path.unlink()
+
+
+def test_file_history_get_sees_queued_entries(
+    file_history: History, status_server: StatusServer
+) -> None:
+    with file_history._lock:  # keeps the writer from writing
+        _add_events(file_history)
+        assert file_history.queue_length() > 0
+
+    assert [e[5] for e in file_history.get(_query(status_server))] == [4, 3, 2, 1]
+    assert file_history.queue_length() == 0
+
+
+def test_file_history_close_writes_queued_entries(
+    file_history: History, settings: Settings
+) -> None:
+    with file_history._lock:
+        _add_events(file_history)
+    file_history.close()
+
+    (path,) = settings.paths.history_dir.value.glob("*.log")
+    assert [line.split("\t")[4] for line in path.read_text().splitlines()] == ["1", "2", "3", "4"]
+
+
+def test_file_history_fsync(
+    file_history: History, config: Config, status_server: StatusServer
+) -> None:
+    file_history.reload_configuration({**config, "history_fsync": True})
+    _add_events(file_history)
+    assert [e[5] for e in file_history.get(_query(status_server))] == [4, 3, 2, 1]
+
+
+def test_file_history_flush_drops_queued_entries(
+    file_history: History, status_server: StatusServer
+) -> None:
+    with file_history._lock:
+        _add_events(file_history)
+    file_history.flush()
+    assert not list(file_history.get(_query(status_server)))
+
+
+def test_file_history_get_waits_bounded(
+    file_history: History, status_server: StatusServer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(cmk.ec.history, "_FILE_WRITER_DRAIN_TIMEOUT", 0.1)
+    with file_history._lock:
+        _add_events(file_history)
+        assert not list(file_history.get(_query(status_server)))
+
+
+def test_file_history_uses_period_of_entry(
+    file_history: History, config: Config, settings: Settings
+) -> None:
+    now = time.time()
+    last_week = now - 8 * 86400
+    _write_files(file_history, [b"%f\tNEW" % last_week, b"%f\tNEW" % now])
+    assert sorted(path.name for path in settings.paths.history_dir.value.glob("*.log")) == [
+        f"{_history_period(config, last_week)}.log",
+        f"{_history_period(config, now)}.log",
+    ]
@@ -4,6 +4,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import time
+from typing import Any
 
 import pytest
 
@@ -12,7 +13,7 @@ from tests.testlib import CMKEventConsole
 from tests.unit.cmk.ec.helpers import FakeStatusSocket
 
 from cmk.ec.config import ConfigFromWATO
-from cmk.ec.main import Event, EventStatus, StatusServer
+from cmk.ec.main import Event, EventServer, EventStatus, StatusServer
 
 
 def test_handle_client(status_server: StatusServer) -> None:
@@ -129,3 +130,86 @@ def test_mkevent_query_filters(
     status_server.handle_client(status_socket, True, "127.0.0.1")
     response = status_socket.get_response()
     assert (len(response) == 2) is is_match
+
+
+def _count(**separate: bool) -> dict[str, Any]:
+    return {
+        "count": 3,
+        "count_ack": False,
+        "separate_host": False,
+        "separate_application": False,
+        "separate_match_groups": False,
+        **separate,
+    }
+
+
+def _counted_event(host: str, match_groups: tuple[str, ...] = ()) -> Event:
+    return CMKEventConsole.new_event(
+        {
+            "host": host,
+            "core_host": "",
+            "host_in_downtime": False,
+            "phase": "counting",
+            "match_groups": match_groups,
+        }
+    )
+
+
+def test_count_event_separate_host(event_status: EventStatus, event_server: EventServer) -> None:
+    for host in ("abc", "def"):
+        event_status.new_event(_counted_event(host))
+
+    event_status.count_event(event_server, _counted_event("def"), "815", _count(separate_host=True))
+
+    assert [(e["host"], e["count"]) for e in event_status.events()] == [("abc", 1), ("def", 2)]
+
+
+def test_count_event_separate_match_groups(
+    event_status: EventStatus, event_server: EventServer
+) -> None:
+    for groups in (("1",), ("2",)):
+        event_status.new_event(_counted_event("abc", groups))
+
+    event_status.count_event(
+        event_server, _counted_event("abc", ("2",)), "815", _count(separate_match_groups=True)
+    )
+
+    assert [(e["match_groups"], e["count"]) for e in event_status.events()] == [
+        (("1",), 1),
+        (("2",), 2),
+    ]
+
+
+def test_count_event_reindexes_changed_host(
+    event_status: EventStatus, event_server: EventServer
+) -> None:
+    event_status.new_event(_counted_event("abc"))
+    event_status.new_event(_counted_event("def"))
+
+    # Without separate hosts the oldest event is counted and takes over the host...
+    event_status.count_event(event_server, _counted_event("def"), "815", _count())
+    # ...so it is the first candidate for that host now.
+    found = event_status.count_event(
+        event_server, _counted_event("def"), "815", _count(separate_host=True)
+    )
+
+    assert found is not None
+    assert found["id"] == 1
+    assert [(e["host"], e["count"]) for e in event_status.events()] == [("def", 3), ("def", 1)]
+
+
+def test_cancel_events(event_status: EventStatus, event_server: EventServer) -> None:
+    for host in ("abc", "def", "abc"):
+        event_status.new_event(_counted_event(host))
+
+    event_status.cancel_events(
+        event_server,
+        [],
+        _counted_event("abc"),
+        {"match_groups_message_ok": ()},
+        {"id": "815"},
+    )
+
+    assert [e["host"] for e in event_status.events()] == ["def"]
+    event_status.new_event(_counted_event("abc"))
+    assert [e["id"] for e in event_status.events()] == [2, 4]
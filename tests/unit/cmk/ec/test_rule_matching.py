@@ -3,18 +3,24 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import random
+from collections.abc import Sequence
+from typing import Any, cast
+
 import pytest
 
 from livestatus import SiteId
 
 from cmk.ec.main import Event, EventServer, MatchGroups
 from cmk.ec.rule_matcher import (
+    _required_literal,
     MatchFailure,
     MatchPriority,
     MatchResult,
     MatchSuccess,
     Rule,
     RuleMatcher,
+    RulePrefilter,
     TextMatchResult,
 )
 
@@ -417,3 +423,136 @@ def test_match_ipaddress(result: MatchResult, rule: Rule, event: Event) -> None:
 def test_match_facility(result: MatchResult, rule: Rule, event: Event) -> None:
     m = RuleMatcher(None, SiteId("test_site"), lambda time_period_name: True)
     assert m.event_rule_matches_facility(rule, event) == result
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("Foo Bar", ("foo bar", False)),
+        ("error\\.log+", ("error.log", True)),
+        ("ab?cd", ("cd", True)),
+        ("a{2,3}bcd", ("bcd", True)),
+        ("[\\]abc]def", ("def", True)),
+        ("^kernel: (oom|panic) in (\\w+)", ("kernel: ", True)),
+        ("Failed password for (?:invalid user )?(\\S+) from", ("failed password for ", True)),
+        ("x(abc)?yz", ("yz", True)),
+        ("ab|cd", None),
+        ("(?x)ab cd", None),
+        ("\\d+$", None),
+        ("x\\x41dministrator", None),
+        ("error\\012code", None),
+        ("\\N{LATIN SMALL LETTER A}dmin", None),
+        ("disk\\-full", ("disk-full", True)),
+    ],
+)
+def test_required_literal(pattern: str, expected: tuple[str, bool] | None) -> None:
+    assert _required_literal(EventServer._compile_matching_value("match", pattern)) == expected
+
+
+def _synthetic_rules(count: int) -> list[Rule]:
+    rules: list[Rule] = []
+    for nr in range(count):
+        rule: dict[str, Any] = {"id": f"rule_{nr}", "pack": f"pack_{nr // 100}"}
+        match nr % 7:
+            case 0:
+                rule["match"] = f"error code {nr}"
+            case 1:
+                rule["match"] = f"Failed password for (\\w+) from 10\\.0\\.\\d+\\.\\d+ port {nr}$"
+            case 2:
+                rule["match_host"] = f"host{nr % 300:03d}"
+                rule["match"] = "temperature"
+            case 3:
+                rule["match_application"] = f"app{nr}"
+            case 4:
+                rule["match"] = f"(disk|fs) {nr} (full|exceeded)"
+            case 5:
+                rule["match"] = f"link {nr} down"
+                rule["match_ok"] = f"link {nr} (up|restored)"
+            case 6:
+                rule["match"] = f"service {nr} stopped"
+                rule["invert_matching"] = nr % 2 == 0
+        for key in ("match", "match_ok", "match_host", "match_application"):
+            if key in rule:
+                rule[key] = EventServer._compile_matching_value(key, rule[key])
+        rules.append(cast(Rule, rule))
+    return rules
+
+
+def _synthetic_syslog(count: int, rule_count: int) -> list[Event]:
+    rnd = random.Random(4711)
+    templates = [
+        "error code {nr} on /dev/sda",
+        "Failed password for root from 10.0.3.4 port {nr}",
+        "temperature of sensor {nr} too high",
+        "disk {nr} full",
+        "fs {nr} exceeded for user ſam",
+        "link {nr} down",
+        "link {nr} restored",
+        "service {nr} stopped",
+        "Accepted publickey for backup from 10.0.0.{nr} port 22",
+        "pam_unix(cron:session): session opened for user root",
+    ]
+    return [
+        {
+            "host": f"HOST{rnd.randrange(400):03d}",
+            "ipaddress": "10.0.0.1",
+            "facility": 1,
+            "priority": 5,
+            "application": rnd.choice(
+                ["sshd", "kernel", "CRON", f"app{rnd.randrange(rule_count)}"]
+            ),
+            "text": rnd.choice(templates).format(nr=rnd.randrange(rule_count)),
+        }
+        for _nr in range(count)
+    ]
+
+
+def _matching_rules(matcher: RuleMatcher, rules: Sequence[Rule], event: Event) -> list[str]:
+    return [
+        rule["id"]
+        for rule in rules
+        if isinstance(matcher.event_rule_matches(rule, event), MatchSuccess)
+    ]
+
+
+def test_rule_prefilter_keeps_matching_rules() -> None:
+    m = RuleMatcher(None, SiteId("test_site"), lambda time_period_name: True)
+    rules = _synthetic_rules(140)
+    prefilter = RulePrefilter(rules)
+
+    for event in _synthetic_syslog(200, 140):
+        candidates = prefilter.candidates(event)
+        assert _matching_rules(m, candidates, event) == _matching_rules(m, rules, event)
+        assert [rule["id"] for rule in candidates] == sorted(
+            (rule["id"] for rule in candidates), key=lambda rule_id: int(rule_id[5:])
+        )
+
+
+@pytest.mark.parametrize(
+    "rule, event_text",
+    [
+        ({"match_ok": "recovered"}, "disk failure"),
+        ({"match": "", "match_ok": "recovered"}, "disk failure"),
+        ({"match": "x\\x41dministrator"}, "xAdministrator logged in"),
+    ],
+)
+def test_rule_prefilter_keeps_rule_without_literal(rule: dict[str, str], event_text: str) -> None:
+    m = RuleMatcher(None, SiteId("test_site"), lambda time_period_name: True)
+    compiled = cast(
+        Rule,
+        {"id": "rule", "pack": "pack"}
+        | {key: EventServer._compile_matching_value(key, value) for key, value in rule.items()},
+    )
+    event = _synthetic_syslog(1, 1)[0] | {"text": event_text}
+    assert isinstance(m.event_rule_matches(compiled, event), MatchSuccess)
+    assert RulePrefilter([compiled]).candidates(event) == [compiled]
+
+
+def test_rule_prefilter_skips_most_rules() -> None:
+    rules = _synthetic_rules(700)
+    prefilter = RulePrefilter(rules)
+    events = _synthetic_syslog(50, 700)
+
+    # The rules left to evaluate per event, instead of the time taken for it
+    evaluated = sum(len(prefilter.candidates(event)) for event in events)
+    assert evaluated * 3 < len(rules) * len(events)
@@ -86,6 +86,7 @@ def test_registered_configvars() -> None:
         "apache_process_tuning",
         "archive_orphans",
         "auth_by_http_header",
+        "bi_compilation_workers",
         "builtin_icon_visibility",
         "bulk_discovery_default_settings",
         "check_mk_perfdata_with_times",
@@ -106,6 +107,7 @@ def test_registered_configvars() -> None:
         "eventsocket_queue_len",
         "failed_notification_horizon",
         "hard_query_limit",
+        "history_fsync",
         "history_lifetime",
         "history_rotation",
         "hostname_translation",
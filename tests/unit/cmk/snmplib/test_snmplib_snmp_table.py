@@ -20,6 +20,7 @@ from cmk.snmplib.type_defs import (
     SNMPBackend,
     SNMPBackendEnum,
     SNMPHostConfig,
+    SNMPRowInfo,
     SNMPTable,
     SpecialColumn,
 )
@@ -97,6 +98,112 @@ def test_get_snmp_table(
     assert get_all_snmp_tables(snmp_info) == expected_values
 
 
+@pytest.mark.parametrize(
+    "fetchoids, expected",
+    [
+        ([], {}),
+        ([".1.2.3", ".1.2.3"], {".1.2.3": [".1.2.3"]}),
+        (
+            [".1.2.3.4", ".1.2.3", ".1.2.30", ".1.2.3.4.5"],
+            {".1.2.3": [".1.2.3", ".1.2.3.4", ".1.2.3.4.5"], ".1.2.30": [".1.2.30"]},
+        ),
+        ([".1.2.10", ".1.2.9"], {".1.2.9": [".1.2.9"], ".1.2.10": [".1.2.10"]}),
+        # Sibling columns of a table are walked on their own
+        ([".1.2.3.1", ".1.2.3.2"], {".1.2.3.1": [".1.2.3.1"], ".1.2.3.2": [".1.2.3.2"]}),
+    ],
+)
+def test_plan_walks(fetchoids: list[str], expected: dict[str, list[str]]) -> None:
+    assert snmp_table.plan_walks(fetchoids) == expected
+
+
+class _RecordingBackend(SNMPTestBackend):
+    def __init__(self) -> None:
+        super().__init__(SNMPConfig, logger)
+        self.walked: list[str] = []
+
+    def walk(self, oid, section_name=None, table_base_oid=None, context_name=None):
+        self.walked.append(oid)
+        return [(f"{oid}.{column}.{row}", b"%d" % row) for column in (1, 2, 3) for row in (1, 2)]
+
+
+def test_prefetch_snmp_walks_coalesces_sections() -> None:
+    backend = _RecordingBackend()
+    walk_cache: dict[str, tuple[bool, SNMPRowInfo]] = {}
+    trees = {
+        SectionName("wide"): [
+            BackendSNMPTree(
+                base=".1.2",
+                oids=[
+                    BackendOIDSpec("3", "string", False),
+                    BackendOIDSpec(SpecialColumn.END, "string", False),
+                ],
+            )
+        ],
+        SectionName("narrow"): [
+            BackendSNMPTree(
+                base=".1.2.3",
+                oids=[BackendOIDSpec("2", "string", True), BackendOIDSpec("3", "string", False)],
+            )
+        ],
+    }
+
+    snmp_table.prefetch_snmp_walks(trees=trees, walk_cache=walk_cache, backend=backend)
+
+    assert backend.walked == [".1.2.3"]
+    assert walk_cache[".1.2.3.2"] == (True, [(".1.2.3.2.1", b"1"), (".1.2.3.2.2", b"2")])
+    assert walk_cache[".1.2.3.3"] == (False, [(".1.2.3.3.1", b"1"), (".1.2.3.3.2", b"2")])
+
+    tables = [
+        snmp_table.get_snmp_table(
+            section_name=section_name, tree=tree, walk_cache=walk_cache, backend=backend
+        )
+        for section_name, section_trees in trees.items()
+        for tree in section_trees
+    ]
+    assert backend.walked == [".1.2.3"]
+    assert tables[1] == [["1", "1"], ["2", "2"]]
+
+
+def test_prefetch_snmp_walks_caches_only_if_all_sections_agree() -> None:
+    walk_cache: dict[str, tuple[bool, SNMPRowInfo]] = {}
+    snmp_table.prefetch_snmp_walks(
+        trees={
+            SectionName("cached"): [
+                BackendSNMPTree(
+                    base=".1.2",
+                    oids=[BackendOIDSpec("3", "string", True), BackendOIDSpec("4", "string", True)],
+                )
+            ],
+            SectionName("live"): [
+                BackendSNMPTree(base=".1.2", oids=[BackendOIDSpec("3", "string", False)])
+            ],
+        },
+        walk_cache=walk_cache,
+        backend=_RecordingBackend(),
+    )
+    assert walk_cache[".1.2.3"][0] is False
+    assert walk_cache[".1.2.4"][0] is True
+
+
+def test_prefetch_snmp_walks_skips_cached_and_limited_sections() -> None:
+    backend = _RecordingBackend()
+    backend.config = SNMPConfig._replace(oid_range_limits={SectionName("limited"): [("first", 1)]})
+    walk_cache: dict[str, tuple[bool, SNMPRowInfo]] = {".1.2.3": (False, [])}
+    snmp_table.prefetch_snmp_walks(
+        trees={
+            SectionName("cached"): [
+                BackendSNMPTree(base=".1.2", oids=[BackendOIDSpec("3", "string", False)])
+            ],
+            SectionName("limited"): [
+                BackendSNMPTree(base=".1.2", oids=[BackendOIDSpec("4", "string", False)])
+            ],
+        },
+        walk_cache=walk_cache,
+        backend=backend,
+    )
+    assert not backend.walked
+
+
 @pytest.mark.parametrize(
     "encoding,columns,expected",
     [
@@ -14,6 +14,7 @@ from tests.testlib.base import Scenario
 
 import cmk.utils.paths
 from cmk.utils.rulesets.ruleset_matcher import (
+    _MAX_INDEXED_HOSTS,
     matches_tag_condition,
     RuleConditionsSpec,
     RulesetMatchObject,
@@ -175,6 +176,55 @@ def test_ruleset_matcher_get_host_ruleset_values_labels(
     )
 
 
+@pytest.mark.parametrize(
+    "condition,expected_result",
+    [
+        pytest.param({"host_labels": {"os": "linux"}}, {"host1", "host2"}, id="label"),
+        pytest.param(
+            {"host_labels": {"os": "linux", "abc": {"$ne": "xä"}}}, {"host2"}, id="negated label"
+        ),
+        pytest.param({"host_labels": {"os": {"$ne": "linux"}}}, {"host3"}, id="missing label"),
+        pytest.param({"host_labels": {"os": "windows"}}, set(), id="unknown label"),
+        pytest.param(
+            {"host_labels": {"os": "linux"}, "host_name": ["host2", "host3"]},
+            {"host2"},
+            id="label and host name",
+        ),
+        pytest.param(
+            {"host_labels": {"os": "linux"}, "host_name": {"$nor": ["host2"]}},
+            {"host1"},
+            id="label and negated host name",
+        ),
+        pytest.param(
+            {"host_labels": {"os": "linux"}, "host_tags": {TagGroupID("criticality"): "test"}},
+            {"host1"},
+            id="label and tag",
+        ),
+    ],
+)
+def test_ruleset_optimizer_all_matching_hosts_labels(
+    monkeypatch: MonkeyPatch, condition: RuleConditionsSpec, expected_result: set[str]
+) -> None:
+    ts = Scenario()
+    ts.add_host(
+        HostName("host1"),
+        tags={TagGroupID("criticality"): "test"},
+        labels={"os": "linux", "abc": "xä"},
+    )
+    ts.add_host(HostName("host2"), labels={"os": "linux"})
+    ts.add_host(HostName("host3"))
+    ruleset_optimizer = ts.apply(monkeypatch).ruleset_matcher.ruleset_optimizer
+
+    assert (
+        ruleset_optimizer._all_matching_hosts(condition, with_foreign_hosts=False)
+        == expected_result
+    )
+
+    ruleset_optimizer.clear_caches()
+    assert not ruleset_optimizer._hosts_by_label
+    assert not ruleset_optimizer._label_indexed_hosts
+
+
 def test_labels_of_service(monkeypatch: MonkeyPatch) -> None:
     test_host = HostName("test-host")
     xyz_host = HostName("xyz")
@@ -816,16 +866,131 @@ def test_ruleset_matcher_get_service_ruleset_values_labels(
     )
 
 
+service_description_ruleset: Sequence[RuleSpec[str]] = [
+    {
+        "id": "id0",
+        "value": "cpu",
+        "condition": {"service_description": [{"$regex": "CPU"}, {"$regex": "Load$"}]},
+        "options": {},
+    },
+    {
+        "id": "id1",
+        "value": "not_cpu",
+        "condition": {"service_description": {"$nor": [{"$regex": "CPU"}]}},
+        "options": {},
+    },
+    {
+        "id": "id2",
+        "value": "host2_fs",
+        "condition": {
+            "host_name": ["host2"],
+            "service_description": [{"$regex": "Filesystem"}],
+        },
+        "options": {},
+    },
+    {
+        "id": "id3",
+        "value": "interface",
+        "condition": {"service_description": [{"$regex": "Interface \\d+$"}]},
+        "options": {},
+    },
+]
+
+
+@pytest.mark.parametrize(
+    "hostname,service_description,expected_result",
+    [
+        (HostName("host1"), "CPU utilization", ["cpu"]),
+        (HostName("host1"), "CPU load", ["cpu"]),
+        (HostName("host1"), "Filesystem /", ["not_cpu"]),
+        (HostName("host2"), "Filesystem /", ["not_cpu", "host2_fs"]),
+        (HostName("host2"), "Interface 2", ["not_cpu", "interface"]),
+        (HostName("host2"), "Interface eth0", ["not_cpu"]),
+        (HostName("host3"), "CPU load", []),
+    ],
+)
+def test_ruleset_matcher_get_service_ruleset_values_description(
+    monkeypatch: MonkeyPatch,
+    hostname: HostName,
+    service_description: str,
+    expected_result: Sequence[str],
+) -> None:
+    ts = Scenario()
+    ts.add_host(HostName("host1"))
+    ts.add_host(HostName("host2"))
+    matcher = ts.apply(monkeypatch).ruleset_matcher
+
+    for _repetition in range(2):
+        assert (
+            list(
+                matcher.get_service_ruleset_values(
+                    RulesetMatchObject(hostname, ServiceName(service_description)),
+                    ruleset=service_description_ruleset,
+                    is_binary=False,
+                )
+            )
+            == expected_result
+        )
+
+
+def test_ruleset_matcher_get_service_ruleset_values_backreferences(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    ts = Scenario()
+    ts.add_host(HostName("host1"))
+    matcher = ts.apply(monkeypatch).ruleset_matcher
+    backreference_ruleset: Sequence[RuleSpec[str]] = [
+        {
+            "id": "id0",
+            "value": "A",
+            "condition": {"service_description": [{"$regex": "(x)\\1"}]},
+            "options": {},
+        },
+        {
+            "id": "id1",
+            "value": "B",
+            "condition": {"service_description": [{"$regex": "(y)\\1"}]},
+            "options": {},
+        },
+    ]
+
+    assert list(
+        matcher.get_service_ruleset_values(
+            RulesetMatchObject(HostName("host1"), ServiceName("yy")),
+            ruleset=backreference_ruleset,
+            is_binary=False,
+        )
+    ) == ["B"]
+
+
+def test_service_ruleset_index_is_bounded(monkeypatch: MonkeyPatch) -> None:
+    ts = Scenario()
+    for host_index in range(_MAX_INDEXED_HOSTS + 10):
+        ts.add_host(HostName(f"host{host_index}"))
+    ruleset_optimizer = ts.apply(monkeypatch).ruleset_matcher.ruleset_optimizer
+    index = ruleset_optimizer.get_service_ruleset_index(service_description_ruleset, False)
+
+    for host_index in range(_MAX_INDEXED_HOSTS + 10):
+        index.rules_of_host(HostName(f"host{host_index}"))
+
+    assert len(index._hosts) == _MAX_INDEXED_HOSTS
+    assert HostName("host0") not in index._hosts
+    # host2 has its own filesystem rule, all other hosts share the combined pattern
+    assert len(index._combined_patterns) == 2
+    assert ruleset_optimizer.get_service_ruleset_index(service_description_ruleset, False) is index
+
+
 def test_ruleset_optimizer_clear_ruleset_caches(monkeypatch: MonkeyPatch) -> None:
     config_cache = Scenario().apply(monkeypatch)
     ruleset_optimizer = config_cache.ruleset_matcher.ruleset_optimizer
-    ruleset_optimizer.get_service_ruleset(ruleset, False)
+    ruleset_optimizer.get_service_ruleset_index(ruleset, False)
     ruleset_optimizer.get_host_ruleset(ruleset, False, False)
     assert ruleset_optimizer._host_ruleset_cache
     assert ruleset_optimizer._service_ruleset_cache
     ruleset_optimizer.clear_ruleset_caches()
     assert not ruleset_optimizer._host_ruleset_cache
     assert not ruleset_optimizer._service_ruleset_cache
+    assert not ruleset_optimizer._service_ruleset_index_cache
 
 
 @pytest.mark.parametrize(
@@ -3,7 +3,9 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import ast
 import gzip
+import os
 import shutil
 from collections.abc import Iterable, Mapping, Sequence
 from pathlib import Path
@@ -16,6 +18,7 @@ from tests.testlib import cmk_path
 from cmk.utils.structured_data import (
     Attributes,
     DeltaStructuredDataNode,
+    load_tree,
     make_filter,
     parse_visible_raw_path,
     RetentionIntervals,
@@ -23,6 +26,7 @@ from cmk.utils.structured_data import (
     StructuredDataNode,
     Table,
     TableRetentions,
+    TreeOrArchiveStore,
     TreeStore,
 )
 from cmk.utils.type_defs import HostName
@@ -606,7 +610,73 @@ def test_real_save_gzip(tmp_path: Path) -> None:
     assert gzip_filepath.exists()
 
     with gzip.open(str(gzip_filepath), "rb") as f:
-        f.read()
+        assert f.read() == target.read_bytes()
+
+    assert not (tmp_path / "inventory" / f".{host_name}.packed").exists()
+
+
+def _make_history_tree(version: int) -> StructuredDataNode:
+    tree = StructuredDataNode()
+    tree.setdefault_node(("hardware", "cpu")).attributes.add_pairs({"cores": 4 + version // 3})
+    packages = tree.setdefault_node(("software", "packages"))
+    packages.table.add_key_columns(["name"])
+    packages.table.add_rows(
+        [{"name": f"package-{i}", "version": f"1.{version if i == 2 else 0}"} for i in range(10)]
+        + [{"name": f"package-{i}", "version": "1.0"} for i in range(10, 10 + version % 2)]
+    )
+    if version % 4:
+        tree.setdefault_node(("networking", f"interface-{version}")).attributes.add_pairs(
+            {"up": True}
+        )
+    return tree
+
+
+def test_archive_stores_older_trees_as_patches(tmp_path: Path) -> None:
+    host_name = HostName("heute")
+    tree_store = TreeOrArchiveStore(
+        tmp_path / "inventory", tmp_path / "inventory_archive", max_patch_chain=3
+    )
+    archive_dir = tmp_path / "inventory_archive" / str(host_name)
+    trees = [_make_history_tree(version) for version in range(10)]
+    for timestamp, tree in enumerate(trees, start=1000):
+        tree_store.archive(host_name=host_name)
+        tree_store.save(host_name=host_name, tree=tree)
+        for tree_file in (tmp_path / "inventory").glob(f"*{host_name}*"):
+            os.utime(tree_file, (timestamp, timestamp))
+
+    archived_files = sorted(archive_dir.iterdir())
+    assert [f.name for f in archived_files] == [str(t) for t in range(1000, 1009)]
+    # The newest archived tree is stored as it is, as well as every fourth one.
+    assert [f.read_bytes()[:6] for f in archived_files] == [
+        b"CMKSDP",
+        b"CMKSDP",
+        b"CMKSDP",
+        b"CMKSDT",
+        b"CMKSDP",
+        b"CMKSDP",
+        b"CMKSDP",
+        b"CMKSDT",
+        b"CMKSDT",
+    ]
+    for filepath, tree in zip(archived_files, trees):
+        assert filepath.stat().st_mtime == int(filepath.name)
+        assert load_tree(filepath).is_equal(tree)
+    assert tree_store.load_previous(host_name=host_name).is_equal(trees[-1])
+
+
+def test_archive_patch_missing_successor(tmp_path: Path) -> None:
+    host_name = HostName("heute")
+    tree_store = TreeOrArchiveStore(tmp_path / "inventory", tmp_path / "inventory_archive")
+    archive_dir = tmp_path / "inventory_archive" / str(host_name)
+    for timestamp in (1000, 1001, 1002):
+        tree_store.archive(host_name=host_name)
+        tree_store.save(host_name=host_name, tree=_make_history_tree(timestamp))
+        os.utime(tmp_path / "inventory" / str(host_name), (timestamp, timestamp))
+
+    (archive_dir / "1001").unlink()
+
+    with pytest.raises(FileNotFoundError):
+        load_tree(archive_dir / "1000")
 
 
 def test_real_is_empty() -> None:
@@ -705,17 +775,70 @@ def test_real_equal_tables() -> None:
         HostName("tree_new_heute"),
     ],
 )
-def test_real_is_equal_save_and_load(tree_name: HostName, tmp_path: Path) -> None:
+@pytest.mark.parametrize("packed", [False, True])
+def test_real_is_equal_save_and_load(tree_name: HostName, packed: bool, tmp_path: Path) -> None:
     tree = _get_tree_store().load(host_name=tree_name)
-    tree_store = TreeStore(tmp_path / "inventory")
+    tree_store = TreeStore(tmp_path / "inventory", packed=packed)
     try:
         tree_store.save(host_name=HostName("foo"), tree=tree)
         loaded_tree = tree_store.load(host_name=HostName("foo"))
         assert tree.is_equal(loaded_tree)
+        assert loaded_tree.serialize() == tree.serialize()
     finally:
         shutil.rmtree(str(tmp_path))
 
 
+def test_real_save_and_load_packed_with_retentions(tmp_path: Path) -> None:
+    tree = StructuredDataNode()
+    node = tree.setdefault_node(("path", "to", "node"))
+    node.add_attributes(
+        Attributes(retentions={"key": RetentionIntervals(1, 2, 3)}),
+    )
+    node.attributes.add_pairs({"key": "value", "empty": None})
+    node.add_table(
+        Table(
+            key_columns=["ident"],
+            retentions={("a",): {"other": RetentionIntervals(4, 5, 6)}},
+        )
+    )
+    node.table.add_rows([{"ident": "a", "other": 1.5}, {"ident": "b"}])
+    tree_store = TreeStore(tmp_path / "inventory", packed=True)
+
+    tree_store.save(host_name=HostName("foo"), tree=tree)
+
+    # Livestatus delivers the tree file, which has to be in the repr format
+    assert ast.literal_eval((tmp_path / "inventory" / "foo").read_text()) == tree.serialize()
+    assert (tmp_path / "inventory" / ".foo.packed").read_bytes().startswith(b"CMKSDT")
+    assert tree_store.load(host_name=HostName("foo")).serialize() == tree.serialize()
+
+
+def test_real_load_ignores_outdated_packed_copy(tmp_path: Path) -> None:
+    tree_store = TreeStore(tmp_path / "inventory", packed=True)
+    tree_store.save(host_name=HostName("foo"), tree=_make_history_tree(0))
+    tree_file = tmp_path / "inventory" / "foo"
+    tree_file.write_text(repr(_make_history_tree(1).serialize()))
+    os.utime(tree_file, (1000, 1000))
+
+    assert tree_store.load(host_name=HostName("foo")).is_equal(_make_history_tree(1))
+
+
+def test_real_load_packed_by_paths(tmp_path: Path) -> None:
+    tree = _get_tree_store().load(host_name=HostName("tree_new_heute"))
+    tree_store = TreeStore(tmp_path / "inventory", packed=True)
+    tree_store.save(host_name=HostName("foo"), tree=tree)
+
+    loaded_tree = tree_store.load(host_name=HostName("foo"), paths=[("hardware", "cpu")])
+
+    hardware = loaded_tree.get_node(("hardware",))
+    assert hardware is not None and hardware.attributes.is_empty()
+    assert [node.name for node in hardware.nodes] == ["cpu"]
+    cpu = loaded_tree.get_node(("hardware", "cpu"))
+    original_cpu = tree.get_node(("hardware", "cpu"))
+    assert cpu is not None and original_cpu is not None
+    assert cpu.serialize() == original_cpu.serialize()
+    assert loaded_tree.get_node(("software",)) is None
+
+
 @pytest.mark.parametrize(
     "tree_name, result",
     [
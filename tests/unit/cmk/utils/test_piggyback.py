@@ -4,6 +4,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import os
+import time
 from collections.abc import Iterable
 from datetime import datetime
 from pathlib import Path
@@ -589,3 +590,103 @@ def test_get_piggyback_matching_time_settings(
             [HostName("source-host")], HostName("piggybacked-host"), time_settings
         )._expanded_settings.keys()
     ) == sorted(expected_time_setting_keys)
+
+
+@pytest.mark.usefixtures("setup_files")
+def test_store_piggyback_raw_data_indexes_files() -> None:
+    index_path = cmk.utils.paths.piggyback_dir / str(_TEST_HOST_NAME) / ".index"
+    assert not index_path.exists()
+
+    piggyback.store_piggyback_raw_data(
+        HostName("source2"), {HostName("pig"): [b"<<<lulu>>>"], _TEST_HOST_NAME: [b"<<<lala>>>"]}
+    )
+
+    status_mtime = (cmk.utils.paths.piggyback_source_dir / "source2").stat().st_mtime
+    assert piggyback._load_piggyback_index(HostName("pig")) == {"source2": status_mtime}
+    # The index of a host is built from its folder before it is updated
+    assert index_path.exists()
+    assert piggyback._load_piggyback_index(_TEST_HOST_NAME) == {
+        "source1": _REF_TIME,
+        "source2": status_mtime,
+    }
+
+
+@pytest.mark.usefixtures("setup_files")
+def test_piggyback_index_is_used() -> None:
+    time_settings: piggyback.PiggybackTimeSettings = [
+        (None, "max_cache_age", _PIGGYBACK_MAX_CACHEFILE_AGE)
+    ]
+    piggyback.store_piggyback_raw_data(HostName("source1"), {_TEST_HOST_NAME: [b"<<<lulu>>>"]})
+
+    # Only the index is looked at, not the file
+    os.utime(
+        str(cmk.utils.paths.piggyback_dir / str(_TEST_HOST_NAME) / "source1"),
+        (_REF_TIME, _REF_TIME),
+    )
+    raw_data = _get_only_raw_data_element(_TEST_HOST_NAME, time_settings)
+    assert raw_data.info.message == "Successfully processed from source 'source1'"
+    assert piggyback.get_source_hostnames() == ["source1"]
+
+
+@pytest.mark.usefixtures("setup_files")
+def test_piggyback_index_of_other_hosts_is_not_read(monkeypatch: MonkeyPatch) -> None:
+    piggyback.store_piggyback_raw_data(HostName("source2"), {HostName("pig"): [b"<<<lulu>>>"]})
+
+    loaded = []
+    load_piggyback_index = piggyback._load_piggyback_index
+
+    def load_and_record(host_name: HostName) -> dict[HostName, float]:
+        loaded.append(host_name)
+        return load_piggyback_index(host_name)
+
+    monkeypatch.setattr(piggyback, "_load_piggyback_index", load_and_record)
+    piggyback.store_piggyback_raw_data(HostName("source2"), {HostName("pig"): [b"<<<lulu>>>"]})
+    assert piggyback.has_piggyback_raw_data(HostName("pig"), [(None, "max_cache_age", 3600)])
+
+    assert loaded == ["pig", "pig"]
+
+
+@pytest.mark.usefixtures("setup_files")
+def test_cleanup_piggyback_files_removes_index() -> None:
+    piggyback.store_piggyback_raw_data(HostName("source2"), {HostName("pig"): [b"<<<lulu>>>"]})
+
+    piggyback.cleanup_piggyback_files([(None, "max_cache_age", -1)])
+
+    assert not list(cmk.utils.paths.piggyback_dir.glob("*"))
+    assert not list(cmk.utils.paths.piggyback_source_dir.glob("*"))
+
+
+@pytest.mark.usefixtures("setup_files")
+def test_cleanup_piggyback_files_updates_index() -> None:
+    piggyback.store_piggyback_raw_data(HostName("source2"), {_TEST_HOST_NAME: [b"<<<lulu>>>"]})
+
+    # Outdates the file of source1, keeps the one of source2
+    piggyback.cleanup_piggyback_files([(None, "max_cache_age", 3600)])
+
+    assert piggyback._load_piggyback_index(_TEST_HOST_NAME).keys() == {"source2"}
+    assert piggyback.get_source_hostnames(_TEST_HOST_NAME) == ["source2"]
+
+
+@pytest.mark.usefixtures("setup_files")
+def test_update_piggyback_index_of_host() -> None:
+    piggyback.store_piggyback_raw_data(
+        HostName("source2"), {HostName("pig"): [b"<<<lulu>>>"], _TEST_HOST_NAME: [b"<<<lala>>>"]}
+    )
+
+    # Rename the piggybacked host "pig" and the source host "source2", as the
+    # automation renaming hosts does
+    piggyback_dir = cmk.utils.paths.piggyback_dir
+    (piggyback_dir / "pig").rename(piggyback_dir / "pig2")
+    for folder in (piggyback_dir / "pig2", piggyback_dir / str(_TEST_HOST_NAME)):
+        (folder / "source2").rename(folder / "source3")
+    (cmk.utils.paths.piggyback_source_dir / "source2").rename(
+        cmk.utils.paths.piggyback_source_dir / "source3"
+    )
+    for host_name in ("pig", "pig2", "source2", "source3"):
+        piggyback.update_piggyback_index_of_host(HostName(host_name))
+
+    for host_name in ("pig2", _TEST_HOST_NAME):
+        assert piggyback._load_piggyback_index(
+            HostName(host_name)
+        ) == piggyback._build_piggyback_index(HostName(host_name))
+    assert set(piggyback.get_source_hostnames()) == {"source1", "source3"}
@@ -8,6 +8,7 @@ from collections.abc import Mapping
 import pytest
 
 import cmk.utils.prediction as prediction
+from cmk.utils.type_defs import HostName
 
 
 @pytest.mark.parametrize(
@@ -130,6 +131,21 @@ def test_time_series_downsampling(
     assert ts.downsample(twindow, cf) == downsampled
 
 
+def test_prediction_store_slices() -> None:
+    store = prediction.PredictionStore(HostName("host"), "service", "metric")
+    timegroup = prediction.Timegroup("monday")
+    assert store.get_slices(timegroup) is None
+
+    slices = prediction.PredictionSlices(
+        cf="max", slices={100: ((0, 100, 25), [1.0, None, 3.5, 4.0])}
+    )
+    store.save_slices(timegroup, slices)
+    assert store.get_slices(timegroup) == slices
+
+    store.clean_prediction_files(timegroup, force=True)
+    assert store.get_slices(timegroup) is None
+
+
 def test__get_reference_deviation_absolute() -> None:
     factor = 3.1415
     assert (
@@ -4,6 +4,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 import enum
 import errno
+import marshal
 import os
 import queue
 import stat
@@ -198,6 +199,44 @@ def test_save_data_to_file(
     assert store.load_object_from_file(path, default=None) == data
 
 
+@pytest.mark.parametrize(
+    "data",
+    [
+        None,
+        {("host", "check", None, "key"): (1.5, -3, True)},
+        [b"foob\xc3\xa4r", "föö", {1, 2}, float("inf")],
+    ],
+)
+def test_marshal_serializer(data: object) -> None:
+    serializer = store.MarshalSerializer()
+    raw = serializer.serialize(data)
+    assert not raw.startswith(repr(data).encode())
+    assert serializer.deserialize(raw) == data
+
+
+def test_marshal_serializer_reads_text() -> None:
+    assert store.MarshalSerializer().deserialize(b"{('a', None): [1, 2.5]}\n") == {
+        ("a", None): [1, 2.5]
+    }
+
+
+@pytest.mark.parametrize("version", range(marshal.version + 1))
+def test_marshal_serializer_reads_older_marshal_versions(version: int) -> None:
+    data = {("host", "check", None, "key"): (1.5, -3, "föö", b"\x00")}
+    serializer = store.MarshalSerializer()
+    assert serializer.deserialize(serializer._MAGIC + marshal.dumps(data, version)) == data
+
+
+def test_marshal_serializer_falls_back_to_text() -> None:
+    class Name(str):
+        pass
+
+    serializer = store.MarshalSerializer()
+    raw = serializer.serialize({"name": Name("abc")})
+    assert raw == b"{'name': 'abc'}\n"
+    assert serializer.deserialize(raw) == {"name": "abc"}
+
+
 @pytest.mark.parametrize("path_type", [str, Path])
 @pytest.mark.parametrize(
     "data",
@@ -5,10 +5,14 @@
 
 # pylint: disable=redefined-outer-name
 
+import ast
 import errno
+import json
 import socket
 import ssl
-from contextlib import closing
+import threading
+import time
+from contextlib import closing, suppress
 from pathlib import Path
 
 import pytest
@@ -272,3 +276,150 @@ def test_set_auth_user(
             return
 
         livestatus.LocalConnection().set_auth_user("mydomain", user_id)
+
+
+def _serve_livestatus(sock_path: Path, delay: float, body: bytes) -> None:
+    """Answer one query on a fresh unix socket after the given delay"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(sock_path))
+    server.listen(1)
+
+    def serve() -> None:
+        with closing(server), closing(server.accept()[0]) as connection:
+            query = b""
+            while not query.endswith(b"\n\n"):
+                query += connection.recv(1024)
+            time.sleep(delay)
+            # The client may have given up waiting already
+            with suppress(OSError):
+                connection.sendall(b"200 %11d\n" % len(body) + body)
+                connection.recv(1)
+
+    threading.Thread(target=serve, daemon=True).start()
+
+
+def _serve_livestatus_answers(sock_path: Path, bodies: list[bytes]) -> None:
+    """Answer the queries on a unix socket with the given bodies, in order
+
+    The connections are kept open, so a client has to read all answers to
+    its queries to get the right answer to the next one."""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(sock_path))
+    server.listen(2)
+    answers = iter(bodies)
+
+    def serve() -> None:
+        while True:
+            with closing(server.accept()[0]) as connection:
+                query = b""
+                with suppress(OSError):
+                    while chunk := connection.recv(1024):
+                        query += chunk
+                        while b"\n\n" in query:
+                            _request, query = query.split(b"\n\n", 1)
+                            body = next(answers)
+                            connection.sendall(b"200 %11d\n" % len(body) + body)
+
+    threading.Thread(target=serve, daemon=True).start()
+
+
+@pytest.fixture
+def multisite(tmp_path: Path) -> livestatus.MultiSiteConnection:
+    _serve_livestatus(tmp_path / "slow", 0.5, b"[['slow']]")
+    _serve_livestatus(tmp_path / "fast", 0.0, b"[['fast']]")
+    return livestatus.MultiSiteConnection(
+        livestatus.SiteConfigurations(
+            {
+                livestatus.SiteId("slow"): {"socket": f"unix:{tmp_path / 'slow'}"},
+                livestatus.SiteId("fast"): {"socket": f"unix:{tmp_path / 'fast'}"},
+            }
+        )
+    )
+
+
+def test_query_parallel_keeps_site_order(multisite: livestatus.MultiSiteConnection) -> None:
+    multisite.set_prepend_site(True)
+    assert multisite.query("GET hosts\nColumns: name") == [["slow", "slow"], ["fast", "fast"]]
+    assert multisite.alive_sites() == ["slow", "fast"]
+
+
+def test_query_parallel_iter_yields_first_response_first(
+    multisite: livestatus.MultiSiteConnection,
+) -> None:
+    assert list(multisite.query_parallel_iter(livestatus.Query("GET hosts\nColumns: name"))) == [
+        ("fast", [["fast"]]),
+        ("slow", [["slow"]]),
+    ]
+
+
+def test_query_parallel_iter_timeout(multisite: livestatus.MultiSiteConnection) -> None:
+    assert list(
+        multisite.query_parallel_iter(livestatus.Query("GET hosts\nColumns: name"), timeout=0.2)
+    ) == [("fast", [["fast"]])]
+    assert multisite.alive_sites() == ["fast"]
+    assert "Timeout" in str(multisite.dead_sites()[livestatus.SiteId("slow")]["exception"])
+
+
+@pytest.mark.parametrize(
+    "json_format, body",
+    [
+        (False, b"[]\n"),
+        (False, b"[['a', 1, b'\\xc3'],\n['b,]', 2.5, ['x\\n']],\n['\xc3\xa4', {'k': (1,)}]]\n"),
+        (True, b'[["a", 1],\n["b,]", 2.5, ["x\\n"]],\n["\xc3\xa4", {"k": [1]}]]\n'),
+        (True, b'[["a", 1], ["b", 2]]'),
+    ],
+)
+def test_row_decoder(json_format: bool, body: bytes) -> None:
+    expected = json.loads(body) if json_format else ast.literal_eval(body.decode("utf-8"))
+    for size in (1, 2, 7, len(body)):
+        decoder = livestatus._RowDecoder(json_format)
+        rows = [
+            row
+            for offset in range(0, len(body), size)
+            for row in decoder.feed(body[offset:][:size])
+        ]
+        assert rows + list(decoder.close()) == expected
+
+
+def test_row_decoder_malformed() -> None:
+    decoder = livestatus._RowDecoder(True)
+    assert list(decoder.feed(b'[["a"],\n["b')) == [["a"]]
+    with pytest.raises(livestatus.MKLivestatusQueryError):
+        list(decoder.close())
+
+
+def test_single_site_query_iter(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(livestatus, "RECEIVE_BUFFER_SIZE", 5)
+    _serve_livestatus(tmp_path / "live", 0.0, b"[['a', 1],\n['b', 2]]\n")
+    connection = livestatus.SingleSiteConnection(f"unix:{tmp_path / 'live'}")
+    rows = connection.query_iter("GET hosts\nColumns: name")
+    assert next(rows) == ["a", 1]
+    assert list(rows) == [["b", 2]]
+
+
+def test_query_iter(multisite: livestatus.MultiSiteConnection) -> None:
+    multisite.set_prepend_site(True)
+    assert list(multisite.query_iter("GET hosts\nColumns: name")) == [
+        ["slow", "slow"],
+        ["fast", "fast"],
+    ]
+    assert multisite.alive_sites() == ["slow", "fast"]
+
+
+def test_query_iter_stopped_early(tmp_path: Path) -> None:
+    _serve_livestatus_answers(tmp_path / "a", [b"[['a-answer1']]", b"[['a-answer2']]"])
+    _serve_livestatus_answers(tmp_path / "b", [b"[['b-answer1']]", b"[['b-answer2']]"])
+    multisite = livestatus.MultiSiteConnection(
+        livestatus.SiteConfigurations(
+            {
+                livestatus.SiteId("a"): {"socket": f"unix:{tmp_path / 'a'}"},
+                livestatus.SiteId("b"): {"socket": f"unix:{tmp_path / 'b'}"},
+            }
+        )
+    )
+
+    for row in multisite.query_iter("GET hosts\nColumns: name"):
+        assert row == ["a-answer1"]
+        break
+
+    assert multisite.query("GET hosts\nColumns: name") == [["a-answer2"], ["b-answer2"]]